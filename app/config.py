@@ -10,6 +10,26 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 ASSETS_DIR = BASE_DIR / "assets"
 DB_PATH = BASE_DIR / "base_de_imprenta.db"
 
+# ========== CONFIGURACIÓN DE LA BASE DE DATOS ==========
+# Modo WAL: un escritor y varios lectores concurrentes sin bloquearse.
+# Con False se vuelve al esquema anterior (una sola conexión compartida).
+DB_MODO_WAL = True
+
+# Conexiones de solo lectura disponibles para reportes y exportaciones
+DB_POOL_LECTURA = 4
+
+# PRAGMAs aplicados a cada conexión nueva
+DB_PRAGMAS = {
+    'synchronous': 'NORMAL',     # Seguro con WAL y mucho más rápido que FULL
+    'cache_size': -20000,        # Negativo = KiB (~20 MB de caché de páginas)
+    'mmap_size': 268435456,      # 256 MB de lectura mapeada en memoria
+    'busy_timeout': 5000,        # ms de espera ante un bloqueo antes de fallar
+    'temp_store': 'MEMORY',      # Tablas temporales y ordenamientos en RAM
+}
+
+# Cada cuántos días se guarda un snapshot del libro de inventario
+INVENTARIO_DIAS_SNAPSHOT = 7
+
 # ========== CONFIGURACIÓN DE LA INTERFAZ ==========
 # Colores del tema
 COLOR_PRIMARY = "#1f538d"
@@ -3,7 +3,7 @@ Capa de acceso a datos con SQLAlchemy ORM
 Maneja la conexión y operaciones con SQLite usando modelos ORM
 """
 
-from .conexion import DatabaseConnection, get_session, get_db
+from .conexion import DatabaseConnection, get_session, get_read_session, get_db
 from .models import (
     Base, Cliente, Maquina, Material, EstadoPedido, 
     Servicio, Pedido, DetallePedido, ConsumoMaterial, ServicioMaterial,
@@ -16,6 +16,7 @@ from .models import (
 __all__ = [
     'DatabaseConnection',
     'get_session',
+    'get_read_session',
     'get_db',
     'Base',
     'Cliente',
@@ -0,0 +1,213 @@
+"""
+Caché de catálogos de referencia con sello de versión
+Guarda copias inmutables de catálogos pequeños (estados, unidades, tipos,
+servicios) y las invalida con un número de versión global en la BD
+
+Cada escritura de catálogo incrementa version_datos['catalogos'] dentro de
+su propia transacción. Los lectores comparan la versión de su copia con la
+de la BD, que se relee como mucho cada INTERVALO_VERIFICACION segundos; así
+una lectura normal es una búsqueda en diccionario y los cambios hechos
+desde otra estación se ven, como tarde, tras ese intervalo.
+
+Otros grupos de datos usan el mismo mecanismo con su propia fila en
+version_datos (ej: 'conocimiento' para la base del motor de inferencia),
+así un cambio de stock no descarta los catálogos y viceversa.
+"""
+import threading
+import time
+from types import MappingProxyType
+from sqlalchemy import update, event
+from app.database.conexion import get_read_session
+from app.database.models import VersionDatos
+
+
+GRUPO_CATALOGOS = 'catalogos'
+GRUPO_CONOCIMIENTO = 'conocimiento'  # Máquinas, capacidades, relaciones y stock
+
+# Segundos entre lecturas de la versión global en la BD
+INTERVALO_VERIFICACION = 5
+
+# Claves en session.info para los grupos modificados en la transacción
+_CLAVE_PENDIENTES = 'grupos_version_pendientes'
+_CLAVE_ESCUCHA = 'grupos_version_escucha'
+
+_lock = threading.Lock()
+_snapshots = {}        # {nombre: (grupos, versiones, valor)}
+_versiones = {}        # {grupo: (versión leída de la BD, time.monotonic() de la lectura)}
+
+
+def _leer_version(grupo):
+    """Lee la versión de un grupo desde la BD"""
+    session = get_read_session()
+    try:
+        registro = session.get(VersionDatos, grupo)
+        return registro.version if registro else 0
+    finally:
+        session.close()
+
+
+def _version_vigente(grupo, ahora):
+    """Versión local de un grupo si no venció el intervalo, o None"""
+    entrada = _versiones.get(grupo)
+    if entrada is not None and ahora - entrada[1] < INTERVALO_VERIFICACION:
+        return entrada[0]
+    return None
+
+
+def version_grupo(grupo):
+    """
+    Devuelve la versión vigente de un grupo de datos
+
+    Solo consulta la BD si pasó INTERVALO_VERIFICACION desde la última
+    lectura o si una escritura local la invalidó.
+
+    Args:
+        grupo: Fila de version_datos (ej: GRUPO_CATALOGOS)
+
+    Returns:
+        int: Versión del grupo
+    """
+    ahora = time.monotonic()
+    version = _version_vigente(grupo, ahora)
+    if version is None:
+        version = _leer_version(grupo)
+        _versiones[grupo] = (version, ahora)
+    return version
+
+
+def version_catalogos():
+    """
+    Devuelve la versión vigente de los catálogos
+
+    Returns:
+        int: Versión global de catálogos
+    """
+    return version_grupo(GRUPO_CATALOGOS)
+
+
+def obtener_catalogo(nombre, cargar):
+    """
+    Devuelve la copia cacheada de un catálogo, cargándola si está vencida
+
+    Args:
+        nombre: Identificador del catálogo (ej: 'estados_pedidos')
+        cargar: Función sin argumentos que devuelve la lista de diccionarios
+
+    Returns:
+        tuple: Registros como mappings de solo lectura (compartidos entre
+               llamadas, no se deben modificar)
+    """
+    return obtener_compilado(
+        nombre, lambda: tuple(MappingProxyType(registro) for registro in cargar())
+    )
+
+
+def obtener_compilado(nombre, construir, grupos=(GRUPO_CATALOGOS,)):
+    """
+    Devuelve una estructura derivada de los datos de referencia, cacheada
+    con la versión de los grupos de los que depende
+
+    Sirve para índices o reglas precompiladas que se arman una sola vez y
+    se consultan en memoria hasta que cambie la versión.
+
+    Args:
+        nombre: Identificador de la estructura (ej: 'indice_precios')
+        construir: Función sin argumentos que arma la estructura
+        grupos: Grupos de version_datos que invalidan la estructura
+
+    Returns:
+        La estructura construida (compartida, no se debe modificar)
+    """
+    # Camino rápido sin lock: leer un dict es atómico y las versiones solo
+    # se releen cuando vence el intervalo
+    entrada = _snapshots.get(nombre)
+    if entrada is not None:
+        ahora = time.monotonic()
+        if entrada[1] == tuple(_version_vigente(grupo, ahora) for grupo in grupos):
+            return entrada[2]
+
+    with _lock:
+        versiones = tuple(version_grupo(grupo) for grupo in grupos)
+        entrada = _snapshots.get(nombre)
+        if entrada is not None and entrada[1] == versiones:
+            return entrada[2]
+
+    valor = construir()
+    with _lock:
+        _snapshots[nombre] = (tuple(grupos), versiones, valor)
+    return valor
+
+
+def marcar_cambio(session, grupo=GRUPO_CATALOGOS):
+    """
+    Incrementa la versión de un grupo dentro de la transacción abierta
+
+    Para funciones que trabajan sobre una sesión ajena (no hacen commit):
+    el incremento se hace una sola vez por transacción y la caché local del
+    grupo se descarta cuando la sesión confirma.
+
+    Args:
+        session: Sesión de escritura
+        grupo: Grupo de version_datos modificado
+    """
+    pendientes = session.info.setdefault(_CLAVE_PENDIENTES, set())
+    if grupo in pendientes:
+        return
+    if not session.info.get(_CLAVE_ESCUCHA):
+        event.listen(session, 'after_commit', _al_confirmar)
+        event.listen(session, 'after_transaction_end', _al_terminar)
+        session.info[_CLAVE_ESCUCHA] = True
+
+    session.execute(
+        update(VersionDatos)
+        .where(VersionDatos.grupo == grupo)
+        .values(version=VersionDatos.version + 1)
+    )
+    pendientes.add(grupo)
+
+
+def _al_confirmar(session):
+    pendientes = session.info.get(_CLAVE_PENDIENTES)
+    if pendientes:
+        invalidar(*pendientes)
+
+
+def _al_terminar(session, transaccion):
+    # Tras commit, rollback o close: la próxima transacción vuelve a incrementar
+    if transaccion.parent is None:
+        session.info.pop(_CLAVE_PENDIENTES, None)
+
+
+def confirmar_cambio(session, *grupos):
+    """
+    Confirma una escritura de datos cacheados incrementando su versión
+
+    Reemplaza a session.commit() en las funciones que modifican catálogos:
+    el incremento viaja en la misma transacción y, tras el commit, la
+    caché local se descarta para que la próxima lectura la recargue.
+
+    Args:
+        session: Sesión de escritura con los cambios pendientes
+        *grupos: Grupos modificados (por defecto GRUPO_CATALOGOS)
+    """
+    for grupo in grupos or (GRUPO_CATALOGOS,):
+        marcar_cambio(session, grupo)
+    session.commit()
+
+
+def invalidar(*grupos):
+    """
+    Descarta las copias locales y fuerza a releer la versión
+
+    Args:
+        *grupos: Grupos a descartar (sin argumentos, todos)
+    """
+    with _lock:
+        if not grupos:
+            _snapshots.clear()
+            _versiones.clear()
+            return
+        for grupo in grupos:
+            _versiones.pop(grupo, None)
+        for nombre in [n for n, entrada in _snapshots.items() if set(entrada[0]) & set(grupos)]:
+            del _snapshots[nombre]
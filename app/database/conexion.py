@@ -4,10 +4,9 @@ Gestiona la sesión y configuración de la base de datos
 """
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import StaticPool, QueuePool
 from contextlib import contextmanager
-from app.config import DB_PATH
-from app.database.models import Base
+from app.config import DB_PATH, DB_MODO_WAL, DB_POOL_LECTURA, DB_PRAGMAS
 
 
 class DatabaseConnection:
@@ -15,13 +14,20 @@ class DatabaseConnection:
     Clase singleton para gestionar la conexión con SQLAlchemy ORM
     
     Proporciona acceso a la sesión de base de datos y maneja
-    la inicialización de tablas y datos
+    la inicialización de tablas y datos.
+    
+    En modo WAL (DB_MODO_WAL) mantiene dos engines:
+    - Escritura: una única conexión, SQLite solo admite un escritor a la vez
+    - Lectura: pool de DB_POOL_LECTURA conexiones de solo lectura, que en WAL
+      leen una instantánea consistente sin esperar al escritor
     """
 
     _instance = None
     _engine = None
+    _read_engine = None
     _session_factory = None
     _Session = None
+    _ReadSession = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -31,33 +37,78 @@ class DatabaseConnection:
 
     def _initialize(self):
         """Inicializa el engine y session factory de SQLAlchemy"""
-        # Crear engine con SQLite
-        self._engine = create_engine(
+        if DB_MODO_WAL:
+            # Engine de escritura: una sola conexión (SQLite serializa escrituras)
+            self._engine = self._crear_engine(pool_size=1)
+            # Engine de lectura: varias conexiones con query_only
+            self._read_engine = self._crear_engine(pool_size=DB_POOL_LECTURA, solo_lectura=True)
+        else:
+            # Modo anterior: una sola conexión compartida por todo el proceso
+            self._engine = create_engine(
+                f'sqlite:///{DB_PATH}',
+                connect_args={'check_same_thread': False},
+                poolclass=StaticPool,
+                echo=False  # Cambiar a True para debug SQL
+            )
+            self._registrar_pragmas(self._engine)
+            self._read_engine = self._engine
+        
+        # Configurar session factory con scoped_session para thread safety
+        self._session_factory = sessionmaker(bind=self._engine)
+        self._Session = scoped_session(self._session_factory)
+        if self._read_engine is self._engine:
+            self._ReadSession = self._Session
+        else:
+            self._ReadSession = scoped_session(sessionmaker(bind=self._read_engine))
+        
+        # Crear tablas, migrar esquema y cargar datos iniciales (solo si hay pasos pendientes)
+        self._ejecutar_migraciones()
+
+    def _crear_engine(self, pool_size, solo_lectura=False):
+        """
+        Crea un engine SQLite con pool de conexiones y PRAGMAs configurados
+        
+        Args:
+            pool_size: Número de conexiones del pool
+            solo_lectura: Si es True, las conexiones rechazan escrituras
+            
+        Returns:
+            Engine: Engine de SQLAlchemy
+        """
+        engine = create_engine(
             f'sqlite:///{DB_PATH}',
             connect_args={'check_same_thread': False},
-            poolclass=StaticPool,
+            poolclass=QueuePool,
+            pool_size=pool_size,
+            max_overflow=0,
             echo=False  # Cambiar a True para debug SQL
         )
+        self._registrar_pragmas(engine, modo_wal=True, solo_lectura=solo_lectura)
+        return engine
+
+    @staticmethod
+    def _registrar_pragmas(engine, modo_wal=False, solo_lectura=False):
+        """
+        Aplica los PRAGMAs de SQLite a cada conexión que abra el engine
         
-        # Habilitar foreign keys en SQLite
-        @event.listens_for(self._engine, "connect")
+        Args:
+            engine: Engine de SQLAlchemy
+            modo_wal: Activa journal_mode=WAL
+            solo_lectura: Activa query_only en la conexión
+        """
+        @event.listens_for(engine, "connect")
         def set_sqlite_pragma(dbapi_conn, connection_record):
             cursor = dbapi_conn.cursor()
+            # Habilitar foreign keys en SQLite
             cursor.execute("PRAGMA foreign_keys=ON")
+            if modo_wal and not solo_lectura:
+                # journal_mode es persistente en el archivo, basta con el escritor
+                cursor.execute("PRAGMA journal_mode=WAL")
+            for pragma, valor in DB_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {pragma}={valor}")
+            if solo_lectura:
+                cursor.execute("PRAGMA query_only=ON")
             cursor.close()
-        
-        # Ejecutar migraciones antes de crear tablas
-        self._ejecutar_migraciones()
-        
-        # Crear todas las tablas definidas en los modelos
-        Base.metadata.create_all(self._engine)
-        
-        # Configurar session factory con scoped_session para thread safety
-        self._session_factory = sessionmaker(bind=self._engine)
-        self._Session = scoped_session(self._session_factory)
-        
-        # Cargar datos iniciales si la BD está vacía
-        self._cargar_datos_iniciales()
 
     def get_session(self):
         """
@@ -68,6 +119,18 @@ class DatabaseConnection:
         """
         return self._Session()
 
+    def get_read_session(self):
+        """
+        Retorna una sesión de solo lectura del pool de lectores
+        
+        Usar para reportes, listados y exportaciones: en modo WAL no
+        bloquea ni espera a la sesión de escritura.
+        
+        Returns:
+            Session: Sesión de SQLAlchemy de solo lectura
+        """
+        return self._ReadSession()
+
     def get_engine(self):
         """
         Retorna el engine de SQLAlchemy
@@ -77,6 +140,15 @@ class DatabaseConnection:
         """
         return self._engine
 
+    def get_read_engine(self):
+        """
+        Retorna el engine de solo lectura
+        
+        Returns:
+            Engine: Engine de lectura (el mismo de escritura fuera de modo WAL)
+        """
+        return self._read_engine
+
     @contextmanager
     def session_scope(self):
         """
@@ -99,125 +171,43 @@ class DatabaseConnection:
         finally:
             session.close()
 
+    @contextmanager
+    def read_session_scope(self):
+        """
+        Context manager para consultas de solo lectura
+        
+        Yields:
+            Session: Sesión de lectura que se cierra al salir
+        """
+        session = self.get_read_session()
+        try:
+            yield session
+        finally:
+            session.close()
+
     def remove_session(self):
         """Remueve la sesión actual del registro de scoped_session"""
         self._Session.remove()
+        if self._ReadSession is not self._Session:
+            self._ReadSession.remove()
 
     def _ejecutar_migraciones(self):
         """
-        Ejecuta migraciones para actualizar el esquema de bases de datos existentes.
-        Agrega columnas nuevas que no existan en la BD.
+        Ejecuta las migraciones versionadas pendientes (ver migraciones.py).
+        Si la BD ya está en la versión actual solo lee PRAGMA user_version.
         """
-        from sqlalchemy import text, inspect
+        from app.database.migraciones import aplicar_migraciones
         
-        with self._engine.connect() as conn:
-            inspector = inspect(self._engine)
-            
-            # Verificar si la tabla servicios existe
-            if 'servicios' in inspector.get_table_names():
-                columnas_servicios = [col['name'] for col in inspector.get_columns('servicios')]
-                
-                # Migración: agregar tipo_material a servicios si no existe
-                if 'tipo_material' not in columnas_servicios:
-                    conn.execute(text("ALTER TABLE servicios ADD COLUMN tipo_material VARCHAR DEFAULT 'unidad'"))
-                    conn.commit()
-                    print("✅ Migración: columna 'tipo_material' agregada a servicios")
-            
-            # Verificar si existe la tabla vieja atributos_rollos_impresion y crear la nueva
-            if 'atributos_rollos_impresion' in inspector.get_table_names():
-                # La tabla vieja existe, pero la nueva será creada por create_all
-                # Podríamos migrar datos aquí si fuera necesario
-                print("⚠️ Tabla 'atributos_rollos_impresion' detectada (legacy)")
-
-    def _cargar_datos_iniciales(self):
-        """
-        Carga datos iniciales si las tablas están vacías
-        
-        Inserta estados de pedidos, máquinas y servicios de ejemplo
-        """
-        from app.database.models import (
-            EstadoPedido, Maquina, Servicio, TipoMaquina, UnidadMedida
-        )
-        
-        with self.session_scope() as session:
-            # Verificar y cargar estados de pedidos
-            if session.query(EstadoPedido).count() == 0:
-                estados = [
-                    EstadoPedido(nombre="Cotizado", color="#9E9E9E"),
-                    EstadoPedido(nombre="Confirmado", color="#2196F3"),
-                    EstadoPedido(nombre="En Diseño", color="#FF9800"),
-                    EstadoPedido(nombre="Previsualización Enviada", color="#9C27B0"),
-                    EstadoPedido(nombre="En Preparación", color="#FFC107"),
-                    EstadoPedido(nombre="Listo para Entrega", color="#4CAF50"),
-                    EstadoPedido(nombre="Entregado", color="#00C853"),
-                    EstadoPedido(nombre="Cancelado", color="#F44336")
-                ]
-                session.add_all(estados)
-                print("✅ Estados de pedidos inicializados")
-            
-            # Cargar unidades de medida si no existen
-            if session.query(UnidadMedida).count() == 0:
-                unidades = [
-                    UnidadMedida(nombre_unidad="Metro Cuadrado", abreviacion="m2", tipo="Area"),
-                    UnidadMedida(nombre_unidad="Unidad", abreviacion="unidad", tipo="Conteo"),
-                    UnidadMedida(nombre_unidad="Ciento", abreviacion="ciento", tipo="Conteo"),
-                    UnidadMedida(nombre_unidad="Metro Lineal", abreviacion="ml", tipo="Longitud"),
-                    UnidadMedida(nombre_unidad="Millar", abreviacion="millar", tipo="Conteo"),
-                ]
-                session.add_all(unidades)
-                session.flush()
-                print("✅ Unidades de medida inicializadas")
-            
-            # Cargar tipos de máquinas si no existen
-            if session.query(TipoMaquina).count() == 0:
-                tipos_maq = [
-                    TipoMaquina(nombre_tipo="Pequeño Formato"),
-                    TipoMaquina(nombre_tipo="Gran Formato"),
-                    TipoMaquina(nombre_tipo="Acabado"),
-                    TipoMaquina(nombre_tipo="Corte"),
-                ]
-                session.add_all(tipos_maq)
-                session.flush()
-                print("✅ Tipos de máquinas inicializados")
-
-            # Verificar y cargar máquinas
-            if session.query(Maquina).count() == 0:
-                # Obtener tipos de máquinas
-                tipo_peq = session.query(TipoMaquina).filter_by(nombre_tipo="Pequeño Formato").first()
-                tipo_gran = session.query(TipoMaquina).filter_by(nombre_tipo="Gran Formato").first()
-                tipo_acab = session.query(TipoMaquina).filter_by(nombre_tipo="Acabado").first()
-                
-                maquinas = [
-                    Maquina(nombre="Impresora Láser A3", id_tipo_maquina=tipo_peq.id_tipo_maquina if tipo_peq else 1),
-                    Maquina(nombre="Impresora Sublimación", id_tipo_maquina=tipo_peq.id_tipo_maquina if tipo_peq else 1),
-                    Maquina(nombre="Plotter HP DesignJet", id_tipo_maquina=tipo_gran.id_tipo_maquina if tipo_gran else 2),
-                    Maquina(nombre="Laminadora Manual", id_tipo_maquina=tipo_acab.id_tipo_maquina if tipo_acab else 3)
-                ]
-                session.add_all(maquinas)
-                print("✅ Máquinas inicializadas")
-            
-            # Verificar y cargar servicios
-            if session.query(Servicio).count() == 0:
-                # Obtener unidades de cobro
-                unidad_m2 = session.query(UnidadMedida).filter_by(abreviacion="m2").first()
-                unidad_und = session.query(UnidadMedida).filter_by(abreviacion="unidad").first()
-                unidad_ciento = session.query(UnidadMedida).filter_by(abreviacion="ciento").first()
-                
-                servicios = [
-                    Servicio(nombre_servicio="Gigantografía", id_unidad_cobro=unidad_m2.id_unidad if unidad_m2 else 1, precio_base=25.0, id_maquina_sugerida=3),
-                    Servicio(nombre_servicio="Banner Roll-Up", id_unidad_cobro=unidad_und.id_unidad if unidad_und else 2, precio_base=80.0, id_maquina_sugerida=3),
-                    Servicio(nombre_servicio="Tarjetas de Presentación", id_unidad_cobro=unidad_ciento.id_unidad if unidad_ciento else 3, precio_base=15.0, id_maquina_sugerida=1),
-                    Servicio(nombre_servicio="Flyers A5", id_unidad_cobro=unidad_ciento.id_unidad if unidad_ciento else 3, precio_base=20.0, id_maquina_sugerida=1),
-                    Servicio(nombre_servicio="Tazas Personalizadas", id_unidad_cobro=unidad_und.id_unidad if unidad_und else 2, precio_base=12.0, id_maquina_sugerida=2),
-                    Servicio(nombre_servicio="Llaveros", id_unidad_cobro=unidad_und.id_unidad if unidad_und else 2, precio_base=3.0, id_maquina_sugerida=2)
-                ]
-                session.add_all(servicios)
-                print("✅ Servicios inicializados")
+        aplicar_migraciones(self)
 
     def close(self):
         """Cierra todas las conexiones y limpia recursos"""
         if self._Session:
             self._Session.remove()
+        if self._ReadSession and self._ReadSession is not self._Session:
+            self._ReadSession.remove()
+        if self._read_engine and self._read_engine is not self._engine:
+            self._read_engine.dispose()
         if self._engine:
             self._engine.dispose()
         print("✅ Conexión de base de datos cerrada")
@@ -235,6 +225,82 @@ def get_session():
     return db.get_session()
 
 
+def get_read_session():
+    """
+    Retorna una sesión de SQLAlchemy de solo lectura
+    
+    Returns:
+        Session: Sesión del pool de lectura
+    """
+    db = DatabaseConnection()
+    return db.get_read_session()
+
+
+@contextmanager
+def _escuchar_sentencias(funcion):
+    """Registra funcion(statement, parameters) en ambos engines mientras dure el bloque"""
+    db = DatabaseConnection()
+
+    def _escuchar(conn, cursor, statement, parameters, context, executemany):
+        funcion(statement, parameters)
+
+    engines = [db.get_engine()]
+    if db.get_read_engine() is not db.get_engine():
+        engines.append(db.get_read_engine())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _escuchar)
+    try:
+        yield
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", _escuchar)
+
+
+@contextmanager
+def contar_consultas():
+    """
+    Cuenta las sentencias SQL ejecutadas dentro del bloque
+    
+    Útil para verificar que un listado no hace una consulta por fila (N+1).
+    Cuenta en ambos engines y en todos los hilos mientras el bloque esté activo.
+    
+    Uso:
+        with contar_consultas() as contador:
+            consultas.obtener_pedidos()
+        print(contador['consultas'])
+    
+    Yields:
+        dict: {'consultas': int} actualizado en tiempo real
+    """
+    contador = {'consultas': 0}
+    
+    def _contar(statement, parameters):
+        contador['consultas'] += 1
+    
+    with _escuchar_sentencias(_contar):
+        yield contador
+
+
+@contextmanager
+def capturar_consultas():
+    """
+    Registra las sentencias SQL ejecutadas dentro del bloque
+
+    Guarda el SQL tal como lo emite SQLAlchemy, con sus parámetros, para
+    poder inspeccionarlo después (por ejemplo con EXPLAIN QUERY PLAN).
+
+    Yields:
+        list: [(statement, parameters), ...] en orden de ejecución
+    """
+    sentencias = []
+
+    def _capturar(statement, parameters):
+        sentencias.append((statement, parameters))
+
+    with _escuchar_sentencias(_capturar):
+        yield sentencias
+
+
 # Función antigua mantenida para compatibilidad (deprecated)
 def get_db():
     """
@@ -2,15 +2,52 @@
 Funciones de consulta usando SQLAlchemy ORM
 Proporciona una interfaz limpia para operaciones CRUD
 """
-from datetime import datetime
-from sqlalchemy import func, and_, or_
+import copy
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, and_, or_, case, exists, insert
 from sqlalchemy.exc import SQLAlchemyError
-from app.database.conexion import get_session
+from sqlalchemy.orm import joinedload, selectinload
+from app.config import INVENTARIO_DIAS_SNAPSHOT
+from app.database.conexion import get_session, get_read_session
+from app.database import cache_catalogos, reglas_negocio, inventario, resumen_diario
 from app.database.models import (
     Cliente, Maquina, Material, EstadoPedido, Servicio, 
     Pedido, DetallePedido, ConsumoMaterial, ServicioMaterial, MaquinaServicio,
     TipoMaquina, TipoMaterial, UnidadMedida, InventarioMaterial, InventarioDimensionalMaterial,
-    CapacidadMaquina, PrecioEscalonado, RestriccionCantidad, ConfiguracionSistema
+    CapacidadMaquina, PrecioEscalonado, RestriccionCantidad, ConfiguracionSistema,
+    MovimientoInventario, PlanProduccion, Feriado
+)
+
+
+# ========== CARGA ANTICIPADA DE RELACIONES ==========
+# Cada to_dict() lee relaciones; sin estas opciones cada fila dispara sus
+# propias consultas (N+1). Con joinedload todo llega en el mismo SELECT.
+
+CARGA_SERVICIO = (
+    joinedload(Servicio.unidad_cobro),
+    joinedload(Servicio.maquina_sugerida).joinedload(Maquina.tipo_maquina),
+)
+
+CARGA_MATERIAL = (
+    joinedload(Material.inventario),
+    joinedload(Material.inventario_dimensional),
+    joinedload(Material.tipo_material),
+    joinedload(Material.unidad_inventario),
+)
+
+CARGA_PEDIDO = (
+    joinedload(Pedido.cliente),
+    joinedload(Pedido.estado),
+)
+
+CARGA_DETALLE = (
+    joinedload(DetallePedido.servicio),
+    joinedload(DetallePedido.material),
+)
+
+CARGA_MAQUINA = (
+    joinedload(Maquina.tipo_maquina),
 )
 
 
@@ -23,7 +60,7 @@ def obtener_clientes():
     Returns:
         list: Lista de diccionarios con datos de clientes
     """
-    session = get_session()
+    session = get_read_session()
     try:
         clientes = session.query(Cliente).order_by(Cliente.nombre_completo).all()
         return [cliente.to_dict() for cliente in clientes]
@@ -143,11 +180,16 @@ def obtener_servicios():
     Obtiene todos los servicios con su información de máquina
     
     Returns:
-        list: Lista de diccionarios con datos de servicios
+        tuple: Registros de solo lectura con datos de servicios (cacheados)
     """
-    session = get_session()
+    return cache_catalogos.obtener_catalogo('servicios', _cargar_servicios)
+
+
+def _cargar_servicios():
+    """Lee los servicios desde la BD para la caché de catálogos"""
+    session = get_read_session()
     try:
-        servicios = session.query(Servicio).all()
+        servicios = session.query(Servicio).options(*CARGA_SERVICIO).all()
         return [servicio.to_dict() for servicio in servicios]
     finally:
         session.close()
@@ -165,7 +207,9 @@ def obtener_servicio_por_id(id_servicio):
     """
     session = get_session()
     try:
-        servicio = session.query(Servicio).filter(Servicio.id_servicio == id_servicio).first()
+        servicio = session.query(Servicio).options(*CARGA_SERVICIO).filter(
+            Servicio.id_servicio == id_servicio
+        ).first()
         return servicio.to_dict() if servicio else None
     finally:
         session.close()
@@ -202,7 +246,7 @@ def guardar_servicio(nombre_servicio, unidad_cobro, precio_base, id_maquina_suge
             tipo_material=tipo_material
         )
         session.add(servicio)
-        session.commit()
+        cache_catalogos.confirmar_cambio(session)
         return servicio.id_servicio
     except SQLAlchemyError as e:
         session.rollback()
@@ -242,7 +286,7 @@ def actualizar_servicio(id_servicio, nombre_servicio, unidad_cobro, precio_base,
             servicio.precio_base = precio_base
             servicio.id_maquina_sugerida = id_maquina_sugerida
             servicio.tipo_material = tipo_material
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -267,7 +311,7 @@ def eliminar_servicio(id_servicio):
         servicio = session.query(Servicio).filter(Servicio.id_servicio == id_servicio).first()
         if servicio:
             session.delete(servicio)
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -327,7 +371,7 @@ def agregar_material_a_servicio(id_servicio, id_material):
                 id_material=id_material
             )
             session.add(servicio_material)
-            session.commit()
+            cache_catalogos.confirmar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
             return True
         return False
     except SQLAlchemyError:
@@ -346,9 +390,9 @@ def obtener_materiales():
     Returns:
         list: Lista de diccionarios con datos de materiales
     """
-    session = get_session()
+    session = get_read_session()
     try:
-        materiales = session.query(Material).order_by(Material.nombre_material).all()
+        materiales = session.query(Material).options(*CARGA_MATERIAL).order_by(Material.nombre_material).all()
         return [material.to_dict() for material in materiales]
     finally:
         session.close()
@@ -366,7 +410,9 @@ def obtener_material_por_id(id_material):
     """
     session = get_session()
     try:
-        material = session.query(Material).filter(Material.id_material == id_material).first()
+        material = session.query(Material).options(*CARGA_MATERIAL).filter(
+            Material.id_material == id_material
+        ).first()
         return material.to_dict() if material else None
     finally:
         session.close()
@@ -382,7 +428,7 @@ def obtener_materiales_bajo_stock():
     session = get_session()
     try:
         # Hacer join con inventario para verificar stock
-        materiales = session.query(Material).join(
+        materiales = session.query(Material).options(*CARGA_MATERIAL).join(
             InventarioMaterial, Material.id_material == InventarioMaterial.id_material
         ).filter(
             InventarioMaterial.cantidad_stock <= InventarioMaterial.stock_minimo
@@ -408,19 +454,20 @@ def actualizar_stock_material(id_material, cantidad, es_dimensional=False, largo
     session = get_session()
     try:
         if es_dimensional:
-            inv_dim = session.query(InventarioDimensionalMaterial).filter_by(id_material=id_material).first()
-            if inv_dim:
-                inv_dim.largo_disponible += largo_agregar
-                session.commit()
-                return True
-            return False
+            saldo = inventario.aplicar_movimiento(
+                session, id_material, 'largo', inventario.TIPO_INGRESO, largo_agregar
+            )
+            session.commit()
+            return saldo is not None
         else:
-            inventario = session.query(InventarioMaterial).filter_by(id_material=id_material).first()
-            if inventario:
-                inventario.cantidad_stock += cantidad  # SUMA, no reemplaza
-            else:
-                inventario = InventarioMaterial(id_material=id_material, cantidad_stock=cantidad)
-                session.add(inventario)
+            existe = session.query(InventarioMaterial.id_material).filter_by(id_material=id_material).first()
+            if not existe:
+                session.add(InventarioMaterial(id_material=id_material, cantidad_stock=0.0))
+                session.flush()
+            # SUMA, no reemplaza
+            inventario.aplicar_movimiento(
+                session, id_material, 'cantidad', inventario.TIPO_INGRESO, cantidad
+            )
             session.commit()
             return True
     except SQLAlchemyError as e:
@@ -442,7 +489,7 @@ def obtener_materiales_por_tipo(tipo_material='unidad'):
     """
     session = get_session()
     try:
-        materiales = session.query(Material).join(TipoMaterial).filter(
+        materiales = session.query(Material).options(*CARGA_MATERIAL).join(TipoMaterial).filter(
             TipoMaterial.nombre_tipo == tipo_material
         ).all()
         return [mat.to_dict() for mat in materiales]
@@ -461,16 +508,16 @@ def descontar_stock_material(id_material, cantidad_usada):
         cantidad_usada: Cantidad a descontar
         
     Returns:
-        bool: True si se actualizó correctamente
+        float or None: Nuevo stock, o None si no hay inventario o stock suficiente
     """
     session = get_session()
     try:
-        inventario = session.query(InventarioMaterial).filter_by(id_material=id_material).first()
-        if inventario:
-            inventario.cantidad_stock -= cantidad_usada
-            session.commit()
-            return True
-        return False
+        nuevo_stock = inventario.aplicar_movimiento(
+            session, id_material, 'cantidad', inventario.TIPO_CONSUMO, -cantidad_usada,
+            exigir_stock=True
+        )
+        session.commit()
+        return nuevo_stock
     except SQLAlchemyError as e:
         session.rollback()
         raise Exception(f"Error al descontar stock: {str(e)}")
@@ -478,6 +525,57 @@ def descontar_stock_material(id_material, cantidad_usada):
         session.close()
 
 
+def descontar_stock_lote(consumos, es_dimensional=False):
+    """
+    Descuenta el stock de varios materiales en una sola transacción
+    
+    Todo o nada: si algún material no tiene stock suficiente no se
+    descuenta ninguno. Las cantidades repetidas de un mismo material se
+    suman y se envían como un solo lote de UPDATE condicionales.
+    
+    Args:
+        consumos: Lista de tuplas (id_material, cantidad)
+        es_dimensional: Si es True descuenta largo_disponible en lugar de cantidad_stock
+        
+    Returns:
+        dict: {id_material: nuevo valor}
+    """
+    dimension = 'largo' if es_dimensional else 'cantidad'
+    
+    totales = {}
+    for id_material, cantidad in consumos:
+        totales[id_material] = totales.get(id_material, 0) + cantidad
+    if not totales:
+        return {}
+    
+    session = get_session()
+    try:
+        nuevos = inventario.aplicar_consumos_lote(session, dimension, totales)
+        if nuevos is None:
+            session.rollback()
+            # Tras el rollback se leen los valores previos al lote
+            columna = inventario.COLUMNAS_STOCK[dimension]
+            modelo = columna.class_
+            actuales = dict(
+                session.query(modelo.id_material, columna)
+                .filter(modelo.id_material.in_(totales.keys()))
+                .all()
+            )
+            faltantes = [
+                id_m for id_m, cant in totales.items()
+                if actuales.get(id_m) is None or actuales[id_m] < cant
+            ]
+            raise Exception(f"Stock insuficiente para los materiales: {faltantes}")
+        
+        session.commit()
+        return nuevos
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Error al descontar stock en lote: {str(e)}")
+    finally:
+        session.close()
+
+
 def guardar_material(nombre, cantidad, unidad, stock_minimo=5, precio=0, 
                     tipo_material='unidad', sugerencia='', categoria_material='General',
                     ancho_disponible=0.0, largo_disponible=0.0, 
@@ -530,27 +628,36 @@ def guardar_material(nombre, cantidad, unidad, stock_minimo=5, precio=0,
         session.flush()
         
         if tipo_material == 'dimension':
-            # Crear inventario dimensional
+            # Crear inventario dimensional (el largo entra como ingreso)
             inv_dim = InventarioDimensionalMaterial(
                 id_material=material.id_material,
                 ancho_disponible=ancho_disponible,
-                largo_disponible=largo_disponible,
+                largo_disponible=0.0,
                 ancho_minimo=ancho_minimo,
                 largo_minimo=largo_minimo,
                 es_continuo=es_continuo
             )
             session.add(inv_dim)
+            dimension, stock_inicial = 'largo', largo_disponible
         else:
-            # Crear inventario de unidades
-            inventario = InventarioMaterial(
+            # Crear inventario de unidades (la cantidad entra como ingreso)
+            inv_unidad = InventarioMaterial(
                 id_material=material.id_material,
-                cantidad_stock=cantidad,
+                cantidad_stock=0.0,
                 stock_minimo=stock_minimo,
                 precio_compra_promedio=precio
             )
-            session.add(inventario)
+            session.add(inv_unidad)
+            dimension, stock_inicial = 'cantidad', cantidad
         
-        session.commit()
+        session.flush()
+        if stock_inicial:
+            inventario.aplicar_movimiento(
+                session, material.id_material, dimension, inventario.TIPO_INGRESO,
+                stock_inicial, observacion='Stock inicial'
+            )
+        
+        cache_catalogos.confirmar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
         return material.id_material
     except SQLAlchemyError as e:
         session.rollback()
@@ -592,17 +699,19 @@ def actualizar_material(id_material, nombre, cantidad, unidad, stock_minimo, pre
         material.id_unidad_inventario = unidad_med.id_unidad
         material.sugerencia = sugerencia
         
+        # El stock se fija con movimientos de ajuste para que el libro cuadre
         if tipo_material == 'dimension':
-            # Eliminar inventario de unidades si existe
+            # Eliminar inventario de unidades si existe (su saldo sale a 0)
             inv_unidad = session.query(InventarioMaterial).filter_by(id_material=id_material).first()
             if inv_unidad:
+                inventario.fijar_saldo(session, id_material, 'cantidad', 0.0,
+                                       observacion='Cambio a material dimensional')
                 session.delete(inv_unidad)
             
             # Actualizar o crear inventario dimensional
             inv_dim = session.query(InventarioDimensionalMaterial).filter_by(id_material=id_material).first()
             if inv_dim:
                 inv_dim.ancho_disponible = ancho_disponible
-                inv_dim.largo_disponible = largo_disponible
                 inv_dim.ancho_minimo = ancho_minimo
                 inv_dim.largo_minimo = largo_minimo
                 inv_dim.es_continuo = es_continuo
@@ -610,34 +719,39 @@ def actualizar_material(id_material, nombre, cantidad, unidad, stock_minimo, pre
                 inv_dim = InventarioDimensionalMaterial(
                     id_material=id_material,
                     ancho_disponible=ancho_disponible,
-                    largo_disponible=largo_disponible,
+                    largo_disponible=0.0,
                     ancho_minimo=ancho_minimo,
                     largo_minimo=largo_minimo,
                     es_continuo=es_continuo
                 )
                 session.add(inv_dim)
+            session.flush()
+            inventario.fijar_saldo(session, id_material, 'largo', largo_disponible)
         else:
-            # Eliminar inventario dimensional si existe
+            # Eliminar inventario dimensional si existe (su saldo sale a 0)
             inv_dim = session.query(InventarioDimensionalMaterial).filter_by(id_material=id_material).first()
             if inv_dim:
+                inventario.fijar_saldo(session, id_material, 'largo', 0.0,
+                                       observacion='Cambio a material por unidades')
                 session.delete(inv_dim)
             
             # Actualizar o crear inventario de unidades
-            inventario = session.query(InventarioMaterial).filter_by(id_material=id_material).first()
-            if inventario:
-                inventario.cantidad_stock = cantidad
-                inventario.stock_minimo = stock_minimo
-                inventario.precio_compra_promedio = precio
+            inv_unidad = session.query(InventarioMaterial).filter_by(id_material=id_material).first()
+            if inv_unidad:
+                inv_unidad.stock_minimo = stock_minimo
+                inv_unidad.precio_compra_promedio = precio
             else:
-                inventario = InventarioMaterial(
+                inv_unidad = InventarioMaterial(
                     id_material=id_material,
-                    cantidad_stock=cantidad,
+                    cantidad_stock=0.0,
                     stock_minimo=stock_minimo,
                     precio_compra_promedio=precio
                 )
-                session.add(inventario)
+                session.add(inv_unidad)
+            session.flush()
+            inventario.fijar_saldo(session, id_material, 'cantidad', cantidad)
         
-        session.commit()
+        cache_catalogos.confirmar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
         return True
     except SQLAlchemyError as e:
         session.rollback()
@@ -663,10 +777,12 @@ def agregar_stock_dimensional(id_material, ancho_agregar=0.0, largo_agregar=0.0)
         inv_dim = session.query(InventarioDimensionalMaterial).filter_by(id_material=id_material).first()
         if inv_dim:
             if largo_agregar > 0:
-                inv_dim.largo_disponible += largo_agregar
+                inventario.aplicar_movimiento(
+                    session, id_material, 'largo', inventario.TIPO_INGRESO, largo_agregar
+                )
             if ancho_agregar > 0:
                 inv_dim.ancho_disponible = ancho_agregar  # El ancho generalmente se reemplaza
-            session.commit()
+            cache_catalogos.confirmar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
             return True
         return False
     except SQLAlchemyError as e:
@@ -685,18 +801,17 @@ def descontar_stock_dimensional(id_material, largo_usado=0.0):
         largo_usado: Largo a descontar
         
     Returns:
-        bool: True si se actualizó correctamente
+        float or None: Nuevo largo disponible, o None si no hay inventario
+                       dimensional o el largo no alcanza
     """
     session = get_session()
     try:
-        inv_dim = session.query(InventarioDimensionalMaterial).filter_by(id_material=id_material).first()
-        if inv_dim:
-            inv_dim.largo_disponible -= largo_usado
-            if inv_dim.largo_disponible < 0:
-                inv_dim.largo_disponible = 0
-            session.commit()
-            return True
-        return False
+        nuevo_largo = inventario.aplicar_movimiento(
+            session, id_material, 'largo', inventario.TIPO_CONSUMO, -largo_usado,
+            exigir_stock=True
+        )
+        session.commit()
+        return nuevo_largo
     except SQLAlchemyError as e:
         session.rollback()
         raise Exception(f"Error al descontar stock dimensional: {str(e)}")
@@ -713,7 +828,7 @@ def obtener_materiales_dimensionales_bajo_stock():
     """
     session = get_session()
     try:
-        materiales = session.query(Material).join(
+        materiales = session.query(Material).options(*CARGA_MATERIAL).join(
             InventarioDimensionalMaterial, Material.id_material == InventarioDimensionalMaterial.id_material
         ).filter(
             or_(
@@ -789,7 +904,7 @@ def eliminar_material(id_material):
         material = session.query(Material).filter(Material.id_material == id_material).first()
         if material:
             session.delete(material)
-            session.commit()
+            cache_catalogos.confirmar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
             return True
         return False
     except SQLAlchemyError as e:
@@ -811,9 +926,9 @@ def obtener_pedidos(estado=None):
     Returns:
         list: Lista de pedidos con información completa
     """
-    session = get_session()
+    session = get_read_session()
     try:
-        query = session.query(Pedido)
+        query = session.query(Pedido).options(*CARGA_PEDIDO)
         
         if estado:
             query = query.join(EstadoPedido).filter(EstadoPedido.nombre == estado)
@@ -836,7 +951,10 @@ def obtener_pedido_por_id(id_pedido):
     """
     session = get_session()
     try:
-        pedido = session.query(Pedido).filter(Pedido.id_pedido == id_pedido).first()
+        pedido = session.query(Pedido).options(
+            *CARGA_PEDIDO,
+            selectinload(Pedido.detalles).options(*CARGA_DETALLE)
+        ).filter(Pedido.id_pedido == id_pedido).first()
         if not pedido:
             return None
         
@@ -848,6 +966,31 @@ def obtener_pedido_por_id(id_pedido):
         session.close()
 
 
+def _nuevo_pedido(session, id_cliente, fecha_entrega, estado, estado_pago, costo_total,
+                  acuenta, observaciones):
+    """Agrega un Pedido a la sesión y le asigna ID (no hace commit)"""
+    # Obtener el ID del estado por nombre
+    estado_obj = session.query(EstadoPedido).filter(EstadoPedido.nombre == estado).first()
+    id_estado = estado_obj.id if estado_obj else 1
+
+    # Convertir fecha_entrega a datetime si es string
+    if isinstance(fecha_entrega, str):
+        fecha_entrega = datetime.fromisoformat(fecha_entrega)
+
+    pedido = Pedido(
+        id_cliente=id_cliente,
+        fecha_entrega_estimada=fecha_entrega,
+        id_estado=id_estado,
+        estado_pago=estado_pago,
+        costo_total=costo_total,
+        acuenta=acuenta,
+        observaciones=observaciones
+    )
+    session.add(pedido)
+    session.flush()
+    return pedido
+
+
 def guardar_pedido(id_cliente, fecha_entrega, estado="Cotizado", estado_pago="Pendiente", 
                    costo_total=0, acuenta=0, observaciones=""):
     """
@@ -867,25 +1010,50 @@ def guardar_pedido(id_cliente, fecha_entrega, estado="Cotizado", estado_pago="Pe
     """
     session = get_session()
     try:
-        # Obtener el ID del estado por nombre
-        estado_obj = session.query(EstadoPedido).filter(EstadoPedido.nombre == estado).first()
-        id_estado = estado_obj.id if estado_obj else 1
-        
-        # Convertir fecha_entrega a datetime si es string
-        if isinstance(fecha_entrega, str):
-            fecha_entrega = datetime.fromisoformat(fecha_entrega)
-        
-        pedido = Pedido(
-            id_cliente=id_cliente,
-            fecha_entrega_estimada=fecha_entrega,
-            id_estado=id_estado,
-            estado_pago=estado_pago,
-            costo_total=costo_total,
-            acuenta=acuenta,
-            observaciones=observaciones
-        )
-        session.add(pedido)
+        pedido = _nuevo_pedido(session, id_cliente, fecha_entrega, estado, estado_pago,
+                               costo_total, acuenta, observaciones)
+        resumen_diario.refrescar_pedido(session, pedido.id_pedido)
         session.commit()
+        _invalidar_total_pedidos()
+        return pedido.id_pedido
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Error al guardar pedido: {str(e)}")
+    finally:
+        session.close()
+
+
+def guardar_pedido_con_detalles(id_cliente, fecha_entrega, detalles, estado="Cotizado",
+                                estado_pago="Pendiente", costo_total=0, acuenta=0, observaciones=""):
+    """
+    Crea un pedido junto con sus detalles en una sola transacción
+
+    Si falla cualquier inserción no queda guardado nada (ni la cabecera).
+
+    Args:
+        id_cliente: ID del cliente que hace el pedido
+        fecha_entrega: Fecha de entrega estimada
+        detalles: Lista de diccionarios {id_servicio, id_material, descripcion,
+                  ancho, alto, cantidad, precio_unitario}
+        estado: Estado inicial del pedido
+        estado_pago: Estado de pago inicial
+        costo_total: Costo total del pedido
+        acuenta: Monto pagado a cuenta
+        observaciones: Observaciones del pedido
+
+    Returns:
+        int: ID del pedido creado
+    """
+    session = get_session()
+    try:
+        pedido = _nuevo_pedido(session, id_cliente, fecha_entrega, estado, estado_pago,
+                               costo_total, acuenta, observaciones)
+        session.add_all([
+            DetallePedido(id_pedido=pedido.id_pedido, **detalle) for detalle in detalles
+        ])
+        resumen_diario.refrescar_pedido(session, pedido.id_pedido)
+        session.commit()
+        _invalidar_total_pedidos()
         return pedido.id_pedido
     except SQLAlchemyError as e:
         session.rollback()
@@ -934,7 +1102,9 @@ def actualizar_estado_de_pedido(id_pedido, id_estado=None, nombre_estado=None):
         
         if id_estado:
             pedido.id_estado = id_estado
+            resumen_diario.refrescar_pedido(session, id_pedido)
             session.commit()
+            _invalidar_total_pedidos()
             return True
         return False
     except SQLAlchemyError as e:
@@ -963,6 +1133,7 @@ def actualizar_estado_pago(id_pedido, nuevo_estado, monto_acuenta=0):
             pedido.estado_pago = nuevo_estado
             if monto_acuenta > 0:
                 pedido.acuenta = monto_acuenta
+                resumen_diario.refrescar_pedido(session, id_pedido)
             session.commit()
             return True
         return False
@@ -1005,6 +1176,7 @@ def guardar_detalle_pedido(id_pedido, id_servicio, id_material, descripcion, anc
             precio_unitario=precio_unitario
         )
         session.add(detalle)
+        resumen_diario.refrescar_pedido(session, id_pedido)
         session.commit()
         return detalle.id_detalle
     except SQLAlchemyError as e:
@@ -1014,12 +1186,270 @@ def guardar_detalle_pedido(id_pedido, id_servicio, id_material, descripcion, anc
         session.close()
 
 
+# ========== RESÚMENES DIARIOS ==========
+
+def reconstruir_resumenes_diarios(desde=None, hasta=None):
+    """
+    Recalcula los resúmenes diarios a partir de pedidos y detalles
+
+    Se usa para la carga inicial o para corregir un rango; el día a día
+    se mantiene solo al guardar pedidos.
+
+    Args:
+        desde: Primer día incluido (None = desde el primer pedido)
+        hasta: Último día incluido (None = hasta el último pedido)
+
+    Returns:
+        int: Filas de resumen escritas
+    """
+    session = get_session()
+    try:
+        filas = resumen_diario.reconstruir(session, desde, hasta)
+        session.commit()
+        return filas
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Error al reconstruir resúmenes diarios: {str(e)}")
+    finally:
+        session.close()
+
+
+# ========== CARGA DE PRODUCCIÓN ==========
+
+def obtener_carga_produccion(ids_estados):
+    """
+    Agrega la carga de los pedidos en cola sin traerlos a memoria
+
+    Dos GROUP BY acotados por ix_pedidos_estado_fecha: el costo depende de
+    los pedidos en cola, no del historial.
+
+    Args:
+        ids_estados: IDs de los estados que cuentan como cola
+
+    Returns:
+        dict: {
+            'por_estado': {id_estado: {'pedidos', 'pedidos_sin_detalle'}},
+            'por_servicio': {id_servicio: {
+                'lineas_con_area', 'area_m2',      # ítems con área (ancho*alto*cantidad)
+                'unidades_sin_area', 'lineas_vacias'  # ítems por cantidad / sin cantidad
+            }}
+        }
+    """
+    session = get_read_session()
+    try:
+        tiene_detalle = exists().where(DetallePedido.id_pedido == Pedido.id_pedido)
+        por_estado = {
+            id_estado: {'pedidos': pedidos, 'pedidos_sin_detalle': sin_detalle or 0}
+            for id_estado, pedidos, sin_detalle in session.query(
+                Pedido.id_estado,
+                func.count(Pedido.id_pedido),
+                func.sum(case((tiene_detalle, 0), else_=1))
+            ).filter(Pedido.id_estado.in_(ids_estados)).group_by(Pedido.id_estado).all()
+        }
+
+        area = (func.coalesce(DetallePedido.ancho, 0.0) * func.coalesce(DetallePedido.alto, 0.0)
+                * DetallePedido.cantidad)
+        con_area = area > 0
+        por_servicio = {
+            id_servicio: {
+                'lineas_con_area': lineas_area or 0,
+                'area_m2': area_m2 or 0.0,
+                'unidades_sin_area': unidades or 0,
+                'lineas_vacias': vacias or 0
+            }
+            for id_servicio, lineas_area, area_m2, unidades, vacias in session.query(
+                DetallePedido.id_servicio,
+                func.sum(case((con_area, 1), else_=0)),
+                func.sum(case((con_area, area), else_=0.0)),
+                func.sum(case((and_(~con_area, DetallePedido.cantidad > 0), DetallePedido.cantidad), else_=0)),
+                func.sum(case((and_(~con_area, DetallePedido.cantidad <= 0), 1), else_=0))
+            ).join(
+                Pedido, Pedido.id_pedido == DetallePedido.id_pedido
+            ).filter(Pedido.id_estado.in_(ids_estados)).group_by(DetallePedido.id_servicio).all()
+        }
+        return {'por_estado': por_estado, 'por_servicio': por_servicio}
+    finally:
+        session.close()
+
+
+# ========== PLANIFICACIÓN DE PRODUCCIÓN ==========
+
+def obtener_trabajos_en_cola(ids_estados, ids_pedidos=None, ids_detalles=None, id_material=None):
+    """
+    Detalles de pedidos en cola con los datos que usa el planificador
+
+    Args:
+        ids_estados: IDs de los estados que cuentan como cola
+        ids_pedidos: Limitar a estos pedidos (opcional)
+        ids_detalles: Limitar a estos detalles (opcional)
+        id_material: Limitar a los detalles de este material (opcional)
+
+    Returns:
+        list: Diccionarios {id_detalle, id_pedido, id_servicio, id_material,
+              ancho, alto, cantidad, prioridad, fecha_entrega_estimada,
+              fecha_ingreso}
+    """
+    session = get_read_session()
+    try:
+        query = session.query(
+            DetallePedido.id_detalle, DetallePedido.id_pedido, DetallePedido.id_servicio,
+            DetallePedido.id_material, DetallePedido.ancho, DetallePedido.alto, DetallePedido.cantidad,
+            Pedido.prioridad, Pedido.fecha_entrega_estimada, Pedido.fecha_ingreso
+        ).join(
+            Pedido, Pedido.id_pedido == DetallePedido.id_pedido
+        ).filter(Pedido.id_estado.in_(ids_estados))
+
+        if ids_pedidos is not None:
+            query = query.filter(DetallePedido.id_pedido.in_(ids_pedidos))
+        if ids_detalles is not None:
+            query = query.filter(DetallePedido.id_detalle.in_(ids_detalles))
+        if id_material is not None:
+            query = query.filter(DetallePedido.id_material == id_material)
+        return [dict(fila._mapping) for fila in query.all()]
+    finally:
+        session.close()
+
+
+def obtener_maquinas_para_planificar():
+    """
+    Máquinas compatibles por servicio y velocidad de cada máquina
+
+    Usa maquinas_servicios; si un servicio no tiene ninguna asociada se
+    toma su id_maquina_sugerida.
+
+    Returns:
+        dict: {
+            'compatibles': {id_servicio: {id_maquina: es_recomendada}},
+            'velocidades': {id_maquina: velocidad_promedio},
+            'nombres': {id_maquina: nombre}
+        }
+    """
+    session = get_read_session()
+    try:
+        compatibles = {}
+        for id_servicio, id_maquina, recomendada in session.query(
+                MaquinaServicio.id_servicio, MaquinaServicio.id_maquina, MaquinaServicio.es_recomendada).all():
+            compatibles.setdefault(id_servicio, {})[id_maquina] = bool(recomendada)
+
+        for id_servicio, id_maquina in session.query(
+                Servicio.id_servicio, Servicio.id_maquina_sugerida
+        ).filter(Servicio.id_maquina_sugerida.isnot(None)).all():
+            if id_servicio not in compatibles:
+                compatibles[id_servicio] = {id_maquina: True}
+
+        maquinas = session.query(
+            Maquina.id_maquina, Maquina.nombre, CapacidadMaquina.velocidad_promedio
+        ).outerjoin(CapacidadMaquina, CapacidadMaquina.id_maquina == Maquina.id_maquina).all()
+
+        return {
+            'compatibles': compatibles,
+            'velocidades': {id_maquina: velocidad for id_maquina, _, velocidad in maquinas},
+            'nombres': {id_maquina: nombre for id_maquina, nombre, _ in maquinas}
+        }
+    finally:
+        session.close()
+
+
+def obtener_plan_produccion(ids_maquinas=None, ids_pedidos=None):
+    """
+    Lee el plan de producción guardado
+
+    Args:
+        ids_maquinas: Limitar a estas máquinas (opcional)
+        ids_pedidos: Limitar a estos pedidos (opcional)
+
+    Returns:
+        list: Filas del plan (to_dict) ordenadas por máquina y secuencia
+    """
+    session = get_read_session()
+    try:
+        query = session.query(PlanProduccion)
+        if ids_maquinas is not None:
+            query = query.filter(PlanProduccion.id_maquina.in_(ids_maquinas))
+        if ids_pedidos is not None:
+            query = query.filter(PlanProduccion.id_pedido.in_(ids_pedidos))
+        filas = query.order_by(PlanProduccion.id_maquina, PlanProduccion.secuencia).all()
+        return [fila.to_dict() for fila in filas]
+    finally:
+        session.close()
+
+
+def reemplazar_plan_produccion(ids_maquinas, filas, ids_detalles=()):
+    """
+    Reescribe el plan de un grupo de máquinas en una transacción
+
+    Borra las filas de esas máquinas (y las de ids_detalles, que pueden
+    estar en otra máquina o haber salido de la cola) e inserta las nuevas.
+    El plan de las demás máquinas no se toca.
+
+    Args:
+        ids_maquinas: Máquinas cuyo plan se reemplaza (None = todas)
+        filas: Diccionarios con las columnas de PlanProduccion
+        ids_detalles: Detalles a quitar del plan aunque estén en otras máquinas
+
+    Returns:
+        int: Filas insertadas
+    """
+    session = get_session()
+    try:
+        borrar = session.query(PlanProduccion)
+        if ids_maquinas is not None:
+            borrar = borrar.filter(or_(
+                PlanProduccion.id_maquina.in_(ids_maquinas),
+                PlanProduccion.id_detalle.in_(list(ids_detalles))
+            ))
+        borrar.delete(synchronize_session=False)
+
+        if filas:
+            ahora = datetime.now()
+            session.execute(insert(PlanProduccion), [
+                dict(fila, fecha_planificacion=ahora) for fila in filas
+            ])
+        session.commit()
+        return len(filas)
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Error al guardar plan de producción: {str(e)}")
+    finally:
+        session.close()
+
+
+def actualizar_prioridad_pedido(id_pedido, prioridad):
+    """
+    Cambia la prioridad de planificación de un pedido
+
+    Args:
+        id_pedido: ID del pedido
+        prioridad: 0 = normal, 1 = urgente (mayor va primero)
+
+    Returns:
+        bool: True si el pedido existe
+    """
+    session = get_session()
+    try:
+        actualizados = session.query(Pedido).filter(Pedido.id_pedido == id_pedido).update(
+            {Pedido.prioridad: prioridad}, synchronize_session=False
+        )
+        session.commit()
+        return actualizados > 0
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Error al actualizar prioridad: {str(e)}")
+    finally:
+        session.close()
+
+
 # ========== CONSUMO DE MATERIALES ==========
 
 def registrar_consumo_material(id_detalle, id_material, cantidad_usada):
     """
     Registra el consumo de material y descuenta del stock
     
+    El registro y el descuento van en la misma transacción: si el material
+    no tiene stock suficiente no se registra el consumo. Los materiales con
+    inventario por unidades descuentan cantidad_stock; los dimensionales,
+    largo_disponible.
+    
     Args:
         id_detalle: ID del detalle de pedido
         id_material: ID del material consumido
@@ -1030,6 +1460,18 @@ def registrar_consumo_material(id_detalle, id_material, cantidad_usada):
     """
     session = get_session()
     try:
+        # Descontar del stock del inventario que tenga el material
+        dimension = inventario.detectar_dimension(session, id_material)
+        nuevo_valor = None
+        if dimension:
+            nuevo_valor = inventario.aplicar_movimiento(
+                session, id_material, dimension, inventario.TIPO_CONSUMO, -cantidad_usada,
+                id_detalle=id_detalle, exigir_stock=True
+            )
+        if nuevo_valor is None:
+            session.rollback()
+            raise Exception(f"Stock insuficiente del material {id_material} para consumir {cantidad_usada}")
+        
         # Registrar consumo
         consumo = ConsumoMaterial(
             id_detalle=id_detalle,
@@ -1037,12 +1479,6 @@ def registrar_consumo_material(id_detalle, id_material, cantidad_usada):
             cantidad_usada=cantidad_usada
         )
         session.add(consumo)
-        
-        # Descontar del stock
-        material = session.query(Material).filter(Material.id_material == id_material).first()
-        if material:
-            material.cantidad_stock -= cantidad_usada
-        
         session.commit()
         return consumo.id_consumo
     except SQLAlchemyError as e:
@@ -1062,9 +1498,9 @@ def obtener_historial_consumo(id_material=None):
     Returns:
         list: Lista de registros de consumo
     """
-    session = get_session()
+    session = get_read_session()
     try:
-        query = session.query(ConsumoMaterial)
+        query = session.query(ConsumoMaterial).options(joinedload(ConsumoMaterial.material))
         
         if id_material:
             query = query.filter(ConsumoMaterial.id_material == id_material)
@@ -1075,6 +1511,138 @@ def obtener_historial_consumo(id_material=None):
         session.close()
 
 
+# ========== MOVIMIENTOS DE INVENTARIO ==========
+
+def registrar_movimiento_inventario(id_material, tipo, cantidad, observacion=None, dimension=None):
+    """
+    Registra un movimiento de inventario y actualiza el stock
+    
+    Args:
+        id_material: ID del material
+        tipo: 'ingreso', 'consumo', 'ajuste' o 'retazo'
+        cantidad: Delta con signo (negativo para descontar)
+        observacion: Motivo del movimiento (opcional)
+        dimension: 'cantidad' o 'largo'; si se omite se detecta por el inventario del material
+        
+    Returns:
+        float or None: Nuevo saldo, o None si no hay inventario o el stock no alcanza
+    """
+    if tipo not in inventario.TIPOS_MOVIMIENTO:
+        raise ValueError(f"Tipo de movimiento inválido: {tipo}")
+    
+    session = get_session()
+    try:
+        dimension = dimension or inventario.detectar_dimension(session, id_material)
+        if not dimension:
+            return None
+        saldo = inventario.aplicar_movimiento(
+            session, id_material, dimension, tipo, cantidad,
+            observacion=observacion, exigir_stock=(tipo != inventario.TIPO_AJUSTE)
+        )
+        session.commit()
+        return saldo
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Error al registrar movimiento: {str(e)}")
+    finally:
+        session.close()
+
+
+def obtener_movimientos_inventario(id_material=None, desde=None, hasta=None, limite=500):
+    """
+    Obtiene los movimientos del libro de inventario, del más reciente al más antiguo
+    
+    Args:
+        id_material: ID del material para filtrar (opcional)
+        desde: Fecha inicial (opcional)
+        hasta: Fecha final (opcional)
+        limite: Máximo de movimientos a devolver
+        
+    Returns:
+        list: Lista de diccionarios con movimientos
+    """
+    session = get_read_session()
+    try:
+        query = session.query(MovimientoInventario)
+        if id_material:
+            query = query.filter(MovimientoInventario.id_material == id_material)
+        if desde:
+            query = query.filter(MovimientoInventario.fecha >= desde)
+        if hasta:
+            query = query.filter(MovimientoInventario.fecha <= hasta)
+        movimientos = query.order_by(MovimientoInventario.id_movimiento.desc()).limit(limite).all()
+        return [mov.to_dict() for mov in movimientos]
+    finally:
+        session.close()
+
+
+def obtener_stock_en_fecha(id_material, fecha, dimension=None):
+    """
+    Obtiene el stock que tenía un material en una fecha pasada
+    
+    Lee el último snapshot anterior a la fecha y le suma los movimientos
+    posteriores (no recorre todo el historial).
+    
+    Args:
+        id_material: ID del material
+        fecha: Fecha de consulta (datetime o ISO)
+        dimension: 'cantidad' o 'largo'; si se omite se detecta por el inventario del material
+        
+    Returns:
+        float: Stock a esa fecha
+    """
+    if isinstance(fecha, str):
+        fecha = datetime.fromisoformat(fecha)
+    
+    session = get_read_session()
+    try:
+        dimension = dimension or inventario.detectar_dimension(session, id_material) or 'cantidad'
+        return inventario.stock_en_fecha(session, id_material, dimension, fecha)
+    finally:
+        session.close()
+
+
+def generar_snapshot_inventario(fecha_corte=None):
+    """
+    Guarda un snapshot con el saldo de todos los materiales
+    
+    Args:
+        fecha_corte: Fecha del corte (por defecto, ahora)
+        
+    Returns:
+        int: Cantidad de saldos guardados
+    """
+    session = get_session()
+    try:
+        cantidad = inventario.generar_snapshot(session, fecha_corte)
+        session.commit()
+        return cantidad
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Error al generar snapshot de inventario: {str(e)}")
+    finally:
+        session.close()
+
+
+def asegurar_snapshot_inventario(dias=INVENTARIO_DIAS_SNAPSHOT):
+    """
+    Genera un snapshot si el último tiene más de 'dias' de antigüedad
+    Se llama al iniciar la aplicación
+    
+    Returns:
+        int: Cantidad de saldos guardados (0 si no hacía falta)
+    """
+    session = get_read_session()
+    try:
+        ultima = inventario.ultima_fecha_snapshot(session)
+    finally:
+        session.close()
+    
+    if ultima is not None and datetime.now() - ultima < timedelta(days=dias):
+        return 0
+    return generar_snapshot_inventario()
+
+
 # ========== MÁQUINAS ==========
 
 def obtener_maquinas():
@@ -1086,7 +1654,7 @@ def obtener_maquinas():
     """
     session = get_session()
     try:
-        maquinas = session.query(Maquina).all()
+        maquinas = session.query(Maquina).options(*CARGA_MAQUINA).all()
         return [maquina.to_dict() for maquina in maquinas]
     finally:
         session.close()
@@ -1104,7 +1672,9 @@ def obtener_maquina_por_id(id_maquina):
     """
     session = get_session()
     try:
-        maquina = session.query(Maquina).filter(Maquina.id_maquina == id_maquina).first()
+        maquina = session.query(Maquina).options(*CARGA_MAQUINA).filter(
+            Maquina.id_maquina == id_maquina
+        ).first()
         return maquina.to_dict() if maquina else None
     finally:
         session.close()
@@ -1133,7 +1703,7 @@ def guardar_maquina(nombre, tipo, sugerencia=''):
         
         maquina = Maquina(nombre=nombre, id_tipo_maquina=tipo_maq.id_tipo_maquina, sugerencia=sugerencia)
         session.add(maquina)
-        session.commit()
+        cache_catalogos.confirmar_cambio(session)
         return maquina.id_maquina
     except SQLAlchemyError as e:
         session.rollback()
@@ -1169,7 +1739,7 @@ def actualizar_maquina(id_maquina, nombre, tipo, sugerencia=''):
             maquina.nombre = nombre
             maquina.id_tipo_maquina = tipo_maq.id_tipo_maquina
             maquina.sugerencia = sugerencia
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1194,7 +1764,7 @@ def eliminar_maquina(id_maquina):
         maquina = session.query(Maquina).filter(Maquina.id_maquina == id_maquina).first()
         if maquina:
             session.delete(maquina)
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1204,6 +1774,61 @@ def eliminar_maquina(id_maquina):
         session.close()
 
 
+def obtener_capacidad_maquina(id_maquina):
+    """
+    Obtiene las capacidades físicas de una máquina
+    
+    Args:
+        id_maquina: ID de la máquina
+        
+    Returns:
+        dict: {ancho_util_max, largo_util_max, velocidad_promedio} o None
+    """
+    session = get_read_session()
+    try:
+        capacidad = session.query(CapacidadMaquina).filter(
+            CapacidadMaquina.id_maquina == id_maquina
+        ).first()
+        if not capacidad:
+            return None
+        return {
+            'ancho_util_max': capacidad.ancho_util_max,
+            'largo_util_max': capacidad.largo_util_max,
+            'velocidad_promedio': capacidad.velocidad_promedio
+        }
+    finally:
+        session.close()
+
+
+def guardar_capacidad_maquina(id_maquina, ancho_util_max, largo_util_max, velocidad_promedio):
+    """
+    Crea o actualiza las capacidades físicas de una máquina
+    
+    Args:
+        id_maquina: ID de la máquina
+        ancho_util_max: Ancho máximo útil en metros
+        largo_util_max: Largo máximo útil en metros (0 = ilimitado)
+        velocidad_promedio: Unidades por hora
+    """
+    session = get_session()
+    try:
+        capacidad = session.query(CapacidadMaquina).filter(
+            CapacidadMaquina.id_maquina == id_maquina
+        ).first()
+        if not capacidad:
+            capacidad = CapacidadMaquina(id_maquina=id_maquina)
+            session.add(capacidad)
+        capacidad.ancho_util_max = ancho_util_max
+        capacidad.largo_util_max = largo_util_max
+        capacidad.velocidad_promedio = velocidad_promedio
+        cache_catalogos.confirmar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Error al guardar capacidad de máquina: {str(e)}")
+    finally:
+        session.close()
+
+
 # ========== MATERIALES POR TIPO Y ANCHO ==========
 
 def obtener_materiales_por_tipo_y_ancho(tipo_material):
@@ -1220,7 +1845,7 @@ def obtener_materiales_por_tipo_y_ancho(tipo_material):
     """
     session = get_session()
     try:
-        materiales = session.query(Material).filter(
+        materiales = session.query(Material).options(*CARGA_MATERIAL).filter(
             and_(
                 Material.nombre_material.ilike(f"%{tipo_material}%"),
                 Material.ancho_bobina > 0
@@ -1243,7 +1868,9 @@ def obtener_rollo_por_id(id_material):
     """
     session = get_session()
     try:
-        material = session.query(Material).filter(Material.id_material == id_material).first()
+        material = session.query(Material).options(*CARGA_MATERIAL).filter(
+            Material.id_material == id_material
+        ).first()
         return material.to_dict() if material else None
     finally:
         session.close()
@@ -1260,16 +1887,17 @@ def actualizar_stock_rollo(id_material, metros_a_descontar):
         metros_a_descontar: Metros a descontar (positivo)
         
     Returns:
-        bool: True si se actualizó correctamente
+        float or None: Metros que quedan en el rollo, o None si no es un
+                       rollo o no tiene suficiente largo
     """
     session = get_session()
     try:
-        material = session.query(Material).filter(Material.id_material == id_material).first()
-        if material:
-            material.cantidad_stock -= metros_a_descontar
-            session.commit()
-            return True
-        return False
+        nuevo_largo = inventario.aplicar_movimiento(
+            session, id_material, 'largo', inventario.TIPO_CONSUMO, -metros_a_descontar,
+            exigir_stock=True, observacion='Descuento de rollo'
+        )
+        session.commit()
+        return nuevo_largo
     except SQLAlchemyError as e:
         session.rollback()
         raise Exception(f"Error al actualizar stock de rollo: {str(e)}")
@@ -1284,9 +1912,14 @@ def obtener_estados_pedidos():
     Obtiene todos los estados de pedidos
     
     Returns:
-        list: Lista de diccionarios con datos de estados
+        tuple: Registros de solo lectura con datos de estados (cacheados)
     """
-    session = get_session()
+    return cache_catalogos.obtener_catalogo('estados_pedidos', _cargar_estados_pedidos)
+
+
+def _cargar_estados_pedidos():
+    """Lee los estados de pedidos desde la BD para la caché de catálogos"""
+    session = get_read_session()
     try:
         estados = session.query(EstadoPedido).all()
         return [estado.to_dict() for estado in estados]
@@ -1345,7 +1978,7 @@ def guardar_estado_pedido(nombre, color='#808080'):
     try:
         estado = EstadoPedido(nombre=nombre, color=color)
         session.add(estado)
-        session.commit()
+        cache_catalogos.confirmar_cambio(session)
         return estado.id
     except SQLAlchemyError as e:
         session.rollback()
@@ -1362,7 +1995,7 @@ def actualizar_estado_pedido(id_estado, nombre, color='#808080'):
         if estado:
             estado.nombre = nombre
             estado.color = color
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1381,7 +2014,7 @@ def eliminar_estado_pedido(id_estado):
             if estado.pedidos:
                 raise Exception("No se puede eliminar: hay pedidos con este estado")
             session.delete(estado)
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1398,9 +2031,14 @@ def obtener_unidades_medida():
     Obtiene todas las unidades de medida
     
     Returns:
-        list: Lista de diccionarios con datos de unidades
+        tuple: Registros de solo lectura con datos de unidades (cacheados)
     """
-    session = get_session()
+    return cache_catalogos.obtener_catalogo('unidades_medida', _cargar_unidades_medida)
+
+
+def _cargar_unidades_medida():
+    """Lee las unidades de medida desde la BD para la caché de catálogos"""
+    session = get_read_session()
     try:
         unidades = session.query(UnidadMedida).order_by(UnidadMedida.nombre_unidad).all()
         return [unidad.to_dict() for unidad in unidades]
@@ -1430,7 +2068,7 @@ def guardar_unidad_medida(nombre, abreviacion, tipo, factor_conversion=1.0):
             factor_conversion=factor_conversion
         )
         session.add(unidad)
-        session.commit()
+        cache_catalogos.confirmar_cambio(session)
         return unidad.id_unidad
     except SQLAlchemyError as e:
         session.rollback()
@@ -1449,7 +2087,7 @@ def actualizar_unidad_medida(id_unidad, nombre, abreviacion, tipo, factor_conver
             unidad.abreviacion = abreviacion
             unidad.tipo = tipo
             unidad.factor_conversion = factor_conversion
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1468,7 +2106,7 @@ def eliminar_unidad_medida(id_unidad):
             if unidad.materiales or unidad.servicios:
                 raise Exception("No se puede eliminar: la unidad está en uso")
             session.delete(unidad)
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1495,9 +2133,14 @@ def obtener_tipos_maquina():
     Obtiene todos los tipos de máquina
     
     Returns:
-        list: Lista de diccionarios con datos de tipos
+        tuple: Registros de solo lectura con datos de tipos (cacheados)
     """
-    session = get_session()
+    return cache_catalogos.obtener_catalogo('tipos_maquina', _cargar_tipos_maquina)
+
+
+def _cargar_tipos_maquina():
+    """Lee los tipos de máquina desde la BD para la caché de catálogos"""
+    session = get_read_session()
     try:
         tipos = session.query(TipoMaquina).order_by(TipoMaquina.nombre_tipo).all()
         return [tipo.to_dict() for tipo in tipos]
@@ -1519,7 +2162,7 @@ def guardar_tipo_maquina(nombre):
     try:
         tipo = TipoMaquina(nombre_tipo=nombre)
         session.add(tipo)
-        session.commit()
+        cache_catalogos.confirmar_cambio(session)
         return tipo.id_tipo_maquina
     except SQLAlchemyError as e:
         session.rollback()
@@ -1535,7 +2178,7 @@ def actualizar_tipo_maquina(id_tipo, nombre):
         tipo = session.query(TipoMaquina).filter(TipoMaquina.id_tipo_maquina == id_tipo).first()
         if tipo:
             tipo.nombre_tipo = nombre
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1554,7 +2197,7 @@ def eliminar_tipo_maquina(id_tipo):
             if tipo.maquinas:
                 raise Exception("No se puede eliminar: hay máquinas de este tipo")
             session.delete(tipo)
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1581,9 +2224,14 @@ def obtener_tipos_material():
     Obtiene todos los tipos de material
     
     Returns:
-        list: Lista de diccionarios con datos de tipos
+        tuple: Registros de solo lectura con datos de tipos (cacheados)
     """
-    session = get_session()
+    return cache_catalogos.obtener_catalogo('tipos_material', _cargar_tipos_material)
+
+
+def _cargar_tipos_material():
+    """Lee los tipos de material desde la BD para la caché de catálogos"""
+    session = get_read_session()
     try:
         tipos = session.query(TipoMaterial).order_by(TipoMaterial.nombre_tipo).all()
         return [tipo.to_dict() for tipo in tipos]
@@ -1605,7 +2253,7 @@ def guardar_tipo_material(nombre):
     try:
         tipo = TipoMaterial(nombre_tipo=nombre)
         session.add(tipo)
-        session.commit()
+        cache_catalogos.confirmar_cambio(session)
         return tipo.id_tipo_material
     except SQLAlchemyError as e:
         session.rollback()
@@ -1621,7 +2269,7 @@ def actualizar_tipo_material(id_tipo, nombre):
         tipo = session.query(TipoMaterial).filter(TipoMaterial.id_tipo_material == id_tipo).first()
         if tipo:
             tipo.nombre_tipo = nombre
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1640,7 +2288,7 @@ def eliminar_tipo_material(id_tipo):
             if tipo.materiales:
                 raise Exception("No se puede eliminar: hay materiales de este tipo")
             session.delete(tipo)
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1660,6 +2308,74 @@ def obtener_tipo_material_por_nombre(nombre):
         session.close()
 
 
+# ========== CATÁLOGO: FERIADOS ==========
+
+def obtener_feriados():
+    """
+    Obtiene los feriados ordenados por fecha
+    
+    Returns:
+        tuple: Registros de solo lectura con datos de feriados (cacheados)
+    """
+    return cache_catalogos.obtener_catalogo('feriados', _cargar_feriados)
+
+
+def _cargar_feriados():
+    """Lee los feriados desde la BD para la caché de catálogos"""
+    session = get_read_session()
+    try:
+        feriados = session.query(Feriado).order_by(Feriado.fecha).all()
+        return [feriado.to_dict() for feriado in feriados]
+    finally:
+        session.close()
+
+
+def guardar_feriado(fecha, descripcion=''):
+    """
+    Registra un feriado
+    
+    Args:
+        fecha: date o string ISO (AAAA-MM-DD)
+        descripcion: Motivo del feriado
+        
+    Returns:
+        int: ID del feriado creado
+    """
+    if isinstance(fecha, str):
+        fecha = datetime.fromisoformat(fecha).date()
+    elif isinstance(fecha, datetime):
+        fecha = fecha.date()
+
+    session = get_session()
+    try:
+        feriado = Feriado(fecha=fecha, descripcion=descripcion)
+        session.add(feriado)
+        cache_catalogos.confirmar_cambio(session)
+        return feriado.id_feriado
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Error al guardar feriado: {str(e)}")
+    finally:
+        session.close()
+
+
+def eliminar_feriado(id_feriado):
+    """Elimina un feriado"""
+    session = get_session()
+    try:
+        feriado = session.query(Feriado).filter(Feriado.id_feriado == id_feriado).first()
+        if feriado:
+            session.delete(feriado)
+            cache_catalogos.confirmar_cambio(session)
+            return True
+        return False
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Error al eliminar feriado: {str(e)}")
+    finally:
+        session.close()
+
+
 # ========== REGLAS DE NEGOCIO: PRECIOS ESCALONADOS ==========
 
 def obtener_precios_escalonados(id_servicio=None):
@@ -1674,7 +2390,7 @@ def obtener_precios_escalonados(id_servicio=None):
     """
     session = get_session()
     try:
-        query = session.query(PrecioEscalonado)
+        query = session.query(PrecioEscalonado).options(joinedload(PrecioEscalonado.servicio))
         if id_servicio:
             query = query.filter(PrecioEscalonado.id_servicio == id_servicio)
         precios = query.order_by(PrecioEscalonado.id_servicio, PrecioEscalonado.cantidad_minima).all()
@@ -1711,7 +2427,7 @@ def guardar_precio_escalonado(id_servicio, cantidad_minima, cantidad_maxima, pre
             precio_unitario=precio_unitario
         )
         session.add(precio)
-        session.commit()
+        cache_catalogos.confirmar_cambio(session)
         return precio.id
     except SQLAlchemyError as e:
         session.rollback()
@@ -1729,7 +2445,7 @@ def actualizar_precio_escalonado(id_precio, cantidad_minima, cantidad_maxima, pr
             precio.cantidad_minima = cantidad_minima
             precio.cantidad_maxima = cantidad_maxima
             precio.precio_unitario = precio_unitario
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1746,7 +2462,7 @@ def eliminar_precio_escalonado(id_precio):
         precio = session.query(PrecioEscalonado).filter(PrecioEscalonado.id == id_precio).first()
         if precio:
             session.delete(precio)
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1768,21 +2484,63 @@ def obtener_precio_por_cantidad(id_servicio, cantidad):
     Returns:
         float or None: Precio unitario o None si no hay regla
     """
-    session = get_session()
-    try:
-        # Buscar precio escalonado que aplique
-        precio = session.query(PrecioEscalonado).filter(
-            PrecioEscalonado.id_servicio == id_servicio,
-            PrecioEscalonado.cantidad_minima <= cantidad,
-            or_(
-                PrecioEscalonado.cantidad_maxima >= cantidad,
-                PrecioEscalonado.cantidad_maxima == None
-            )
-        ).first()
+    # Búsqueda binaria sobre los tramos en memoria (sin sesión ni consulta)
+    indice = _obtener_indices_precios().get(id_servicio)
+    return indice.precio(cantidad) if indice else None
+
+
+def obtener_precios_por_cantidades(id_servicio, cantidades):
+    """
+    Obtiene el precio unitario de varias cantidades de un servicio a la vez
+    
+    Args:
+        id_servicio: ID del servicio
+        cantidades: Lista de cantidades a consultar
         
-        return precio.precio_unitario if precio else None
-    finally:
-        session.close()
+    Returns:
+        list: Precio unitario (o None) para cada cantidad, en el mismo orden
+    """
+    indice = _obtener_indices_precios().get(id_servicio)
+    if not indice:
+        return [None] * len(cantidades)
+    return [indice.precio(cantidad) for cantidad in cantidades]
+
+
+def obtener_conflictos_precios(id_servicio=None):
+    """
+    Obtiene los tramos de precios escalonados que se solapan
+    
+    Args:
+        id_servicio: ID del servicio para filtrar (opcional)
+        
+    Returns:
+        dict: {id_servicio: [(id_precio, id_precio), ...]} solo de servicios con conflictos
+    """
+    indices = _obtener_indices_precios()
+    if id_servicio is not None:
+        indices = {id_servicio: indices[id_servicio]} if id_servicio in indices else {}
+    return {ids: indice.conflictos for ids, indice in indices.items() if indice.conflictos}
+
+
+def obtener_tramos_precios():
+    """
+    Tramos de precio vigentes de todos los servicios, ya sin solapamientos
+    
+    Returns:
+        dict: {id_servicio: (inicios, fines, precios)} con listas ordenadas
+              por cantidad inicial (fin None = sin límite)
+    """
+    return {
+        id_servicio: (list(indice.inicios), list(indice.fines), list(indice.precios))
+        for id_servicio, indice in _obtener_indices_precios().items()
+    }
+
+
+def _obtener_indices_precios():
+    """Índices de precios por servicio, cacheados con la versión de catálogos"""
+    return cache_catalogos.obtener_compilado(
+        'indices_precios', reglas_negocio.construir_indices_precios
+    )
 
 
 # ========== REGLAS DE NEGOCIO: RESTRICCIONES DE CANTIDAD ==========
@@ -1799,7 +2557,7 @@ def obtener_restricciones_cantidad(id_servicio=None):
     """
     session = get_session()
     try:
-        query = session.query(RestriccionCantidad)
+        query = session.query(RestriccionCantidad).options(joinedload(RestriccionCantidad.servicio))
         if id_servicio:
             query = query.filter(RestriccionCantidad.id_servicio == id_servicio)
         restricciones = query.all()
@@ -1846,7 +2604,7 @@ def guardar_restriccion_cantidad(id_servicio, tipo_restriccion, valores_permitid
             mensaje_error=mensaje_error
         )
         session.add(restriccion)
-        session.commit()
+        cache_catalogos.confirmar_cambio(session)
         return restriccion.id
     except SQLAlchemyError as e:
         session.rollback()
@@ -1870,7 +2628,7 @@ def actualizar_restriccion_cantidad(id_restriccion, tipo_restriccion, valores_pe
             restriccion.cantidad_minima = cantidad_minima
             restriccion.cantidad_maxima = cantidad_maxima
             restriccion.mensaje_error = mensaje_error
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1887,7 +2645,7 @@ def eliminar_restriccion_cantidad(id_restriccion):
         restriccion = session.query(RestriccionCantidad).filter(RestriccionCantidad.id == id_restriccion).first()
         if restriccion:
             session.delete(restriccion)
-            session.commit()
+            cache_catalogos.confirmar_cambio(session)
             return True
         return False
     except SQLAlchemyError as e:
@@ -1902,6 +2660,9 @@ def validar_cantidad_servicio(id_servicio, cantidad):
     Valida si una cantidad es permitida para un servicio según sus restricciones.
     Usado por el motor de cálculos.
     
+    Las restricciones se compilan una vez en validadores en memoria
+    (ver reglas_negocio) y se reconstruyen al cambiar las reglas.
+    
     Args:
         id_servicio: ID del servicio
         cantidad: Cantidad a validar
@@ -1909,79 +2670,286 @@ def validar_cantidad_servicio(id_servicio, cantidad):
     Returns:
         tuple: (es_valido: bool, mensaje: str, cantidad_sugerida: int)
     """
-    session = get_session()
-    try:
-        restriccion = session.query(RestriccionCantidad).filter(
-            RestriccionCantidad.id_servicio == id_servicio
-        ).first()
-        
-        if not restriccion:
-            # Sin restricciones, cualquier cantidad es válida
-            return True, "Cantidad válida", cantidad
-        
-        tipo = restriccion.tipo_restriccion
-        
-        if tipo == 'lista':
-            # Validar contra lista de valores permitidos
-            valores = [int(v.strip()) for v in restriccion.valores_permitidos.split(',')]
-            
-            # Agregar múltiplos si están definidos
-            if restriccion.multiplo_base and restriccion.multiplo_desde:
-                for i in range(1, 51):
-                    multiplo = restriccion.multiplo_base * i
-                    if multiplo >= restriccion.multiplo_desde and multiplo not in valores:
-                        valores.append(multiplo)
-            
-            valores.sort()
-            
-            if cantidad in valores:
-                return True, "Cantidad válida", cantidad
-            
-            # Encontrar cantidad sugerida más cercana
-            cantidad_sugerida = min(valores, key=lambda x: abs(x - cantidad))
-            mensaje = restriccion.mensaje_error or f"Cantidad inválida. Opciones: {', '.join(map(str, valores[:10]))}..."
-            return False, mensaje, cantidad_sugerida
-            
-        elif tipo == 'multiplo':
-            base = restriccion.multiplo_base or 1
-            desde = restriccion.multiplo_desde or 1
-            
-            if cantidad < desde:
-                return False, f"La cantidad mínima es {desde}", desde
-            
-            if cantidad % base == 0:
-                return True, "Cantidad válida", cantidad
-            
-            cantidad_sugerida = round(cantidad / base) * base
-            if cantidad_sugerida < desde:
-                cantidad_sugerida = desde
-            mensaje = restriccion.mensaje_error or f"Solo se permiten múltiplos de {base}"
-            return False, mensaje, cantidad_sugerida
-            
-        elif tipo == 'rango':
-            min_cant = restriccion.cantidad_minima or 1
-            max_cant = restriccion.cantidad_maxima or 999999
-            
-            if min_cant <= cantidad <= max_cant:
-                return True, "Cantidad válida", cantidad
-            
-            if cantidad < min_cant:
-                return False, f"La cantidad mínima es {min_cant}", min_cant
-            else:
-                return False, f"La cantidad máxima es {max_cant}", max_cant
-        
+    validador = cache_catalogos.obtener_compilado(
+        'validadores_cantidad', reglas_negocio.construir_validadores_cantidad
+    ).get(id_servicio)
+    
+    if validador is None:
+        # Sin restricciones, cualquier cantidad es válida
         return True, "Cantidad válida", cantidad
+    return validador.validar(cantidad)
+
+
+# ========== FUNCIONES AVANZADAS DE PEDIDOS ==========
+
+# Campos por los que se puede ordenar el listado de pedidos
+CAMPOS_ORDEN_PEDIDOS = (
+    'id_pedido', 'id_estado', 'fecha_ingreso', 'fecha_entrega_estimada', 'costo_total'
+)
+
+# Segundos que se reutiliza el total de un mismo filtro. Las escrituras de
+# esta sesión lo invalidan antes; el TTL cubre las de otras instancias.
+TTL_TOTAL_PEDIDOS = 30
+
+# {(filtro_estado, desde, hasta): (total, instante)}
+_cache_total_pedidos = {}
+
+
+def _invalidar_total_pedidos():
+    """Descarta los totales de pedidos cacheados tras una escritura"""
+    _cache_total_pedidos.clear()
+
+
+def _filtrar_pedidos(query, filtro_estado, fecha_ingreso_desde, fecha_ingreso_hasta):
+    """
+    Aplica los filtros de estado y rango de fecha de ingreso
+
+    Returns:
+        tuple: (query filtrada, clave de los filtros para la caché de totales)
+    """
+    if filtro_estado:
+        query = query.filter(Pedido.id_estado == filtro_estado)
+
+    if fecha_ingreso_desde:
+        if isinstance(fecha_ingreso_desde, str):
+            fecha_ingreso_desde = datetime.fromisoformat(fecha_ingreso_desde)
+        query = query.filter(Pedido.fecha_ingreso >= fecha_ingreso_desde)
+
+    if fecha_ingreso_hasta:
+        if isinstance(fecha_ingreso_hasta, str):
+            fecha_ingreso_hasta = datetime.fromisoformat(fecha_ingreso_hasta)
+        query = query.filter(Pedido.fecha_ingreso <= fecha_ingreso_hasta)
+
+    return query, (filtro_estado, fecha_ingreso_desde, fecha_ingreso_hasta)
+
+
+def _contar_pedidos(query, clave):
+    """
+    Cuenta los pedidos de una query filtrada reutilizando el total cacheado
+
+    Args:
+        query: Query de Pedido ya filtrada
+        clave: Clave de los filtros devuelta por _filtrar_pedidos
+
+    Returns:
+        int: Total de pedidos que cumplen los filtros
+    """
+    ahora = time.monotonic()
+    cacheado = _cache_total_pedidos.get(clave)
+    if cacheado and ahora - cacheado[1] < TTL_TOTAL_PEDIDOS:
+        return cacheado[0]
+
+    # COUNT(*) directo sobre la tabla, sin la subconsulta de query.count()
+    total = query.with_entities(func.count(Pedido.id_pedido)).order_by(None).scalar() or 0
+    _cache_total_pedidos[clave] = (total, ahora)
+    return total
+
+
+def _condicion_despues_de(columna, valor, id_pedido, descendente):
+    """
+    Condición "fila posterior al cursor" para ORDER BY columna, id_pedido
+
+    SQLite ordena los NULL primero en ASC y al final en DESC, así que la
+    condición los ubica en el mismo lugar que el ORDER BY.
+
+    Args:
+        columna: Columna de ordenamiento
+        valor: Valor de la columna en la fila del cursor (puede ser None)
+        id_pedido: ID del pedido de la fila del cursor
+        descendente: True si el recorrido es descendente
+    """
+    if columna is Pedido.id_pedido:
+        return Pedido.id_pedido < id_pedido if descendente else Pedido.id_pedido > id_pedido
+
+    desempate = Pedido.id_pedido < id_pedido if descendente else Pedido.id_pedido > id_pedido
+
+    if valor is None:
+        if descendente:
+            # Los NULL van al final: solo quedan NULL con menor ID
+            return and_(columna.is_(None), desempate)
+        # Los NULL van primero: siguen los NULL con mayor ID y todos los no NULL
+        return or_(and_(columna.is_(None), desempate), columna.isnot(None))
+
+    mismo_valor = and_(columna == valor, desempate)
+    if descendente:
+        return or_(columna < valor, mismo_valor, columna.is_(None))
+    return or_(columna > valor, mismo_valor)
+
+
+def obtener_pedidos_keyset(filtro_estado=None, fecha_ingreso_desde=None,
+                           fecha_ingreso_hasta=None, orden_campo='fecha_ingreso',
+                           orden_direccion='DESC', cursor=None, hacia='siguiente',
+                           items_por_pagina=20):
+    """
+    Obtiene una página de pedidos con paginación por cursor (keyset)
+
+    En lugar de OFFSET (que recorre y descarta todas las filas anteriores)
+    filtra a partir de la última fila vista, ordenando por
+    (orden_campo, id_pedido). Cualquier página cuesta lo mismo que la primera.
+
+    Args:
+        filtro_estado: ID del estado para filtrar
+        fecha_ingreso_desde: Fecha desde (formato ISO o datetime)
+        fecha_ingreso_hasta: Fecha hasta (formato ISO o datetime)
+        orden_campo: Campo para ordenar (uno de CAMPOS_ORDEN_PEDIDOS)
+        orden_direccion: 'ASC' o 'DESC'
+        cursor: Tupla (valor de orden_campo, id_pedido) devuelta en
+                'cursor_siguiente' o 'cursor_anterior'; None para la primera página
+        hacia: 'siguiente' o 'anterior' respecto al cursor
+        items_por_pagina: Cantidad de items por página
+
+    Returns:
+        dict: Diccionario con 'pedidos', 'total', 'total_paginas',
+              'items_por_pagina', 'cursor_siguiente', 'cursor_anterior',
+              'hay_siguiente' y 'hay_anterior'
+    """
+    if orden_campo not in CAMPOS_ORDEN_PEDIDOS:
+        orden_campo = 'fecha_ingreso'
+    columna = getattr(Pedido, orden_campo)
+    descendente = orden_direccion.upper() == 'DESC'
+    retroceder = cursor is not None and hacia == 'anterior'
+
+    # Hacia atrás se recorre en sentido inverso y luego se invierte la página
+    recorrido_desc = descendente != retroceder
+
+    session = get_read_session()
+    try:
+        query, clave = _filtrar_pedidos(
+            session.query(Pedido), filtro_estado, fecha_ingreso_desde, fecha_ingreso_hasta
+        )
+        total = _contar_pedidos(query, clave)
+
+        if cursor is not None:
+            valor, id_cursor = cursor
+            query = query.filter(_condicion_despues_de(columna, valor, id_cursor, recorrido_desc))
+
+        if columna is Pedido.id_pedido:
+            orden = [columna.desc() if recorrido_desc else columna.asc()]
+        elif recorrido_desc:
+            orden = [columna.desc(), Pedido.id_pedido.desc()]
+        else:
+            orden = [columna.asc(), Pedido.id_pedido.asc()]
+
+        # Una fila extra indica si hay más páginas en el sentido del recorrido
+        filas = query.order_by(*orden).options(*CARGA_PEDIDO).limit(items_por_pagina + 1).all()
+        hay_mas = len(filas) > items_por_pagina
+        filas = filas[:items_por_pagina]
+        if retroceder:
+            filas.reverse()
+
+        if retroceder:
+            hay_siguiente, hay_anterior = True, hay_mas
+        else:
+            hay_siguiente, hay_anterior = hay_mas, cursor is not None
+
+        def _cursor(pedido):
+            return (getattr(pedido, orden_campo), pedido.id_pedido)
+
+        return {
+            'pedidos': [pedido.to_dict() for pedido in filas],
+            'total': total,
+            'total_paginas': (total + items_por_pagina - 1) // items_por_pagina,
+            'items_por_pagina': items_por_pagina,
+            'cursor_siguiente': _cursor(filas[-1]) if filas and hay_siguiente else None,
+            'cursor_anterior': _cursor(filas[0]) if filas and hay_anterior else None,
+            'hay_siguiente': hay_siguiente,
+            'hay_anterior': hay_anterior
+        }
     finally:
         session.close()
 
 
-# ========== FUNCIONES AVANZADAS DE PEDIDOS ==========
+# Filas por lote al exportar pedidos (yield_per del cursor)
+TAMANO_LOTE_EXPORTACION = 1000
+
+# Columnas de cada fila de iterar_pedidos_exportacion, en orden
+COLUMNAS_EXPORTACION_PEDIDOS = [
+    'id_pedido', 'nombre_cliente', 'telefono', 'fecha_ingreso', 'fecha_entrega_estimada',
+    'estado_nombre', 'estado_pago', 'costo_total', 'acuenta', 'saldo', 'prioridad', 'observaciones'
+]
+
+
+def iterar_pedidos_exportacion(filtro_estado=None, fecha_ingreso_desde=None,
+                               fecha_ingreso_hasta=None, orden_campo='fecha_ingreso',
+                               orden_direccion='DESC', tamano_lote=TAMANO_LOTE_EXPORTACION):
+    """
+    Recorre todos los pedidos que cumplen los filtros, por lotes
+
+    Es un generador: el SELECT (solo las columnas exportadas, con cliente
+    y estado en el mismo JOIN) se lee del cursor de a tamano_lote filas
+    (stream_results / yield_per), así que el primer lote sale enseguida y
+    la memoria no crece con el historial. No crea objetos ORM ni llama a
+    to_dict(). La sesión de lectura queda abierta hasta agotar o cerrar
+    el generador.
+
+    Args:
+        filtro_estado: ID del estado para filtrar
+        fecha_ingreso_desde: Fecha desde (formato ISO o datetime)
+        fecha_ingreso_hasta: Fecha hasta (formato ISO o datetime)
+        orden_campo: Campo para ordenar (uno de CAMPOS_ORDEN_PEDIDOS)
+        orden_direccion: 'ASC' o 'DESC'
+        tamano_lote: Filas por lote
+
+    Yields:
+        list: Lote de tuplas con los valores de COLUMNAS_EXPORTACION_PEDIDOS
+              (fechas en formato ISO)
+    """
+    if orden_campo not in CAMPOS_ORDEN_PEDIDOS:
+        orden_campo = 'fecha_ingreso'
+    columna = getattr(Pedido, orden_campo)
+    if orden_direccion.upper() == 'DESC':
+        orden = [columna.desc(), Pedido.id_pedido.desc()]
+    else:
+        orden = [columna.asc(), Pedido.id_pedido.asc()]
+
+    session = get_read_session()
+    try:
+        query = session.query(
+            Pedido.id_pedido,
+            Cliente.nombre_completo,
+            Cliente.telefono,
+            Pedido.fecha_ingreso,
+            Pedido.fecha_entrega_estimada,
+            EstadoPedido.nombre,
+            Pedido.estado_pago,
+            Pedido.costo_total,
+            Pedido.acuenta,
+            func.coalesce(Pedido.costo_total, 0.0) - func.coalesce(Pedido.acuenta, 0.0),
+            func.coalesce(Pedido.prioridad, 0),
+            Pedido.observaciones
+        ).outerjoin(
+            Cliente, Cliente.id_cliente == Pedido.id_cliente
+        ).outerjoin(
+            EstadoPedido, EstadoPedido.id == Pedido.id_estado
+        )
+        query, _ = _filtrar_pedidos(query, filtro_estado, fecha_ingreso_desde, fecha_ingreso_hasta)
+
+        resultado = session.execute(
+            query.order_by(*orden).statement.execution_options(
+                stream_results=True, yield_per=tamano_lote
+            )
+        )
+        for lote in resultado.partitions():
+            yield [
+                (id_pedido, cliente, telefono,
+                 ingreso.isoformat() if ingreso else None,
+                 entrega.isoformat() if entrega else None,
+                 estado, pago, costo, acuenta, saldo, prioridad, observaciones)
+                for (id_pedido, cliente, telefono, ingreso, entrega, estado, pago,
+                     costo, acuenta, saldo, prioridad, observaciones) in lote
+            ]
+    finally:
+        session.close()
+
 
 def obtener_pedidos_filtrados(filtro_estado=None, fecha_ingreso_desde=None, 
                               fecha_ingreso_hasta=None, orden_campo='fecha_ingreso', 
                               orden_direccion='DESC', pagina=1, items_por_pagina=20):
     """
-    Obtiene pedidos con filtros, ordenamiento y paginación
+    Obtiene pedidos con filtros, ordenamiento y paginación por número de página
+
+    Para recorrer páginas consecutivas usar obtener_pedidos_keyset, que no
+    depende de OFFSET y mantiene el costo constante en páginas profundas.
     
     Args:
         filtro_estado: ID del estado para filtrar
@@ -1995,40 +2963,27 @@ def obtener_pedidos_filtrados(filtro_estado=None, fecha_ingreso_desde=None,
     Returns:
         dict: Diccionario con 'pedidos', 'total', 'pagina_actual', 'total_paginas'
     """
-    session = get_session()
+    session = get_read_session()
     try:
-        # Construir query base
-        query = session.query(Pedido)
-        
-        # Aplicar filtros
-        if filtro_estado:
-            query = query.filter(Pedido.id_estado == filtro_estado)
-        
-        if fecha_ingreso_desde:
-            if isinstance(fecha_ingreso_desde, str):
-                fecha_ingreso_desde = datetime.fromisoformat(fecha_ingreso_desde)
-            query = query.filter(Pedido.fecha_ingreso >= fecha_ingreso_desde)
-        
-        if fecha_ingreso_hasta:
-            if isinstance(fecha_ingreso_hasta, str):
-                fecha_ingreso_hasta = datetime.fromisoformat(fecha_ingreso_hasta)
-            query = query.filter(Pedido.fecha_ingreso <= fecha_ingreso_hasta)
+        query, clave = _filtrar_pedidos(
+            session.query(Pedido), filtro_estado, fecha_ingreso_desde, fecha_ingreso_hasta
+        )
         
-        # Contar total de resultados
-        total = query.count()
+        # Contar total de resultados (cacheado por filtro)
+        total = _contar_pedidos(query, clave)
         
-        # Aplicar ordenamiento
+        # Aplicar ordenamiento (id_pedido desempata para un orden estable)
         campo_orden = getattr(Pedido, orden_campo, Pedido.fecha_ingreso)
         if orden_direccion.upper() == 'DESC':
-            query = query.order_by(campo_orden.desc())
+            query = query.order_by(campo_orden.desc(), Pedido.id_pedido.desc())
         else:
-            query = query.order_by(campo_orden.asc())
+            query = query.order_by(campo_orden.asc(), Pedido.id_pedido.asc())
         
         # Calcular offset para paginación
         offset = (pagina - 1) * items_por_pagina
         
-        # Aplicar paginación
-        pedidos = query.limit(items_por_pagina).offset(offset).all()
+        # Aplicar paginación (relaciones cargadas en el mismo SELECT)
+        pedidos = query.options(*CARGA_PEDIDO).limit(items_por_pagina).offset(offset).all()
         
         # Calcular total de páginas
         total_paginas = (total + items_por_pagina - 1) // items_por_pagina
@@ -2076,7 +3031,7 @@ def asociar_material_a_servicio(id_servicio, id_material, es_preferido=False):
             es_preferido=1 if es_preferido else 0
         )
         session.add(asociacion)
-        session.commit()
+        cache_catalogos.confirmar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
         return True
     except SQLAlchemyError:
         session.rollback()
@@ -2105,7 +3060,7 @@ def desasociar_material_de_servicio(id_servicio, id_material):
         
         if asociacion:
             session.delete(asociacion)
-            session.commit()
+            cache_catalogos.confirmar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
             return True
         return False
     except SQLAlchemyError:
@@ -2128,7 +3083,7 @@ def obtener_materiales_por_servicio(id_servicio, solo_preferidos=False):
     """
     session = get_session()
     try:
-        query = session.query(Material, ServicioMaterial).join(
+        query = session.query(Material, ServicioMaterial).options(*CARGA_MATERIAL).join(
             ServicioMaterial,
             Material.id_material == ServicioMaterial.id_material
         ).filter(ServicioMaterial.id_servicio == id_servicio)
@@ -2161,7 +3116,7 @@ def obtener_servicios_por_material(id_material):
     """
     session = get_session()
     try:
-        servicios = session.query(Servicio).join(
+        servicios = session.query(Servicio).options(*CARGA_SERVICIO).join(
             ServicioMaterial,
             Servicio.id_servicio == ServicioMaterial.id_servicio
         ).filter(ServicioMaterial.id_material == id_material).all()
@@ -2192,7 +3147,7 @@ def marcar_material_preferido(id_servicio, id_material, es_preferido=True):
         
         if asociacion:
             asociacion.es_preferido = 1 if es_preferido else 0
-            session.commit()
+            cache_catalogos.confirmar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
             return True
         return False
     except SQLAlchemyError:
@@ -2220,7 +3175,7 @@ def obtener_materiales_disponibles_para_servicio(id_servicio):
         ).scalar_subquery()
         
         # Materiales que NO están en la lista de asociados
-        materiales = session.query(Material).filter(
+        materiales = session.query(Material).options(*CARGA_MATERIAL).filter(
             ~Material.id_material.in_(ids_asociados)
         ).order_by(Material.nombre_material).all()
         
@@ -2261,7 +3216,7 @@ def asociar_servicio_a_maquina(id_maquina, id_servicio, es_recomendada=False):
             es_recomendada=1 if es_recomendada else 0
         )
         session.add(asociacion)
-        session.commit()
+        cache_catalogos.confirmar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
         return True
     except SQLAlchemyError:
         session.rollback()
@@ -2290,7 +3245,7 @@ def desasociar_servicio_de_maquina(id_maquina, id_servicio):
         
         if asociacion:
             session.delete(asociacion)
-            session.commit()
+            cache_catalogos.confirmar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
             return True
         return False
     except SQLAlchemyError:
@@ -2313,7 +3268,7 @@ def obtener_servicios_por_maquina(id_maquina, solo_recomendados=False):
     """
     session = get_session()
     try:
-        query = session.query(Servicio, MaquinaServicio).join(
+        query = session.query(Servicio, MaquinaServicio).options(*CARGA_SERVICIO).join(
             MaquinaServicio,
             Servicio.id_servicio == MaquinaServicio.id_servicio
         ).filter(MaquinaServicio.id_maquina == id_maquina)
@@ -2346,7 +3301,7 @@ def obtener_maquinas_por_servicio(id_servicio):
     """
     session = get_session()
     try:
-        maquinas = session.query(Maquina).join(
+        maquinas = session.query(Maquina).options(*CARGA_MAQUINA).join(
             MaquinaServicio,
             Maquina.id_maquina == MaquinaServicio.id_maquina
         ).filter(MaquinaServicio.id_servicio == id_servicio).all()
@@ -2377,7 +3332,7 @@ def marcar_maquina_recomendada(id_maquina, id_servicio, es_recomendada=True):
         
         if asociacion:
             asociacion.es_recomendada = 1 if es_recomendada else 0
-            session.commit()
+            cache_catalogos.confirmar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
             return True
         return False
     except SQLAlchemyError:
@@ -2405,7 +3360,7 @@ def obtener_servicios_disponibles_para_maquina(id_maquina):
         ).scalar_subquery()
         
         # Servicios que NO están en la lista de asociados
-        servicios = session.query(Servicio).filter(
+        servicios = session.query(Servicio).options(*CARGA_SERVICIO).filter(
             ~Servicio.id_servicio.in_(ids_asociados)
         ).order_by(Servicio.nombre_servicio).all()
         
@@ -2460,6 +3415,72 @@ CONFIGURACIONES_DEFECTO = [
 ]
 
 
+# Caché en memoria de todas las configuraciones {clave: valor tipado}.
+# Se carga completa con una sola consulta y las funciones que escriben en
+# configuracion_sistema la descartan (None = pendiente de cargar).
+_cache_configuracion = None
+
+
+class _ConfiguracionInvalida:
+    """Entrada de la caché cuyo valor no corresponde a su tipo_dato"""
+    __slots__ = ('config',)
+
+    def __init__(self, config):
+        self.config = config
+
+
+def _valor_configuracion(cache, clave, default=None):
+    """
+    Lee una clave de la caché de configuraciones
+
+    Como la lectura directa de la BD, un valor que no corresponde a su tipo
+    lanza el error de conversión. Los valores JSON (dict/list) se entregan
+    copiados para que quien los modifique no altere la caché compartida.
+
+    Raises:
+        ValueError: Si el valor guardado no corresponde a su tipo_dato
+    """
+    valor = cache.get(clave, default)
+    if isinstance(valor, _ConfiguracionInvalida):
+        return valor.config.get_valor_tipado()  # Vuelve a lanzar el error
+    if isinstance(valor, (dict, list)):
+        return copy.deepcopy(valor)
+    return valor
+
+
+def _obtener_cache_configuracion():
+    """
+    Devuelve la caché de configuraciones, cargándola si hace falta
+
+    Returns:
+        dict: {clave: valor tipado} de todas las configuraciones
+    """
+    global _cache_configuracion
+    cache = _cache_configuracion
+    if cache is None:
+        session = get_read_session()
+        try:
+            cache = {}
+            for config in session.query(ConfiguracionSistema).all():
+                try:
+                    cache[config.clave] = config.get_valor_tipado()
+                except (ValueError, TypeError) as e:
+                    # Se guarda para lanzar el error a quien lea esa clave
+                    print(f"⚠️ Configuración '{config.clave}' inválida para tipo "
+                          f"'{config.tipo_dato}': {e}")
+                    cache[config.clave] = _ConfiguracionInvalida(config)
+        finally:
+            session.close()
+        _cache_configuracion = cache
+    return cache
+
+
+def invalidar_cache_configuracion():
+    """Descarta la caché de configuraciones; se recarga en la próxima lectura"""
+    global _cache_configuracion
+    _cache_configuracion = None
+
+
 def obtener_configuraciones(categoria=None):
     """
     Obtiene todas las configuraciones del sistema
@@ -2492,17 +3513,7 @@ def obtener_configuracion(clave, default=None):
     Returns:
         Valor de la configuración (tipado correctamente)
     """
-    session = get_session()
-    try:
-        config = session.query(ConfiguracionSistema).filter(
-            ConfiguracionSistema.clave == clave
-        ).first()
-        
-        if config:
-            return config.get_valor_tipado()
-        return default
-    finally:
-        session.close()
+    return _valor_configuracion(_obtener_cache_configuracion(), clave, default)
 
 
 def guardar_configuracion(clave, valor, tipo_dato='str', categoria='general', descripcion=None):
@@ -2544,6 +3555,7 @@ def guardar_configuracion(clave, valor, tipo_dato='str', categoria='general', de
         
         session.commit()
         session.refresh(config)
+        invalidar_cache_configuracion()
         return config.to_dict()
     except SQLAlchemyError as e:
         session.rollback()
@@ -2572,6 +3584,7 @@ def actualizar_configuracion(clave, valor):
         if config:
             config.valor = str(valor)
             session.commit()
+            invalidar_cache_configuracion()
             return True
         return False
     except SQLAlchemyError as e:
@@ -2592,6 +3605,7 @@ def eliminar_configuracion(clave):
         if config:
             session.delete(config)
             session.commit()
+            invalidar_cache_configuracion()
             return True
         return False
     finally:
@@ -2621,6 +3635,7 @@ def inicializar_configuraciones_defecto():
                 session.add(nueva)
         
         session.commit()
+        invalidar_cache_configuracion()
     except SQLAlchemyError:
         session.rollback()
     finally:
@@ -2635,13 +3650,14 @@ def obtener_configuracion_produccion():
     Returns:
         dict: Configuraciones de producción
     """
+    cache = _obtener_cache_configuracion()
     return {
-        'hora_apertura': obtener_configuracion('hora_apertura', 8),
-        'hora_cierre': obtener_configuracion('hora_cierre', 18),
-        'dias_laborales': obtener_configuracion('dias_laborales', '1,2,3,4,5,6'),
-        'horas_laborales_dia': obtener_configuracion('horas_laborales_dia', 8),
-        'tiempo_promedio_pedido': obtener_configuracion('tiempo_promedio_pedido', 4.0),
-        'recargo_urgente': obtener_configuracion('recargo_urgente', 30),
+        'hora_apertura': _valor_configuracion(cache, 'hora_apertura', 8),
+        'hora_cierre': _valor_configuracion(cache, 'hora_cierre', 18),
+        'dias_laborales': _valor_configuracion(cache, 'dias_laborales', '1,2,3,4,5,6'),
+        'horas_laborales_dia': _valor_configuracion(cache, 'horas_laborales_dia', 8),
+        'tiempo_promedio_pedido': _valor_configuracion(cache, 'tiempo_promedio_pedido', 4.0),
+        'recargo_urgente': _valor_configuracion(cache, 'recargo_urgente', 30),
     }
 
 
@@ -2652,9 +3668,10 @@ def obtener_configuracion_negocio():
     Returns:
         dict: Configuraciones de negocio
     """
+    cache = _obtener_cache_configuracion()
     return {
-        'margen_ganancia_minimo': obtener_configuracion('margen_ganancia_minimo', 30),
-        'margen_ganancia_normal': obtener_configuracion('margen_ganancia_normal', 50),
-        'margen_ganancia_premium': obtener_configuracion('margen_ganancia_premium', 70),
-        'horas_minimas_anticipacion': obtener_configuracion('horas_minimas_anticipacion', 24),
+        'margen_ganancia_minimo': _valor_configuracion(cache, 'margen_ganancia_minimo', 30),
+        'margen_ganancia_normal': _valor_configuracion(cache, 'margen_ganancia_normal', 50),
+        'margen_ganancia_premium': _valor_configuracion(cache, 'margen_ganancia_premium', 70),
+        'horas_minimas_anticipacion': _valor_configuracion(cache, 'horas_minimas_anticipacion', 24),
     }
@@ -0,0 +1,251 @@
+"""
+Consultas agregadas para reportes y dashboard
+Devuelve indicadores calculados en SQL (COUNT / GROUP BY) en lugar de
+cargar todas las filas y contarlas en Python
+"""
+from sqlalchemy import func, select
+from app.database.conexion import get_read_session
+from app.database.models import (
+    Cliente, Material, Servicio, Pedido, UnidadMedida, InventarioMaterial,
+    ResumenDiarioPedidos, ResumenDiarioServicios
+)
+from app.database import consultas
+
+
+# Estados que ya no cuentan como pedidos activos
+ESTADOS_FINALES = ('Entregado', 'Cancelado')
+
+# Materiales que se muestran en la sección de inventario del dashboard
+MATERIALES_DASHBOARD = 5
+
+# Formato strftime de SQLite para cada agrupación de los reportes por período
+FORMATOS_PERIODO = {
+    'dia': '%Y-%m-%d',
+    'semana': '%Y-W%W',
+    'mes': '%Y-%m',
+    'anio': '%Y',
+}
+
+
+def obtener_totales_generales():
+    """
+    Cuenta clientes, materiales, servicios, pedidos y alertas de stock
+    en una sola consulta (subconsultas escalares)
+
+    Returns:
+        dict: total_clientes, total_materiales, total_servicios,
+              total_pedidos y alertas_stock
+    """
+    session = get_read_session()
+    try:
+        fila = session.execute(select(
+            select(func.count(Cliente.id_cliente)).scalar_subquery().label('total_clientes'),
+            select(func.count(Material.id_material)).scalar_subquery().label('total_materiales'),
+            select(func.count(Servicio.id_servicio)).scalar_subquery().label('total_servicios'),
+            select(func.count(Pedido.id_pedido)).scalar_subquery().label('total_pedidos'),
+            select(func.count(InventarioMaterial.id_inventario)).where(
+                InventarioMaterial.cantidad_stock <= InventarioMaterial.stock_minimo
+            ).scalar_subquery().label('alertas_stock'),
+        )).one()
+        return dict(fila._mapping)
+    finally:
+        session.close()
+
+
+def obtener_pedidos_por_estado():
+    """
+    Cuenta pedidos agrupados por estado
+
+    Returns:
+        list: Diccionarios {id_estado, nombre, color, cantidad} en el orden
+              del catálogo de estados, solo con estados que tienen pedidos.
+              Los pedidos sin estado aparecen con id_estado None.
+    """
+    session = get_read_session()
+    try:
+        conteos = dict(
+            session.query(Pedido.id_estado, func.count(Pedido.id_pedido))
+            .group_by(Pedido.id_estado)
+            .all()
+        )
+    finally:
+        session.close()
+
+    resultado = []
+    for estado in consultas.obtener_estados_pedidos():
+        cantidad = conteos.pop(estado['id'], 0)
+        if cantidad > 0:
+            resultado.append({
+                'id_estado': estado['id'],
+                'nombre': estado['nombre'],
+                'color': estado['color'],
+                'cantidad': cantidad
+            })
+
+    # Pedidos sin estado o con un estado que ya no está en el catálogo
+    sin_estado = sum(conteos.values())
+    if sin_estado:
+        resultado.append({'id_estado': None, 'nombre': None, 'color': None, 'cantidad': sin_estado})
+    return resultado
+
+
+def obtener_resumen_inventario(limite=MATERIALES_DASHBOARD):
+    """
+    Stock de los primeros materiales por nombre, solo con las columnas
+    que usa el dashboard
+
+    Args:
+        limite: Cantidad máxima de materiales
+
+    Returns:
+        list: Diccionarios {id_material, nombre_material, cantidad_stock,
+              stock_minimo, unidad_medida}
+    """
+    session = get_read_session()
+    try:
+        filas = session.query(
+            Material.id_material,
+            Material.nombre_material,
+            InventarioMaterial.cantidad_stock,
+            InventarioMaterial.stock_minimo,
+            UnidadMedida.abreviacion
+        ).outerjoin(
+            InventarioMaterial, InventarioMaterial.id_material == Material.id_material
+        ).outerjoin(
+            UnidadMedida, UnidadMedida.id_unidad == Material.id_unidad_inventario
+        ).order_by(Material.nombre_material).limit(limite).all()
+
+        # Mismos valores por defecto que Material.to_dict()
+        return [
+            {
+                'id_material': id_material,
+                'nombre_material': nombre,
+                'cantidad_stock': stock if stock is not None else 0.0,
+                'stock_minimo': minimo if minimo is not None else 5.0,
+                'unidad_medida': unidad or ''
+            }
+            for id_material, nombre, stock, minimo, unidad in filas
+        ]
+    finally:
+        session.close()
+
+
+def obtener_kpis_dashboard():
+    """
+    Reúne los indicadores del dashboard de reportes
+
+    Son tres consultas de tamaño fijo (totales, GROUP BY de estados y los
+    primeros materiales), sin importar cuántos pedidos haya.
+
+    Returns:
+        dict: Totales de obtener_totales_generales() más:
+              - pedidos_activos: Pedidos que no están en ESTADOS_FINALES
+              - pedidos_por_estado: Resultado de obtener_pedidos_por_estado()
+              - resumen_inventario: Resultado de obtener_resumen_inventario()
+    """
+    kpis = obtener_totales_generales()
+    por_estado = obtener_pedidos_por_estado()
+
+    kpis['pedidos_por_estado'] = por_estado
+    kpis['pedidos_activos'] = sum(
+        fila['cantidad'] for fila in por_estado if fila['nombre'] not in ESTADOS_FINALES
+    )
+    kpis['resumen_inventario'] = obtener_resumen_inventario()
+    return kpis
+
+
+# ========== REPORTES POR PERÍODO (RESÚMENES DIARIOS) ==========
+
+def _filtrar_fechas(query, columna, desde, hasta):
+    """Aplica un rango de días inclusivo sobre una columna Date"""
+    if desde is not None:
+        query = query.filter(columna >= desde)
+    if hasta is not None:
+        query = query.filter(columna <= hasta)
+    return query
+
+
+def obtener_ventas_por_periodo(desde=None, hasta=None, periodo='mes', id_estado=None):
+    """
+    Pedidos, importe y adelantos agrupados por día, semana, mes o año
+
+    Lee resumen_diario_pedidos (una fila por día y estado), no los pedidos.
+
+    Args:
+        desde: Primer día incluido (date, opcional)
+        hasta: Último día incluido (date, opcional)
+        periodo: 'dia', 'semana', 'mes' o 'anio'
+        id_estado: Limitar a un estado (opcional)
+
+    Returns:
+        list: Diccionarios {periodo, pedidos, importe_total, acuenta}
+              ordenados por período
+    """
+    if periodo not in FORMATOS_PERIODO:
+        raise ValueError(f"Período no válido: {periodo}")
+
+    clave = func.strftime(FORMATOS_PERIODO[periodo], ResumenDiarioPedidos.fecha)
+    session = get_read_session()
+    try:
+        query = session.query(
+            clave,
+            func.sum(ResumenDiarioPedidos.pedidos),
+            func.sum(ResumenDiarioPedidos.importe_total),
+            func.sum(ResumenDiarioPedidos.acuenta)
+        )
+        query = _filtrar_fechas(query, ResumenDiarioPedidos.fecha, desde, hasta)
+        if id_estado is not None:
+            query = query.filter(ResumenDiarioPedidos.id_estado == id_estado)
+
+        return [
+            {'periodo': etiqueta, 'pedidos': pedidos, 'importe_total': importe, 'acuenta': acuenta}
+            for etiqueta, pedidos, importe, acuenta in query.group_by(clave).order_by(clave).all()
+        ]
+    finally:
+        session.close()
+
+
+def obtener_ventas_por_servicio(desde=None, hasta=None, id_estado=None):
+    """
+    Producción por servicio en un rango de días
+
+    Lee resumen_diario_servicios (una fila por día, servicio y estado).
+
+    Args:
+        desde: Primer día incluido (date, opcional)
+        hasta: Último día incluido (date, opcional)
+        id_estado: Limitar a un estado (opcional)
+
+    Returns:
+        list: Diccionarios {id_servicio, nombre_servicio, lineas, unidades,
+              ingresos, metros_cuadrados} de mayor a menor ingreso
+    """
+    session = get_read_session()
+    try:
+        ingresos = func.sum(ResumenDiarioServicios.ingresos)
+        query = session.query(
+            ResumenDiarioServicios.id_servicio,
+            func.sum(ResumenDiarioServicios.lineas),
+            func.sum(ResumenDiarioServicios.unidades),
+            ingresos,
+            func.sum(ResumenDiarioServicios.metros_cuadrados)
+        )
+        query = _filtrar_fechas(query, ResumenDiarioServicios.fecha, desde, hasta)
+        if id_estado is not None:
+            query = query.filter(ResumenDiarioServicios.id_estado == id_estado)
+        filas = query.group_by(ResumenDiarioServicios.id_servicio).order_by(ingresos.desc()).all()
+    finally:
+        session.close()
+
+    nombres = {s['id_servicio']: s['nombre_servicio'] for s in consultas.obtener_servicios()}
+    return [
+        {
+            'id_servicio': id_servicio,
+            'nombre_servicio': nombres.get(id_servicio, ''),
+            'lineas': lineas,
+            'unidades': unidades,
+            'ingresos': total,
+            'metros_cuadrados': m2
+        }
+        for id_servicio, lineas, unidades, total, m2 in filas
+    ]
@@ -0,0 +1,276 @@
+"""
+Libro de movimientos de inventario y su proyección de stock
+Funciones que trabajan dentro de una sesión abierta (no hacen commit)
+
+Todo cambio de stock pasa por aplicar_movimiento: actualiza la proyección
+(inventario_materiales.cantidad_stock o
+inventario_dimensional_materiales.largo_disponible) con un UPDATE atómico y
+agrega la fila del libro en la misma transacción. También incrementa la
+versión de la base de conocimiento (el motor de inferencia lee el stock).
+"""
+from datetime import datetime
+from sqlalchemy import update, insert, func, bindparam
+from app.database import cache_catalogos
+from app.database.models import (
+    InventarioMaterial, InventarioDimensionalMaterial,
+    MovimientoInventario, SnapshotInventario
+)
+
+
+# Tipos de movimiento
+TIPO_INGRESO = 'ingreso'    # Compra o reposición
+TIPO_CONSUMO = 'consumo'    # Uso en producción
+TIPO_AJUSTE = 'ajuste'      # Corrección manual o conteo físico
+TIPO_RETAZO = 'retazo'      # Sobrante de un corte que vuelve (+) o se descarta (-)
+
+TIPOS_MOVIMIENTO = (TIPO_INGRESO, TIPO_CONSUMO, TIPO_AJUSTE, TIPO_RETAZO)
+
+# Columna de la proyección para cada dimensión de stock
+COLUMNAS_STOCK = {
+    'cantidad': InventarioMaterial.cantidad_stock,
+    'largo': InventarioDimensionalMaterial.largo_disponible,
+}
+
+
+def detectar_dimension(session, id_material):
+    """
+    Determina qué inventario tiene un material
+
+    Returns:
+        str or None: 'cantidad', 'largo' o None si no tiene inventario
+    """
+    for dimension, columna in COLUMNAS_STOCK.items():
+        modelo = columna.class_
+        if session.query(modelo.id_material).filter(modelo.id_material == id_material).first():
+            return dimension
+    return None
+
+
+def aplicar_movimiento(session, id_material, dimension, tipo, cantidad,
+                       id_detalle=None, observacion=None, exigir_stock=False):
+    """
+    Aplica un delta de stock y lo registra en el libro
+
+    UPDATE ... SET col = col + :delta WHERE id_material = :id
+    [AND col >= -:delta]. La suma la hace SQLite bajo el bloqueo de
+    escritura, así dos estaciones no pisan sus cambios.
+
+    Args:
+        session: Sesión de escritura (no hace commit)
+        id_material: ID del material
+        dimension: 'cantidad' o 'largo'
+        tipo: Uno de TIPOS_MOVIMIENTO
+        cantidad: Delta con signo (negativo para descontar)
+        id_detalle: Detalle de pedido asociado (opcional)
+        observacion: Texto libre (opcional)
+        exigir_stock: Si es True no deja el stock en negativo
+
+    Returns:
+        float or None: Nuevo saldo, o None si no hay inventario o el stock
+                       no alcanza (en ese caso no se registra nada)
+    """
+    columna = COLUMNAS_STOCK[dimension]
+    modelo = columna.class_
+    condiciones = [modelo.id_material == id_material]
+    if exigir_stock and cantidad < 0:
+        condiciones.append(columna >= -cantidad)
+
+    stmt = (
+        update(modelo)
+        .where(*condiciones)
+        .values({columna: columna + cantidad})
+        .execution_options(synchronize_session=False)
+    )
+    if session.get_bind().dialect.update_returning:
+        saldo = session.execute(stmt.returning(columna)).scalar()
+    elif session.execute(stmt).rowcount == 0:
+        saldo = None
+    else:
+        # SQLite < 3.35 sin RETURNING: se lee dentro de la misma transacción
+        saldo = session.query(columna).filter(modelo.id_material == id_material).scalar()
+
+    if saldo is None:
+        return None
+
+    cache_catalogos.marcar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
+    session.add(MovimientoInventario(
+        id_material=id_material,
+        dimension=dimension,
+        tipo=tipo,
+        cantidad=cantidad,
+        saldo_resultante=saldo,
+        id_detalle=id_detalle,
+        observacion=observacion
+    ))
+    return saldo
+
+
+def fijar_saldo(session, id_material, dimension, nuevo_saldo, tipo=TIPO_AJUSTE, observacion=None):
+    """
+    Lleva el stock a un valor absoluto registrando la diferencia
+
+    Args:
+        session: Sesión de escritura (no hace commit)
+        id_material: ID del material
+        dimension: 'cantidad' o 'largo'
+        nuevo_saldo: Valor final deseado
+        tipo: Tipo del movimiento (por defecto 'ajuste')
+        observacion: Texto libre (opcional)
+
+    Returns:
+        float or None: Nuevo saldo, o None si el material no tiene ese inventario
+    """
+    columna = COLUMNAS_STOCK[dimension]
+    modelo = columna.class_
+    actual = session.query(columna).filter(modelo.id_material == id_material).scalar()
+    if actual is None:
+        existe = session.query(modelo.id_material).filter(modelo.id_material == id_material).first()
+        if not existe:
+            return None
+        actual = 0.0
+
+    delta = (nuevo_saldo or 0.0) - actual
+    if delta == 0:
+        return actual
+    return aplicar_movimiento(session, id_material, dimension, tipo, delta, observacion=observacion)
+
+
+def aplicar_consumos_lote(session, dimension, totales):
+    """
+    Descuenta varios materiales con un solo executemany condicional
+
+    Args:
+        session: Sesión de escritura (no hace commit)
+        dimension: 'cantidad' o 'largo'
+        totales: {id_material: cantidad a descontar (positiva)}
+
+    Returns:
+        dict or None: {id_material: nuevo saldo}, o None si algún material
+                      no tenía stock suficiente (el llamador debe hacer rollback)
+    """
+    columna = COLUMNAS_STOCK[dimension]
+    modelo = columna.class_
+    tabla = modelo.__table__
+    col = tabla.c[columna.key]
+
+    stmt = (
+        tabla.update()
+        .where(tabla.c.id_material == bindparam('b_id'), col >= bindparam('b_cantidad'))
+        .values({col: col - bindparam('b_cantidad')})
+    )
+    resultado = session.connection().execute(
+        stmt, [{'b_id': id_m, 'b_cantidad': cant} for id_m, cant in totales.items()]
+    )
+    if resultado.rowcount != len(totales):
+        return None
+
+    cache_catalogos.marcar_cambio(session, cache_catalogos.GRUPO_CONOCIMIENTO)
+    saldos = dict(
+        session.query(modelo.id_material, columna)
+        .filter(modelo.id_material.in_(totales.keys()))
+        .all()
+    )
+    ahora = datetime.now()
+    session.execute(insert(MovimientoInventario), [
+        {
+            'id_material': id_m, 'dimension': dimension, 'tipo': TIPO_CONSUMO,
+            'cantidad': -cant, 'saldo_resultante': saldos[id_m], 'fecha': ahora
+        }
+        for id_m, cant in totales.items()
+    ])
+    return saldos
+
+
+# =========================================================
+# SNAPSHOTS Y STOCK A UNA FECHA
+# =========================================================
+
+def ultima_fecha_snapshot(session, hasta=None):
+    """
+    Fecha del último snapshot general (opcionalmente anterior a 'hasta')
+
+    Returns:
+        datetime or None
+    """
+    query = session.query(func.max(SnapshotInventario.fecha_corte))
+    if hasta is not None:
+        query = query.filter(SnapshotInventario.fecha_corte <= hasta)
+    return query.scalar()
+
+
+def generar_snapshot(session, fecha_corte=None):
+    """
+    Guarda el saldo de todos los materiales a una fecha de corte
+
+    Parte del snapshot anterior y le suma los movimientos del período,
+    agrupados en una sola consulta (no recorre todo el libro).
+
+    Args:
+        session: Sesión de escritura (no hace commit)
+        fecha_corte: Fecha del corte (por defecto, ahora)
+
+    Returns:
+        int: Cantidad de saldos guardados
+    """
+    fecha_corte = fecha_corte or datetime.now()
+    anterior = ultima_fecha_snapshot(session, hasta=fecha_corte)
+
+    saldos = {}
+    if anterior is not None:
+        if anterior == fecha_corte:
+            return 0
+        filas = session.query(
+            SnapshotInventario.id_material, SnapshotInventario.dimension, SnapshotInventario.saldo
+        ).filter(SnapshotInventario.fecha_corte == anterior).all()
+        saldos = {(id_m, dim): saldo for id_m, dim, saldo in filas}
+
+    deltas = session.query(
+        MovimientoInventario.id_material,
+        MovimientoInventario.dimension,
+        func.sum(MovimientoInventario.cantidad)
+    ).filter(MovimientoInventario.fecha <= fecha_corte)
+    if anterior is not None:
+        deltas = deltas.filter(MovimientoInventario.fecha > anterior)
+    for id_m, dim, delta in deltas.group_by(
+            MovimientoInventario.id_material, MovimientoInventario.dimension).all():
+        saldos[(id_m, dim)] = saldos.get((id_m, dim), 0.0) + (delta or 0.0)
+
+    if saldos:
+        session.execute(insert(SnapshotInventario), [
+            {'fecha_corte': fecha_corte, 'id_material': id_m, 'dimension': dim, 'saldo': saldo}
+            for (id_m, dim), saldo in saldos.items()
+        ])
+    return len(saldos)
+
+
+def stock_en_fecha(session, id_material, dimension, fecha):
+    """
+    Stock de un material a una fecha: último snapshot + delta posterior
+
+    Args:
+        session: Sesión abierta
+        id_material: ID del material
+        dimension: 'cantidad' o 'largo'
+        fecha: Fecha de consulta
+
+    Returns:
+        float: Saldo a esa fecha (0 si no había movimientos)
+    """
+    snapshot = session.query(
+        SnapshotInventario.fecha_corte, SnapshotInventario.saldo
+    ).filter(
+        SnapshotInventario.id_material == id_material,
+        SnapshotInventario.dimension == dimension,
+        SnapshotInventario.fecha_corte <= fecha
+    ).order_by(SnapshotInventario.fecha_corte.desc()).first()
+
+    delta = session.query(func.sum(MovimientoInventario.cantidad)).filter(
+        MovimientoInventario.id_material == id_material,
+        MovimientoInventario.dimension == dimension,
+        MovimientoInventario.fecha <= fecha
+    )
+    if snapshot is not None:
+        delta = delta.filter(MovimientoInventario.fecha > snapshot.fecha_corte)
+
+    base = snapshot.saldo if snapshot is not None else 0.0
+    return base + (delta.scalar() or 0.0)
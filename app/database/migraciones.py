@@ -0,0 +1,423 @@
+"""
+Migraciones versionadas del esquema de la base de datos
+Aplica solo los pasos pendientes y guarda la versión en PRAGMA user_version
+
+Cada paso es una función que recibe una sesión y deja el esquema en la
+versión indicada. Con la BD al día, el arranque cuesta una lectura de PRAGMA
+(sin inspector, sin create_all y sin conteos de datos iniciales).
+
+Para agregar un cambio de esquema:
+    1. Escribir una función _vN_descripcion(session)
+    2. Agregarla al final de MIGRACIONES con el número de versión siguiente
+"""
+from datetime import datetime
+from sqlalchemy import text, inspect
+from app.database.models import Base
+
+
+# =========================================================
+# PASOS DE MIGRACIÓN
+# =========================================================
+
+def _v1_esquema_inicial(session):
+    """
+    Esquema base, columnas legacy y datos iniciales
+
+    Es idempotente: en BD creadas antes del versionado solo agrega
+    lo que falte y respeta los datos existentes.
+    """
+    conn = session.connection()
+    inspector = inspect(conn)
+    tablas = inspector.get_table_names()
+
+    # Verificar si la tabla servicios existe
+    if 'servicios' in tablas:
+        columnas_servicios = [col['name'] for col in inspector.get_columns('servicios')]
+
+        # Migración: agregar tipo_material a servicios si no existe
+        if 'tipo_material' not in columnas_servicios:
+            conn.execute(text("ALTER TABLE servicios ADD COLUMN tipo_material VARCHAR DEFAULT 'unidad'"))
+            print("✅ Migración: columna 'tipo_material' agregada a servicios")
+
+    # Verificar si existe la tabla vieja atributos_rollos_impresion
+    if 'atributos_rollos_impresion' in tablas:
+        # La tabla vieja existe, pero la nueva es creada por create_all
+        print("⚠️ Tabla 'atributos_rollos_impresion' detectada (legacy)")
+
+    # Crear todas las tablas definidas en los modelos
+    Base.metadata.create_all(conn)
+
+    _cargar_datos_iniciales(session)
+
+
+def _cargar_datos_iniciales(session):
+    """
+    Carga datos iniciales si las tablas están vacías
+
+    Inserta estados de pedidos, máquinas y servicios de ejemplo
+    """
+    from app.database.models import (
+        EstadoPedido, Maquina, Servicio, TipoMaquina, UnidadMedida
+    )
+
+    # Verificar y cargar estados de pedidos
+    if session.query(EstadoPedido).count() == 0:
+        estados = [
+            EstadoPedido(nombre="Cotizado", color="#9E9E9E"),
+            EstadoPedido(nombre="Confirmado", color="#2196F3"),
+            EstadoPedido(nombre="En Diseño", color="#FF9800"),
+            EstadoPedido(nombre="Previsualización Enviada", color="#9C27B0"),
+            EstadoPedido(nombre="En Preparación", color="#FFC107"),
+            EstadoPedido(nombre="Listo para Entrega", color="#4CAF50"),
+            EstadoPedido(nombre="Entregado", color="#00C853"),
+            EstadoPedido(nombre="Cancelado", color="#F44336")
+        ]
+        session.add_all(estados)
+        print("✅ Estados de pedidos inicializados")
+
+    # Cargar unidades de medida si no existen
+    if session.query(UnidadMedida).count() == 0:
+        unidades = [
+            UnidadMedida(nombre_unidad="Metro Cuadrado", abreviacion="m2", tipo="Area"),
+            UnidadMedida(nombre_unidad="Unidad", abreviacion="unidad", tipo="Conteo"),
+            UnidadMedida(nombre_unidad="Ciento", abreviacion="ciento", tipo="Conteo"),
+            UnidadMedida(nombre_unidad="Metro Lineal", abreviacion="ml", tipo="Longitud"),
+            UnidadMedida(nombre_unidad="Millar", abreviacion="millar", tipo="Conteo"),
+        ]
+        session.add_all(unidades)
+        session.flush()
+        print("✅ Unidades de medida inicializadas")
+
+    # Cargar tipos de máquinas si no existen
+    if session.query(TipoMaquina).count() == 0:
+        tipos_maq = [
+            TipoMaquina(nombre_tipo="Pequeño Formato"),
+            TipoMaquina(nombre_tipo="Gran Formato"),
+            TipoMaquina(nombre_tipo="Acabado"),
+            TipoMaquina(nombre_tipo="Corte"),
+        ]
+        session.add_all(tipos_maq)
+        session.flush()
+        print("✅ Tipos de máquinas inicializados")
+
+    # Verificar y cargar máquinas
+    if session.query(Maquina).count() == 0:
+        # Obtener tipos de máquinas
+        tipo_peq = session.query(TipoMaquina).filter_by(nombre_tipo="Pequeño Formato").first()
+        tipo_gran = session.query(TipoMaquina).filter_by(nombre_tipo="Gran Formato").first()
+        tipo_acab = session.query(TipoMaquina).filter_by(nombre_tipo="Acabado").first()
+
+        maquinas = [
+            Maquina(nombre="Impresora Láser A3", id_tipo_maquina=tipo_peq.id_tipo_maquina if tipo_peq else 1),
+            Maquina(nombre="Impresora Sublimación", id_tipo_maquina=tipo_peq.id_tipo_maquina if tipo_peq else 1),
+            Maquina(nombre="Plotter HP DesignJet", id_tipo_maquina=tipo_gran.id_tipo_maquina if tipo_gran else 2),
+            Maquina(nombre="Laminadora Manual", id_tipo_maquina=tipo_acab.id_tipo_maquina if tipo_acab else 3)
+        ]
+        session.add_all(maquinas)
+        print("✅ Máquinas inicializadas")
+
+    # Verificar y cargar servicios
+    if session.query(Servicio).count() == 0:
+        # Obtener unidades de cobro
+        unidad_m2 = session.query(UnidadMedida).filter_by(abreviacion="m2").first()
+        unidad_und = session.query(UnidadMedida).filter_by(abreviacion="unidad").first()
+        unidad_ciento = session.query(UnidadMedida).filter_by(abreviacion="ciento").first()
+
+        servicios = [
+            Servicio(nombre_servicio="Gigantografía", id_unidad_cobro=unidad_m2.id_unidad if unidad_m2 else 1, precio_base=25.0, id_maquina_sugerida=3),
+            Servicio(nombre_servicio="Banner Roll-Up", id_unidad_cobro=unidad_und.id_unidad if unidad_und else 2, precio_base=80.0, id_maquina_sugerida=3),
+            Servicio(nombre_servicio="Tarjetas de Presentación", id_unidad_cobro=unidad_ciento.id_unidad if unidad_ciento else 3, precio_base=15.0, id_maquina_sugerida=1),
+            Servicio(nombre_servicio="Flyers A5", id_unidad_cobro=unidad_ciento.id_unidad if unidad_ciento else 3, precio_base=20.0, id_maquina_sugerida=1),
+            Servicio(nombre_servicio="Tazas Personalizadas", id_unidad_cobro=unidad_und.id_unidad if unidad_und else 2, precio_base=12.0, id_maquina_sugerida=2),
+            Servicio(nombre_servicio="Llaveros", id_unidad_cobro=unidad_und.id_unidad if unidad_und else 2, precio_base=3.0, id_maquina_sugerida=2)
+        ]
+        session.add_all(servicios)
+        print("✅ Servicios inicializados")
+
+
+def _crear_indices_declarados(session):
+    """
+    Crea los índices declarados en los modelos (__table_args__)
+
+    create_all solo crea índices al crear la tabla, por eso en BD
+    existentes se agregan aquí con checkfirst. Las migraciones que
+    solo agregan índices nuevos a los modelos reutilizan este paso.
+    """
+    conn = session.connection()
+    for tabla in Base.metadata.sorted_tables:
+        for indice in tabla.indexes:
+            indice.create(conn, checkfirst=True)
+
+
+def _v4_version_datos(session):
+    """Tabla de sellos de versión para invalidar cachés entre estaciones"""
+    from app.database.models import VersionDatos
+
+    conn = session.connection()
+    VersionDatos.__table__.create(conn, checkfirst=True)
+    if session.get(VersionDatos, 'catalogos') is None:
+        session.add(VersionDatos(grupo='catalogos', version=0))
+
+
+def _v5_libro_inventario(session):
+    """
+    Libro de movimientos y snapshots de inventario
+
+    Registra el stock actual de cada material como movimiento de apertura
+    para que el libro cuadre con la proyección desde el primer día.
+    """
+    from app.database.models import (
+        MovimientoInventario, SnapshotInventario,
+        InventarioMaterial, InventarioDimensionalMaterial
+    )
+
+    conn = session.connection()
+    MovimientoInventario.__table__.create(conn, checkfirst=True)
+    SnapshotInventario.__table__.create(conn, checkfirst=True)
+
+    if session.query(MovimientoInventario.id_movimiento).first() is not None:
+        return
+
+    saldos = [
+        ('cantidad', session.query(InventarioMaterial.id_material, InventarioMaterial.cantidad_stock)),
+        ('largo', session.query(InventarioDimensionalMaterial.id_material,
+                                InventarioDimensionalMaterial.largo_disponible)),
+    ]
+    for dimension, query in saldos:
+        for id_material, saldo in query.all():
+            session.add(MovimientoInventario(
+                id_material=id_material, dimension=dimension, tipo='ajuste',
+                cantidad=saldo or 0.0, saldo_resultante=saldo or 0.0,
+                observacion='Saldo inicial'
+            ))
+
+
+def _v6_resumenes_diarios(session):
+    """Tablas de resúmenes diarios, cargadas con el historial existente"""
+    from app.database.models import ResumenDiarioPedidos, ResumenDiarioServicios
+    from app.database import resumen_diario
+
+    conn = session.connection()
+    ResumenDiarioPedidos.__table__.create(conn, checkfirst=True)
+    ResumenDiarioServicios.__table__.create(conn, checkfirst=True)
+    resumen_diario.reconstruir(session)
+
+
+def _v7_plan_produccion(session):
+    """Prioridad de pedidos y tabla del plan de producción por máquina"""
+    from app.database.models import PlanProduccion
+
+    conn = session.connection()
+    columnas_pedidos = [col['name'] for col in inspect(conn).get_columns('pedidos')]
+    if 'prioridad' not in columnas_pedidos:
+        conn.execute(text("ALTER TABLE pedidos ADD COLUMN prioridad INTEGER DEFAULT 0"))
+    PlanProduccion.__table__.create(conn, checkfirst=True)
+
+
+def _v8_feriados(session):
+    """Tabla de feriados para el calendario laboral"""
+    from app.database.models import Feriado
+
+    Feriado.__table__.create(session.connection(), checkfirst=True)
+
+
+def _v9_version_conocimiento(session):
+    """Sello de versión de la base de conocimiento del motor de inferencia"""
+    from app.database.models import VersionDatos
+
+    if session.get(VersionDatos, 'conocimiento') is None:
+        session.add(VersionDatos(grupo='conocimiento', version=0))
+
+
+# =========================================================
+# REGISTRO DE MIGRACIONES
+# =========================================================
+
+# (versión, descripción, función). Orden estrictamente creciente.
+MIGRACIONES = [
+    (1, "Esquema inicial y datos base", _v1_esquema_inicial),
+    (2, "Índices secundarios en columnas de filtro y join", _crear_indices_declarados),
+    (3, "Índices de ordenamiento para paginación de pedidos", _crear_indices_declarados),
+    (4, "Sellos de versión para cachés de catálogos", _v4_version_datos),
+    (5, "Libro de movimientos y snapshots de inventario", _v5_libro_inventario),
+    (6, "Resúmenes diarios de ventas y producción", _v6_resumenes_diarios),
+    (7, "Plan de producción por máquina", _v7_plan_produccion),
+    (8, "Feriados del calendario laboral", _v8_feriados),
+    (9, "Sello de versión de la base de conocimiento", _v9_version_conocimiento),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+
+def obtener_version_esquema(conn):
+    """
+    Lee la versión del esquema guardada en la BD
+
+    Args:
+        conn: Conexión de SQLAlchemy
+
+    Returns:
+        int: Versión actual (0 si la BD nunca fue versionada)
+    """
+    return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def aplicar_migraciones(db):
+    """
+    Aplica las migraciones pendientes sobre la BD
+
+    Camino rápido: si la versión guardada coincide con VERSION_ESQUEMA
+    no se ejecuta nada más que la lectura del PRAGMA.
+
+    Args:
+        db: Instancia de DatabaseConnection ya inicializada
+
+    Returns:
+        list: Versiones aplicadas en esta ejecución
+    """
+    with db.get_engine().connect() as conn:
+        version_actual = obtener_version_esquema(conn)
+
+    if version_actual >= VERSION_ESQUEMA:
+        if version_actual > VERSION_ESQUEMA:
+            print(f"⚠️ La BD está en la versión {version_actual}, más nueva que la aplicación ({VERSION_ESQUEMA})")
+        return []
+
+    aplicadas = []
+    for version, descripcion, paso in MIGRACIONES:
+        if version <= version_actual:
+            continue
+
+        # Cada paso y su número de versión se confirman juntos
+        with db.session_scope() as session:
+            paso(session)
+            session.flush()
+            session.connection().exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+
+        aplicadas.append(version)
+        print(f"✅ Migración v{version}: {descripcion}")
+
+    return aplicadas
+
+
+# =========================================================
+# VERIFICACIÓN DE PLANES DE CONSULTA
+# =========================================================
+
+def _consultas_criticas():
+    """
+    Consultas críticas de consultas.py que se llaman para capturar su SQL
+
+    Returns:
+        tuple: (nombre, llamada sin argumentos, tablas que la consulta
+                recorre completas a propósito)
+    """
+    from app.database import consultas
+
+    desde, hasta = '2024-01-01', '2024-12-31'
+    cursor = (datetime(2024, 6, 1), 100)
+    return (
+        ('pedidos_filtrados_estado',
+         lambda: consultas.obtener_pedidos_filtrados(filtro_estado=1), ()),
+        ('pedidos_filtrados_fechas',
+         lambda: consultas.obtener_pedidos_filtrados(
+             fecha_ingreso_desde=desde, fecha_ingreso_hasta=hasta), ()),
+        ('pedidos_filtrados_estado_fechas',
+         lambda: consultas.obtener_pedidos_filtrados(
+             filtro_estado=1, fecha_ingreso_desde=desde, fecha_ingreso_hasta=hasta), ()),
+        # Sin filtros la página recorre el índice de fecha hasta juntar las
+        # filas (LIMIT) y el total cuenta todos los pedidos
+        ('pedidos_keyset_fecha',
+         lambda: consultas.obtener_pedidos_keyset(cursor=cursor), ('pedidos',)),
+        ('pedidos_keyset_estado_fecha',
+         lambda: consultas.obtener_pedidos_keyset(filtro_estado=1, cursor=cursor), ()),
+        ('pedido_con_detalles',
+         lambda: consultas.obtener_pedido_por_id(1), ()),
+        ('historial_consumo_material',
+         lambda: consultas.obtener_historial_consumo(1), ()),
+        # El precio se busca en memoria: a la BD solo llega la carga de todos
+        # los tramos al armar el índice, que lee la tabla entera
+        ('precio_por_cantidad',
+         lambda: consultas.obtener_precio_por_cantidad(1, 10), ('precios_escalonados',)),
+        ('restriccion_cantidad',
+         lambda: consultas.obtener_restricciones_cantidad(1), ()),
+        ('maquinas_por_servicio',
+         lambda: consultas.obtener_maquinas_por_servicio(1), ()),
+        ('servicios_por_material',
+         lambda: consultas.obtener_servicios_por_material(1), ()),
+    )
+
+
+def _lineas_sin_indice(plan, tablas_recorridas):
+    """Líneas del plan que recorren una tabla entera u ordenan en tabla temporal"""
+    problemas = []
+    for fila in plan:
+        detalle = fila[-1]
+        if detalle.startswith('SCAN'):
+            if detalle.split()[1] not in tablas_recorridas:
+                problemas.append(detalle)
+        elif 'TEMP B-TREE' in detalle:
+            problemas.append(detalle)
+    return problemas
+
+
+def verificar_planes_consulta(db):
+    """
+    Ejecuta EXPLAIN QUERY PLAN sobre el SQL real de las consultas críticas
+
+    Llama a cada función de _consultas_criticas() con las cachés vacías,
+    captura las sentencias que emite SQLAlchemy y revisa su plan. Una línea
+    'SCAN <tabla>' (aunque sea en el orden de un índice) indica que la
+    consulta recorre la tabla completa en lugar de buscar por índice;
+    'USE TEMP B-TREE' que ordena en memoria. Se ejecuta con:
+
+        python -m app.database.migraciones
+
+    Args:
+        db: Instancia de DatabaseConnection ya inicializada
+
+    Returns:
+        dict: {nombre_consulta: [líneas del plan problemáticas]}
+              Vacío si todas las consultas usan índices.
+    """
+    from app.database import cache_catalogos, consultas
+    from app.database.conexion import capturar_consultas
+
+    # Primero se capturan todas: el pool de escritura puede ser de una conexión
+    capturas = []
+    for nombre, llamada, tablas_recorridas in _consultas_criticas():
+        cache_catalogos.invalidar()
+        consultas._invalidar_total_pedidos()
+        with capturar_consultas() as sentencias:
+            llamada()
+        selects = [(sql, params) for sql, params in sentencias
+                   if sql.lstrip().upper().startswith('SELECT')]
+        capturas.append((nombre, selects, tablas_recorridas))
+
+    problemas = {}
+    with db.get_engine().connect() as conn:
+        for nombre, selects, tablas_recorridas in capturas:
+            if not selects:
+                problemas[nombre] = ['no emitió ninguna consulta SELECT']
+                continue
+            lineas = []
+            for sql, params in selects:
+                plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+                lineas.extend(_lineas_sin_indice(plan, tablas_recorridas))
+            if lineas:
+                problemas[nombre] = lineas
+    return problemas
+
+
+if __name__ == "__main__":
+    import sys
+    from app.database.conexion import DatabaseConnection
+
+    problemas = verificar_planes_consulta(DatabaseConnection())
+    for nombre, lineas in problemas.items():
+        print(f"❌ {nombre}:")
+        for linea in lineas:
+            print(f"     {linea}")
+    if problemas:
+        sys.exit(1)
+    print(f"✓ Planes de consulta verificados: {len(_consultas_criticas())} consultas usan índices")
@@ -4,7 +4,7 @@ Basado en esquema 3FN/BCNF para separar lógica de negocio, inventario y definic
 """
 from datetime import datetime
 from sqlalchemy import (
-    Column, Integer, String, Float, DateTime, Text, ForeignKey, Boolean, UniqueConstraint
+    Column, Integer, String, Float, Date, DateTime, Text, ForeignKey, Boolean, UniqueConstraint, Index
 )
 from sqlalchemy.orm import declarative_base, relationship
 
@@ -133,6 +133,10 @@ class CapacidadMaquina(Base):
     largo_util_max = Column(Float, default=0.0) # En metros. 0 si es infinito (rollo).
     velocidad_promedio = Column(Float, default=0.0) # Unidades/hora (para estimar tiempos)
     
+    __table_args__ = (
+        Index('ix_capacidad_maquinas_ancho', 'ancho_util_max'),
+    )
+    
     maquina = relationship('Maquina', back_populates='capacidad')
     
     def to_dict(self):
@@ -245,6 +249,10 @@ class InventarioDimensionalMaterial(Base):
     # Tipo de material dimensional
     es_continuo = Column(Boolean, default=True)  # True=rollo infinito, False=plancha fija
     
+    __table_args__ = (
+        Index('ix_inventario_dimensional_ancho', 'ancho_disponible'),
+    )
+    
     material = relationship('Material', back_populates='inventario_dimensional')
     
     def __repr__(self):
@@ -321,7 +329,11 @@ class MaquinaServicio(Base):
     id_servicio = Column(Integer, ForeignKey('servicios.id_servicio'), nullable=False)
     es_recomendada = Column(Boolean, default=False) # Preferencia del experto
     
-    __table_args__ = (UniqueConstraint('id_maquina', 'id_servicio'),)
+    __table_args__ = (
+        UniqueConstraint('id_maquina', 'id_servicio'),
+        # La UNIQUE empieza por id_maquina; las búsquedas por servicio necesitan la suya
+        Index('ix_maquinas_servicios_servicio', 'id_servicio'),
+    )
     
     maquina = relationship('Maquina', back_populates='servicios_compatibles')
     servicio = relationship('Servicio', back_populates='maquinas_validas')
@@ -345,7 +357,10 @@ class ServicioMaterial(Base):
     id_material = Column(Integer, ForeignKey('materiales.id_material'), nullable=False)
     es_preferido = Column(Boolean, default=False)
     
-    __table_args__ = (UniqueConstraint('id_servicio', 'id_material'),)
+    __table_args__ = (
+        UniqueConstraint('id_servicio', 'id_material'),
+        Index('ix_servicios_materiales_material', 'id_material'),
+    )
     
     servicio = relationship('Servicio', back_populates='materiales_validos')
     material = relationship('Material', back_populates='servicios_compatibles')
@@ -416,6 +431,18 @@ class Pedido(Base):
     costo_total = Column(Float, default=0.0)
     acuenta = Column(Float, default=0.0)
     observaciones = Column(Text)
+    prioridad = Column(Integer, default=0)  # 0 = normal, 1 = urgente (planificación)
+    
+    __table_args__ = (
+        # Filtro por estado + orden por fecha (listado de pedidos)
+        Index('ix_pedidos_estado_fecha', 'id_estado', 'fecha_ingreso'),
+        # Rango/orden por fecha sin estado; incluye id_pedido (rowid) implícito
+        Index('ix_pedidos_fecha_ingreso', 'fecha_ingreso'),
+        Index('ix_pedidos_cliente', 'id_cliente'),
+        # Columnas ordenables del listado (paginación por cursor)
+        Index('ix_pedidos_fecha_entrega', 'fecha_entrega_estimada'),
+        Index('ix_pedidos_costo_total', 'costo_total'),
+    )
     
     # Relaciones
     cliente = relationship('Cliente', back_populates='pedidos')
@@ -441,7 +468,8 @@ class Pedido(Base):
             'estado_pago': self.estado_pago,
             'costo_total': self.costo_total,
             'acuenta': self.acuenta,
-            'observaciones': self.observaciones
+            'observaciones': self.observaciones,
+            'prioridad': self.prioridad or 0
         }
     
     def calcular_saldo(self):
@@ -467,6 +495,11 @@ class DetallePedido(Base):
     cantidad = Column(Integer, nullable=False, default=1)
     precio_unitario = Column(Float, nullable=False, default=0.0)
     
+    __table_args__ = (
+        Index('ix_detalle_pedidos_pedido', 'id_pedido'),
+        Index('ix_detalle_pedidos_servicio', 'id_servicio'),
+    )
+    
     # Relaciones
     pedido = relationship('Pedido', back_populates='detalles')
     servicio = relationship('Servicio', back_populates='detalles_pedido')
@@ -504,6 +537,13 @@ class ConsumoMaterial(Base):
     cantidad_usada = Column(Float, nullable=False)
     fecha_consumo = Column(DateTime, default=datetime.now)
     
+    __table_args__ = (
+        # Historial por material ordenado por fecha
+        Index('ix_consumo_material_fecha', 'id_material', 'fecha_consumo'),
+        Index('ix_consumo_fecha', 'fecha_consumo'),
+        Index('ix_consumo_detalle', 'id_detalle'),
+    )
+    
     # Relaciones
     detalle = relationship('DetallePedido', back_populates='consumos')
     material = relationship('Material')
@@ -646,6 +686,7 @@ class PrecioEscalonado(Base):
     cantidad_maxima = Column(Integer, nullable=True)   # Hasta esta cantidad (NULL = infinito)
     precio_unitario = Column(Float, nullable=False)
     
+    # La UNIQUE (id_servicio, cantidad_minima) ya sirve como índice de búsqueda por tramo
     __table_args__ = (UniqueConstraint('id_servicio', 'cantidad_minima'),)
     
     servicio = relationship('Servicio', backref='precios_escalonados')
@@ -687,6 +728,10 @@ class RestriccionCantidad(Base):
     
     mensaje_error = Column(String, nullable=True)
     
+    __table_args__ = (
+        Index('ix_restricciones_cantidad_servicio', 'id_servicio'),
+    )
+    
     servicio = relationship('Servicio', backref='restricciones_cantidad')
     
     def __repr__(self):
@@ -757,3 +802,214 @@ class ConfiguracionSistema(Base):
             import json
             return json.loads(self.valor)
         return self.valor
+
+
+# ==========================================
+# 8. CONTROL DE VERSIONES DE DATOS (CACHÉ)
+# ==========================================
+
+class VersionDatos(Base):
+    """
+    Sello de versión de datos compartido por todas las estaciones.
+    Cada escritura sobre un grupo de datos cacheados (ej: 'catalogos')
+    incrementa su versión en la misma transacción; las cachés en memoria
+    comparan este número para saber si sus copias siguen vigentes.
+    """
+    __tablename__ = 'version_datos'
+    
+    grupo = Column(String, primary_key=True)  # Ej: 'catalogos'
+    version = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<VersionDatos(grupo='{self.grupo}', version={self.version})>"
+
+
+# ==========================================
+# 9. LIBRO DE MOVIMIENTOS DE INVENTARIO
+# ==========================================
+
+class MovimientoInventario(Base):
+    """
+    Libro de movimientos de inventario (solo se agregan filas).
+    Cada cambio de stock deja aquí su delta con signo; cantidad_stock y
+    largo_disponible son la proyección materializada de este libro.
+    
+    Tipos: 'ingreso', 'consumo', 'ajuste', 'retazo'
+    Dimensión: 'cantidad' (inventario_materiales.cantidad_stock)
+               'largo' (inventario_dimensional_materiales.largo_disponible)
+    
+    id_material e id_detalle no son claves foráneas a propósito: el
+    historial se conserva aunque se elimine el material o el pedido.
+    """
+    __tablename__ = 'movimientos_inventario'
+    
+    id_movimiento = Column(Integer, primary_key=True, autoincrement=True)
+    id_material = Column(Integer, nullable=False)
+    dimension = Column(String, nullable=False, default='cantidad')
+    tipo = Column(String, nullable=False)
+    cantidad = Column(Float, nullable=False)  # Delta con signo
+    saldo_resultante = Column(Float, nullable=False)  # Stock tras el movimiento
+    id_detalle = Column(Integer, nullable=True)  # Pedido que originó el consumo
+    observacion = Column(String, nullable=True)
+    fecha = Column(DateTime, default=datetime.now, nullable=False)
+    
+    __table_args__ = (
+        # Delta de un material desde el último snapshot
+        Index('ix_movimientos_material_fecha', 'id_material', 'dimension', 'fecha'),
+        # Deltas de todos los materiales al generar un snapshot
+        Index('ix_movimientos_fecha', 'fecha'),
+    )
+    
+    def __repr__(self):
+        return f"<MovimientoInventario(material={self.id_material}, {self.tipo} {self.cantidad:+})>"
+    
+    def to_dict(self):
+        return {
+            'id_movimiento': self.id_movimiento,
+            'id_material': self.id_material,
+            'dimension': self.dimension,
+            'tipo': self.tipo,
+            'cantidad': self.cantidad,
+            'saldo_resultante': self.saldo_resultante,
+            'id_detalle': self.id_detalle,
+            'observacion': self.observacion,
+            'fecha': self.fecha.isoformat() if self.fecha else None
+        }
+
+
+class SnapshotInventario(Base):
+    """
+    Foto periódica del saldo de cada material a una fecha de corte.
+    El stock a una fecha pasada es el saldo del último snapshot anterior
+    más los movimientos posteriores, sin recorrer todo el libro.
+    """
+    __tablename__ = 'snapshots_inventario'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    fecha_corte = Column(DateTime, nullable=False)
+    id_material = Column(Integer, nullable=False)
+    dimension = Column(String, nullable=False, default='cantidad')
+    saldo = Column(Float, nullable=False)
+    
+    # La UNIQUE sirve como índice para buscar el último corte de un material
+    __table_args__ = (UniqueConstraint('id_material', 'dimension', 'fecha_corte'),)
+    
+    def __repr__(self):
+        return f"<SnapshotInventario(material={self.id_material}, {self.fecha_corte}: {self.saldo})>"
+
+
+# ==========================================
+# 10. RESÚMENES DIARIOS (REPORTES)
+# ==========================================
+
+class ResumenDiarioPedidos(Base):
+    """
+    Pedidos agregados por día de ingreso y estado.
+    Se recalcula el día afectado en cada alta o cambio de pedido, así los
+    reportes por período leen estas filas en lugar de todo el historial.
+    """
+    __tablename__ = 'resumen_diario_pedidos'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    fecha = Column(Date, nullable=False)
+    id_estado = Column(Integer, nullable=True)  # Sin FK: el resumen sobrevive al catálogo
+    pedidos = Column(Integer, nullable=False, default=0)
+    importe_total = Column(Float, nullable=False, default=0.0)  # Suma de costo_total
+    acuenta = Column(Float, nullable=False, default=0.0)  # Adelantos cobrados
+    
+    __table_args__ = (Index('ix_resumen_pedidos_fecha', 'fecha', 'id_estado'),)
+    
+    def __repr__(self):
+        return f"<ResumenDiarioPedidos({self.fecha}, estado={self.id_estado}, pedidos={self.pedidos})>"
+
+
+class ResumenDiarioServicios(Base):
+    """
+    Detalles de pedido agregados por día de ingreso, servicio y estado.
+    El adelanto (acuenta) es del pedido completo y vive en
+    ResumenDiarioPedidos para no repartirlo entre servicios.
+    """
+    __tablename__ = 'resumen_diario_servicios'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    fecha = Column(Date, nullable=False)
+    id_servicio = Column(Integer, nullable=False)
+    id_estado = Column(Integer, nullable=True)
+    lineas = Column(Integer, nullable=False, default=0)  # Detalles de pedido
+    unidades = Column(Integer, nullable=False, default=0)  # Suma de cantidad
+    ingresos = Column(Float, nullable=False, default=0.0)  # Suma de cantidad * precio_unitario
+    metros_cuadrados = Column(Float, nullable=False, default=0.0)  # Suma de ancho * alto * cantidad
+    
+    __table_args__ = (Index('ix_resumen_servicios_fecha', 'fecha', 'id_servicio'),)
+    
+    def __repr__(self):
+        return f"<ResumenDiarioServicios({self.fecha}, servicio={self.id_servicio}, ingresos={self.ingresos})>"
+
+
+# ==========================================
+# 11. PLAN DE PRODUCCIÓN POR MÁQUINA
+# ==========================================
+
+class PlanProduccion(Base):
+    """
+    Programación de cada detalle de pedido en una máquina.
+    Es un resultado derivado (ver app/logic/planificador.py): se reescribe
+    por máquina cuando cambian sus trabajos, por eso no lleva claves foráneas.
+    """
+    __tablename__ = 'plan_produccion'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    id_detalle = Column(Integer, unique=True, nullable=False)
+    id_pedido = Column(Integer, nullable=False)
+    id_maquina = Column(Integer, nullable=False)
+    secuencia = Column(Integer, nullable=False)  # Orden dentro de la máquina
+    horas = Column(Float, nullable=False)  # Horas de máquina
+    inicio = Column(DateTime, nullable=False)
+    fin = Column(DateTime, nullable=False)
+    fecha_planificacion = Column(DateTime, default=datetime.now, nullable=False)
+    
+    __table_args__ = (
+        Index('ix_plan_produccion_maquina', 'id_maquina', 'secuencia'),
+        Index('ix_plan_produccion_pedido', 'id_pedido'),
+    )
+    
+    def __repr__(self):
+        return f"<PlanProduccion(detalle={self.id_detalle}, maquina={self.id_maquina}, #{self.secuencia})>"
+    
+    def to_dict(self):
+        return {
+            'id_detalle': self.id_detalle,
+            'id_pedido': self.id_pedido,
+            'id_maquina': self.id_maquina,
+            'secuencia': self.secuencia,
+            'horas': self.horas,
+            'inicio': self.inicio.isoformat() if self.inicio else None,
+            'fin': self.fin.isoformat() if self.fin else None
+        }
+
+
+# ==========================================
+# 12. CALENDARIO LABORAL
+# ==========================================
+
+class Feriado(Base):
+    """
+    Días no laborables aunque caigan en un día de la semana laboral.
+    El calendario laboral (app/logic/calendario_laboral.py) los descuenta
+    al sumar horas o días hábiles.
+    """
+    __tablename__ = 'feriados'
+    
+    id_feriado = Column(Integer, primary_key=True, autoincrement=True)
+    fecha = Column(Date, unique=True, nullable=False)
+    descripcion = Column(String, nullable=True)
+    
+    def __repr__(self):
+        return f"<Feriado({self.fecha}, '{self.descripcion}')>"
+    
+    def to_dict(self):
+        return {
+            'id_feriado': self.id_feriado,
+            'fecha': self.fecha.isoformat() if self.fecha else None,
+            'descripcion': self.descripcion or ''
+        }
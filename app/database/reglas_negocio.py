@@ -0,0 +1,267 @@
+"""
+Reglas de negocio compiladas en memoria
+Convierte las tablas de reglas (precios escalonados, restricciones de
+cantidad) en estructuras de búsqueda rápida que se arman una vez y se
+cachean con la versión de catálogos (ver cache_catalogos)
+"""
+from bisect import bisect_left, bisect_right
+from app.database.conexion import get_read_session
+from app.database.models import PrecioEscalonado, RestriccionCantidad
+
+
+# =========================================================
+# PRECIOS ESCALONADOS
+# =========================================================
+
+class IndicePrecios:
+    """
+    Tramos de precio de un servicio como intervalos disjuntos ordenados
+
+    Con tramos bien definidos cada uno es un intervalo. Si dos tramos se
+    solapan, en la zona común manda el de cantidad_minima mayor (el más
+    específico para volumen) y el par queda registrado en 'conflictos'.
+
+    Attributes:
+        inicios: Cantidad inicial de cada intervalo (ordenada)
+        fines: Cantidad final inclusiva de cada intervalo (None = sin límite)
+        precios: Precio unitario de cada intervalo
+        conflictos: Lista de pares (id_precio, id_precio) que se solapan
+    """
+    __slots__ = ('inicios', 'fines', 'precios', 'conflictos')
+
+    def __init__(self, tramos):
+        """
+        Args:
+            tramos: Lista de tuplas (id, cantidad_minima, cantidad_maxima, precio_unitario)
+        """
+        tramos = sorted(tramos, key=lambda t: (t[1], t[0]))
+        self.conflictos = _detectar_solapamientos(tramos)
+        self.inicios = []
+        self.fines = []
+        self.precios = []
+
+        if not self.conflictos:
+            for _, minimo, maximo, precio in tramos:
+                self._agregar(minimo, maximo, precio)
+        else:
+            self._construir_con_prioridad(tramos)
+
+    def _agregar(self, inicio, fin, precio):
+        """Agrega un intervalo al final, uniéndolo al anterior si es contiguo"""
+        if (self.precios and self.precios[-1] == precio
+                and self.fines[-1] is not None and self.fines[-1] + 1 == inicio):
+            self.fines[-1] = fin
+            return
+        self.inicios.append(inicio)
+        self.fines.append(fin)
+        self.precios.append(precio)
+
+    def _construir_con_prioridad(self, tramos):
+        """Parte la recta en segmentos elementales y asigna a cada uno el
+        tramo de mayor cantidad_minima que lo cubre"""
+        bordes = set()
+        for _, minimo, maximo, _ in tramos:
+            bordes.add(minimo)
+            if maximo is not None:
+                bordes.add(maximo + 1)
+        bordes = sorted(bordes)
+
+        for i, inicio in enumerate(bordes):
+            fin = bordes[i + 1] - 1 if i + 1 < len(bordes) else None
+            precio = None
+            for _, minimo, maximo, precio_tramo in tramos:
+                if minimo <= inicio and (maximo is None or maximo >= inicio):
+                    precio = precio_tramo  # tramos ordenados: gana el último que cubre
+            if precio is not None:
+                self._agregar(inicio, fin, precio)
+
+    def precio(self, cantidad):
+        """
+        Busca el precio unitario para una cantidad
+
+        Args:
+            cantidad: Cantidad a cotizar
+
+        Returns:
+            float or None: Precio unitario o None si ningún tramo la cubre
+        """
+        i = bisect_right(self.inicios, cantidad) - 1
+        if i < 0:
+            return None
+        fin = self.fines[i]
+        if fin is None or cantidad <= fin:
+            return self.precios[i]
+        return None
+
+
+def _detectar_solapamientos(tramos):
+    """
+    Detecta tramos que se solapan en una lista ordenada por cantidad_minima
+
+    Args:
+        tramos: Tuplas (id, cantidad_minima, cantidad_maxima, precio_unitario) ordenadas
+
+    Returns:
+        list: Pares (id_a, id_b) de tramos con cantidades en común
+    """
+    conflictos = []
+    for i, (id_a, _, maximo_a, _) in enumerate(tramos):
+        for id_b, minimo_b, _, _ in tramos[i + 1:]:
+            if maximo_a is not None and minimo_b > maximo_a:
+                break
+            conflictos.append((id_a, id_b))
+    return conflictos
+
+
+def construir_indices_precios():
+    """
+    Arma un IndicePrecios por servicio con una sola consulta
+
+    Informa por consola los servicios con tramos solapados.
+
+    Returns:
+        dict: {id_servicio: IndicePrecios}
+    """
+    session = get_read_session()
+    try:
+        filas = session.query(
+            PrecioEscalonado.id_servicio,
+            PrecioEscalonado.id,
+            PrecioEscalonado.cantidad_minima,
+            PrecioEscalonado.cantidad_maxima,
+            PrecioEscalonado.precio_unitario
+        ).all()
+    finally:
+        session.close()
+
+    tramos_por_servicio = {}
+    for id_servicio, id_precio, minimo, maximo, precio in filas:
+        tramos_por_servicio.setdefault(id_servicio, []).append((id_precio, minimo, maximo, precio))
+
+    indices = {}
+    for id_servicio, tramos in tramos_por_servicio.items():
+        indice = IndicePrecios(tramos)
+        if indice.conflictos:
+            print(f"⚠️ Servicio {id_servicio}: precios escalonados solapados {indice.conflictos}")
+        indices[id_servicio] = indice
+    return indices
+
+
+# =========================================================
+# RESTRICCIONES DE CANTIDAD
+# =========================================================
+
+CANTIDAD_VALIDA = "Cantidad válida"
+
+# Múltiplos que se agregan a una restricción 'lista' con multiplo_base
+MULTIPLOS_LISTA = 50
+
+
+class ValidadorLista:
+    """Solo permite valores de una lista (más múltiplos opcionales)"""
+    __slots__ = ('permitidos', 'ordenados', 'mensaje')
+
+    def __init__(self, restriccion):
+        valores = set()
+        for valor in (restriccion.valores_permitidos or '').split(','):
+            valor = valor.strip()
+            if valor.lstrip('-').isdigit():
+                valores.add(int(valor))
+
+        if restriccion.multiplo_base and restriccion.multiplo_desde:
+            for i in range(1, MULTIPLOS_LISTA + 1):
+                multiplo = restriccion.multiplo_base * i
+                if multiplo >= restriccion.multiplo_desde:
+                    valores.add(multiplo)
+
+        self.permitidos = frozenset(valores)
+        self.ordenados = tuple(sorted(valores))
+        self.mensaje = restriccion.mensaje_error or (
+            f"Cantidad inválida. Opciones: {', '.join(map(str, self.ordenados[:10]))}..."
+        )
+
+    def validar(self, cantidad):
+        if cantidad in self.permitidos or not self.ordenados:
+            return True, CANTIDAD_VALIDA, cantidad
+
+        # Valor más cercano; ante empate, el menor
+        i = bisect_left(self.ordenados, cantidad)
+        if i == 0:
+            sugerida = self.ordenados[0]
+        elif i == len(self.ordenados):
+            sugerida = self.ordenados[-1]
+        else:
+            menor, mayor = self.ordenados[i - 1], self.ordenados[i]
+            sugerida = menor if cantidad - menor <= mayor - cantidad else mayor
+        return False, self.mensaje, sugerida
+
+
+class ValidadorMultiplo:
+    """Solo permite múltiplos de una base a partir de una cantidad"""
+    __slots__ = ('base', 'desde', 'mensaje', 'mensaje_minimo')
+
+    def __init__(self, restriccion):
+        self.base = restriccion.multiplo_base or 1
+        self.desde = restriccion.multiplo_desde or 1
+        self.mensaje = restriccion.mensaje_error or f"Solo se permiten múltiplos de {self.base}"
+        self.mensaje_minimo = f"La cantidad mínima es {self.desde}"
+
+    def validar(self, cantidad):
+        if cantidad < self.desde:
+            return False, self.mensaje_minimo, self.desde
+        if cantidad % self.base == 0:
+            return True, CANTIDAD_VALIDA, cantidad
+        sugerida = max(round(cantidad / self.base) * self.base, self.desde)
+        return False, self.mensaje, sugerida
+
+
+class ValidadorRango:
+    """Solo permite cantidades entre un mínimo y un máximo"""
+    __slots__ = ('minimo', 'maximo', 'mensaje_minimo', 'mensaje_maximo')
+
+    def __init__(self, restriccion):
+        self.minimo = restriccion.cantidad_minima or 1
+        self.maximo = restriccion.cantidad_maxima or 999999
+        self.mensaje_minimo = f"La cantidad mínima es {self.minimo}"
+        self.mensaje_maximo = f"La cantidad máxima es {self.maximo}"
+
+    def validar(self, cantidad):
+        if self.minimo <= cantidad <= self.maximo:
+            return True, CANTIDAD_VALIDA, cantidad
+        if cantidad < self.minimo:
+            return False, self.mensaje_minimo, self.minimo
+        return False, self.mensaje_maximo, self.maximo
+
+
+VALIDADORES_POR_TIPO = {
+    'lista': ValidadorLista,
+    'multiplo': ValidadorMultiplo,
+    'rango': ValidadorRango,
+}
+
+
+def construir_validadores_cantidad():
+    """
+    Compila las restricciones de cantidad en un validador por servicio
+
+    Si un servicio tiene varias restricciones se usa la de menor ID, igual
+    que la consulta original. Los tipos desconocidos no restringen.
+
+    Returns:
+        dict: {id_servicio: validador con método validar(cantidad)}
+    """
+    session = get_read_session()
+    try:
+        restricciones = session.query(RestriccionCantidad).order_by(RestriccionCantidad.id).all()
+        validadores = {}
+        for restriccion in restricciones:
+            if restriccion.id_servicio in validadores:
+                continue
+            clase = VALIDADORES_POR_TIPO.get(restriccion.tipo_restriccion)
+            if clase:
+                validadores[restriccion.id_servicio] = clase(restriccion)
+            else:
+                validadores[restriccion.id_servicio] = None
+        return {ids: v for ids, v in validadores.items() if v is not None}
+    finally:
+        session.close()
@@ -0,0 +1,132 @@
+"""
+Resúmenes diarios de ventas y producción
+Funciones que trabajan dentro de una sesión abierta (no hacen commit)
+
+Las tablas resumen_diario_pedidos y resumen_diario_servicios guardan una
+fila por día × estado (y × servicio). Cada escritura de pedido recalcula
+solo el día de ingreso afectado con un GROUP BY acotado por índice, en la
+misma transacción; reconstruir() hace lo mismo para un rango completo
+(carga inicial o corrección).
+
+Uso por consola para reconstruir:
+    python -m app.database.resumen_diario [desde [hasta]]   (fechas AAAA-MM-DD)
+"""
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func, insert, delete, select
+from app.database.models import (
+    Pedido, DetallePedido, ResumenDiarioPedidos, ResumenDiarioServicios
+)
+
+
+def _inicio_del_dia(fecha):
+    """Convierte una fecha (o datetime) en el datetime de las 00:00"""
+    if isinstance(fecha, datetime):
+        fecha = fecha.date()
+    return datetime.combine(fecha, time.min)
+
+
+def reconstruir(session, desde=None, hasta=None):
+    """
+    Recalcula los resúmenes de los días de ingreso entre desde y hasta
+
+    Borra las filas del rango y las vuelve a insertar con un
+    INSERT ... SELECT ... GROUP BY por tabla.
+
+    Args:
+        session: Sesión de escritura (no hace commit)
+        desde: Primer día incluido (None = desde el primer pedido)
+        hasta: Último día incluido (None = hasta el último pedido)
+
+    Returns:
+        int: Filas de resumen escritas (pedidos + servicios)
+    """
+    inicio = _inicio_del_dia(desde) if desde is not None else None
+    fin = _inicio_del_dia(hasta) + timedelta(days=1) if hasta is not None else None
+
+    def en_rango(columna_fecha, query):
+        if inicio is not None:
+            query = query.where(columna_fecha >= inicio)
+        if fin is not None:
+            query = query.where(columna_fecha < fin)
+        return query
+
+    # Las fechas de resumen son días: se comparan contra date, no datetime
+    borrar_pedidos = delete(ResumenDiarioPedidos)
+    borrar_servicios = delete(ResumenDiarioServicios)
+    if inicio is not None:
+        borrar_pedidos = borrar_pedidos.where(ResumenDiarioPedidos.fecha >= inicio.date())
+        borrar_servicios = borrar_servicios.where(ResumenDiarioServicios.fecha >= inicio.date())
+    if fin is not None:
+        borrar_pedidos = borrar_pedidos.where(ResumenDiarioPedidos.fecha < fin.date())
+        borrar_servicios = borrar_servicios.where(ResumenDiarioServicios.fecha < fin.date())
+    session.execute(borrar_pedidos)
+    session.execute(borrar_servicios)
+
+    dia = func.date(Pedido.fecha_ingreso)
+    por_pedido = en_rango(Pedido.fecha_ingreso, select(
+        dia,
+        Pedido.id_estado,
+        func.count(Pedido.id_pedido),
+        func.coalesce(func.sum(Pedido.costo_total), 0.0),
+        func.coalesce(func.sum(Pedido.acuenta), 0.0)
+    ).where(Pedido.fecha_ingreso.isnot(None))).group_by(dia, Pedido.id_estado)
+
+    por_servicio = en_rango(Pedido.fecha_ingreso, select(
+        dia,
+        DetallePedido.id_servicio,
+        Pedido.id_estado,
+        func.count(DetallePedido.id_detalle),
+        func.coalesce(func.sum(DetallePedido.cantidad), 0),
+        func.coalesce(func.sum(DetallePedido.cantidad * DetallePedido.precio_unitario), 0.0),
+        func.coalesce(func.sum(
+            func.coalesce(DetallePedido.ancho, 0.0) * func.coalesce(DetallePedido.alto, 0.0)
+            * DetallePedido.cantidad
+        ), 0.0)
+    ).join(Pedido, Pedido.id_pedido == DetallePedido.id_pedido).where(
+        Pedido.fecha_ingreso.isnot(None)
+    )).group_by(dia, DetallePedido.id_servicio, Pedido.id_estado)
+
+    filas = session.execute(insert(ResumenDiarioPedidos).from_select(
+        ['fecha', 'id_estado', 'pedidos', 'importe_total', 'acuenta'], por_pedido
+    )).rowcount
+    filas += session.execute(insert(ResumenDiarioServicios).from_select(
+        ['fecha', 'id_servicio', 'id_estado', 'lineas', 'unidades', 'ingresos', 'metros_cuadrados'],
+        por_servicio
+    )).rowcount
+    return filas
+
+
+def refrescar_dia(session, fecha):
+    """
+    Recalcula los resúmenes de un solo día
+
+    Args:
+        session: Sesión de escritura (no hace commit)
+        fecha: Día (date o datetime) a recalcular
+    """
+    reconstruir(session, fecha, fecha)
+
+
+def refrescar_pedido(session, id_pedido):
+    """
+    Recalcula el día de ingreso de un pedido tras crearlo o modificarlo
+
+    Hace flush para que el GROUP BY vea los cambios pendientes de la sesión.
+
+    Args:
+        session: Sesión de escritura (no hace commit)
+        id_pedido: ID del pedido modificado
+    """
+    session.flush()
+    fecha = session.query(Pedido.fecha_ingreso).filter(Pedido.id_pedido == id_pedido).scalar()
+    if fecha is not None:
+        refrescar_dia(session, fecha)
+
+
+if __name__ == "__main__":
+    import sys
+    from app.database import consultas
+
+    argumentos = [date.fromisoformat(valor) for valor in sys.argv[1:3]]
+    filas = consultas.reconstruir_resumenes_diarios(*argumentos)
+    print(f"✓ Resúmenes diarios reconstruidos: {filas} filas")
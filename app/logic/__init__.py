@@ -15,6 +15,7 @@ __all__ = [
     'sugerir_material_experto',
     'validar_trabajo_experto',
     'estimar_tiempo_experto',
-    'analizar_pedido_experto'
+    'analizar_pedido_experto',
+    'analizar_pedidos_lote'
 ]
 
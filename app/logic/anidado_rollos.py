@@ -0,0 +1,242 @@
+"""
+Anidado de Trabajos en Rollo (Strip Packing)
+Acomoda varios trabajos dimensionales de un mismo material lado a lado
+(y rotados si conviene) a lo ancho del rollo, para consumir la menor
+cantidad de metros lineales
+
+SISTEMA EXPERTO - Componente de Optimización de Material
+seleccionar_rollo_optimo (calculos.py) elige un rollo para UN diseño y el
+resto del ancho se pierde. Aquí el ancho del rollo se discretiza en
+columnas de RESOLUCION metros y se mantiene el "horizonte" (skyline): la
+altura ocupada en cada columna. Cada pieza, de la más grande a la más
+chica, se coloca en la posición y orientación donde su borde superior
+queda más bajo; todas las posiciones candidatas se evalúan juntas con
+NumPy (máximo por ventana deslizante y sumas acumuladas).
+
+Como la colocación es golosa, se prueban varias políticas de giro y de
+criterio (ESTRATEGIAS) y se queda el plan más corto.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from app.database.consultas import (
+    obtener_rollo_por_id, obtener_trabajos_en_cola, obtener_estados_pedidos
+)
+from app.logic.cola_produccion import ESTADOS_EN_COLA
+
+
+# Margen técnico por pieza en metros (mismo criterio que seleccionar_rollo_optimo, R6)
+MARGEN_TECNICO = 0.05
+
+# Tamaño de celda del horizonte en metros (1 cm)
+RESOLUCION = 0.01
+
+# (política de giro, criterio) que se prueban para cada plan:
+# - 'libre': cada pieza en la orientación que mejor quede
+# - 'original' / 'girada': todas igual, salvo que no entren así
+# - 'sin_giro': nunca se giran (cuando no se permite rotar)
+# - 'tope': prioriza el borde superior más bajo; 'ajuste': el menor hueco
+ESTRATEGIAS = (
+    ('libre', 'tope'), ('libre', 'ajuste'),
+    ('original', 'tope'), ('original', 'ajuste'),
+    ('girada', 'tope'), ('girada', 'ajuste'),
+)
+
+
+def _a_celdas(metros):
+    """Metros a celdas, redondeando hacia arriba (nunca achica una pieza)"""
+    return int(np.ceil(round(metros / RESOLUCION, 6)))
+
+
+def _expandir_piezas(trabajos):
+    """
+    Una pieza por unidad de cada trabajo con medidas, ordenadas de mayor a
+    menor (lado mayor y luego área)
+    """
+    piezas = []
+    for trabajo in trabajos:
+        ancho, alto = trabajo.get('ancho') or 0, trabajo.get('alto') or 0
+        if ancho <= 0 or alto <= 0:
+            continue
+        for indice in range(1, int(trabajo.get('cantidad') or 1) + 1):
+            piezas.append({
+                'id_detalle': trabajo.get('id_detalle'),
+                'id_pedido': trabajo.get('id_pedido'),
+                'indice': indice,
+                'ancho': ancho,
+                'alto': alto
+            })
+    piezas.sort(key=lambda p: (-max(p['ancho'], p['alto']), -p['ancho'] * p['alto']))
+    return piezas
+
+
+def _mejor_posicion(horizonte, ancho_celdas, alto_celdas, criterio='tope'):
+    """
+    Evalúa todas las posiciones x para una pieza de ancho_celdas columnas
+
+    Returns:
+        tuple or None: (tope, desperdicio, x, base) de la mejor posición:
+                       con criterio 'tope', menor tope y luego menor hueco
+                       bajo la pieza; con 'ajuste', al revés. A igualdad,
+                       la más a la izquierda
+    """
+    columnas = horizonte.shape[0]
+    if ancho_celdas > columnas:
+        return None
+
+    base = sliding_window_view(horizonte, ancho_celdas).max(axis=1)
+    acumulado = np.concatenate(([0], np.cumsum(horizonte)))
+    ocupado = acumulado[ancho_celdas:] - acumulado[:-ancho_celdas]
+    desperdicio = base * ancho_celdas - ocupado
+    tope = base + alto_celdas
+
+    claves = (desperdicio, tope) if criterio == 'tope' else (tope, desperdicio)
+    x = int(np.lexsort(claves)[0])
+    return int(tope[x]), int(desperdicio[x]), x, int(base[x])
+
+
+def _orientaciones(pieza, politica, margen, ancho_rollo):
+    """Orientaciones (ancho, alto, rotada) a evaluar según la política de giro"""
+    original = (pieza['ancho'], pieza['alto'], False)
+    girada = (pieza['alto'], pieza['ancho'], True)
+    if pieza['ancho'] == pieza['alto'] or politica == 'sin_giro':
+        return [original]
+    if politica == 'libre':
+        return [original, girada]
+    preferida, alternativa = (original, girada) if politica == 'original' else (girada, original)
+    return [preferida] if preferida[0] + margen <= ancho_rollo else [alternativa]
+
+
+def _empacar(piezas, ancho_rollo, margen, politica, criterio):
+    """
+    Coloca las piezas con una estrategia
+
+    Returns:
+        tuple: (metros consumidos, piezas ubicadas, piezas sin ubicar)
+    """
+    columnas = int(np.floor(round(ancho_rollo / RESOLUCION, 6)))
+    horizonte = np.zeros(max(columnas, 0), dtype=np.int64)
+    orden = (lambda p: p[:2]) if criterio == 'tope' else (lambda p: (p[1], p[0]))
+
+    ubicadas = []
+    sin_ubicar = []
+    for pieza in piezas:
+        mejor = None
+        for ancho, alto, rotada in _orientaciones(pieza, politica, margen, ancho_rollo):
+            posicion = _mejor_posicion(horizonte, _a_celdas(ancho + margen), _a_celdas(alto + margen),
+                                       criterio)
+            if posicion is not None and (mejor is None or orden(posicion) < orden(mejor[0])):
+                mejor = (posicion, ancho, alto, rotada)
+
+        if mejor is None:
+            sin_ubicar.append(dict(pieza))
+            continue
+
+        (tope, _, x, base), ancho, alto, rotada = mejor
+        horizonte[x:x + _a_celdas(ancho + margen)] = tope
+        ubicadas.append(dict(
+            pieza, x=round(x * RESOLUCION, 2), y=round(base * RESOLUCION, 2),
+            ancho=ancho, alto=alto, rotada=rotada
+        ))
+
+    metros = float(horizonte.max()) * RESOLUCION if ubicadas else 0.0
+    return metros, ubicadas, sin_ubicar
+
+
+def anidar_piezas(trabajos, ancho_rollo, margen=MARGEN_TECNICO, permitir_rotacion=True):
+    """
+    Calcula un plan de corte para varios trabajos en un rollo
+
+    Args:
+        trabajos: Lista de diccionarios {id_detalle, id_pedido, ancho, alto, cantidad}
+                  (medidas en metros; los que no tienen medidas se ignoran)
+        ancho_rollo: Ancho útil del rollo en metros
+        margen: Margen técnico que se suma al ancho y al alto de cada pieza
+        permitir_rotacion: Si se pueden girar las piezas 90°
+
+    Returns:
+        dict: {
+            'ancho_rollo': float,
+            'metros_lineales': float,  # Largo de rollo consumido por el plan
+            'metros_sin_anidar': float,  # Una pieza por fila, sin girar si entra
+            'ahorro_metros': float,
+            'aprovechamiento': float,  # % del área consumida cubierta por piezas
+            'estrategia': str,  # Política de giro y criterio del plan elegido
+            'piezas': list,  # {id_detalle, id_pedido, indice, x, y, ancho, alto, rotada}
+            'sin_ubicar': list,  # Piezas más anchas que el rollo en ambas orientaciones
+            'metros_por_detalle': dict  # {id_detalle: metros} reparto por área, suma metros_lineales
+        }
+    """
+    piezas = _expandir_piezas(trabajos)
+    estrategias = ESTRATEGIAS if permitir_rotacion else (('sin_giro', 'tope'), ('sin_giro', 'ajuste'))
+
+    mejor = None
+    for politica, criterio in estrategias:
+        resultado = _empacar(piezas, ancho_rollo, margen, politica, criterio)
+        # Primero ubicar la mayor cantidad de piezas, luego el menor largo
+        if mejor is None or (len(resultado[2]), resultado[0]) < (len(mejor[1][2]), mejor[1][0]):
+            mejor = (f"{politica}/{criterio}", resultado)
+    estrategia, (metros, ubicadas, sin_ubicar) = mejor
+
+    # Referencia: cada pieza en su propia fila (sin girar si entra)
+    metros_sin_anidar = 0.0
+    for pieza in ubicadas:
+        ancho, alto = (pieza['alto'], pieza['ancho']) if pieza['rotada'] else (pieza['ancho'], pieza['alto'])
+        metros_sin_anidar += (alto if ancho + margen <= ancho_rollo else ancho) + margen
+
+    area_piezas = sum(p['ancho'] * p['alto'] for p in ubicadas)
+    area_consumida = metros * ancho_rollo
+
+    # Reparto de los metros entre detalles en proporción al área que ocupan
+    metros_por_detalle = {}
+    if area_piezas > 0:
+        for pieza in ubicadas:
+            id_detalle = pieza['id_detalle']
+            metros_por_detalle[id_detalle] = metros_por_detalle.get(id_detalle, 0.0) + (
+                metros * pieza['ancho'] * pieza['alto'] / area_piezas)
+        metros_por_detalle = {k: round(v, 3) for k, v in metros_por_detalle.items()}
+
+    return {
+        'ancho_rollo': ancho_rollo,
+        'metros_lineales': round(metros, 2),
+        'metros_sin_anidar': round(metros_sin_anidar, 2),
+        'ahorro_metros': round(max(metros_sin_anidar - metros, 0.0), 2),
+        'aprovechamiento': round(area_piezas * 100 / area_consumida, 1) if area_consumida > 0 else 0.0,
+        'estrategia': estrategia,
+        'piezas': ubicadas,
+        'sin_ubicar': sin_ubicar,
+        'metros_por_detalle': metros_por_detalle
+    }
+
+
+def planificar_corte_material(id_material, ids_pedidos=None):
+    """
+    Plan de corte de los trabajos pendientes de un material en rollo
+
+    Toma los detalles en cola (ESTADOS_EN_COLA) que usan el material y los
+    anida en el ancho_disponible de su inventario dimensional.
+
+    Args:
+        id_material: ID del material dimensional
+        ids_pedidos: Limitar a estos pedidos (opcional)
+
+    Returns:
+        dict or None: Resultado de anidar_piezas más id_material,
+                      nombre_material y largo_disponible (y 'alcanza': si
+                      el rollo tiene los metros del plan). None si el
+                      material no es dimensional.
+    """
+    rollo = obtener_rollo_por_id(id_material)
+    if not rollo or rollo['tipo_material'] != 'dimension' or not rollo['ancho_disponible']:
+        return None
+
+    ids_estados = [e['id'] for e in obtener_estados_pedidos() if e['nombre'] in ESTADOS_EN_COLA]
+    trabajos = obtener_trabajos_en_cola(ids_estados, ids_pedidos=ids_pedidos, id_material=id_material)
+
+    plan = anidar_piezas(trabajos, rollo['ancho_disponible'])
+    plan.update({
+        'id_material': id_material,
+        'nombre_material': rollo['nombre_material'],
+        'largo_disponible': rollo['largo_disponible'],
+        'alcanza': plan['metros_lineales'] <= (rollo['largo_disponible'] or 0)
+    })
+    return plan
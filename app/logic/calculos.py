@@ -290,7 +290,21 @@ def validar_optimizacion_impresion(ancho, alto=0, nombre_servicio=None, ancho_ma
             'puede_rotar': bool,
             'division_sugerida': int  # Número de paños si aplica
         }
+    
+    Los resultados se recuerdan por medidas, máquina/servicio y versión de
+    la base de conocimientos (ver motor_inferencia.MemoriaResultados).
     """
+    from app.logic.motor_inferencia import memoria_resultados, normalizar_medida
+    
+    ancho, alto = normalizar_medida(ancho), normalizar_medida(alto)
+    return memoria_resultados.obtener(
+        ('optimizacion', ancho, alto, ancho_maximo_maquina, id_maquina, id_servicio),
+        lambda: _validar_optimizacion_impresion(ancho, alto, ancho_maximo_maquina, id_maquina, id_servicio)
+    )
+
+
+def _validar_optimizacion_impresion(ancho, alto, ancho_maximo_maquina, id_maquina, id_servicio):
+    """Evalúa las reglas R-OPT sobre la base de conocimientos (sin memoria)"""
     resultado = {
         'requiere_optimizacion': False,
         'es_factible': True,
@@ -422,7 +436,7 @@ def validar_optimizacion_impresion(ancho, alto=0, nombre_servicio=None, ancho_ma
 
 def _obtener_capacidad_maquina(id_maquina):
     """
-    Helper: Obtiene la capacidad de una máquina específica desde la BD.
+    Helper: Obtiene la capacidad de una máquina específica.
     
     Args:
         id_maquina (int): ID de la máquina
@@ -431,33 +445,10 @@ def _obtener_capacidad_maquina(id_maquina):
         dict or None: Datos de capacidad
     """
     try:
-        from app.database.conexion import get_session
-        from app.database.models import Maquina, CapacidadMaquina
-        
-        session = get_session()
-        try:
-            capacidad = session.query(CapacidadMaquina).filter(
-                CapacidadMaquina.id_maquina == id_maquina
-            ).first()
-            
-            if capacidad:
-                maquina = session.query(Maquina).filter(
-                    Maquina.id_maquina == id_maquina
-                ).first()
-                
-                return {
-                    'id_maquina': id_maquina,
-                    'nombre': maquina.nombre if maquina else f'Máquina #{id_maquina}',
-                    'ancho_util_max': capacidad.ancho_util_max or 0,
-                    'largo_util_max': capacidad.largo_util_max or 0,
-                    'velocidad_promedio': capacidad.velocidad_promedio or 0
-                }
-        finally:
-            session.close()
+        from app.logic.motor_inferencia import obtener_base_conocimiento
+        return obtener_base_conocimiento().capacidad_maquina(id_maquina)
     except Exception:
-        pass
-    
-    return None
+        return None
 
 
 def _obtener_mejor_capacidad_por_servicio(id_servicio):
@@ -474,43 +465,10 @@ def _obtener_mejor_capacidad_por_servicio(id_servicio):
         dict or None: Datos de capacidad de la mejor máquina
     """
     try:
-        from app.database.conexion import get_session
-        from sqlalchemy import text
-        
-        session = get_session()
-        try:
-            query = """
-                SELECT 
-                    m.id_maquina,
-                    m.nombre,
-                    cm.ancho_util_max,
-                    cm.largo_util_max,
-                    cm.velocidad_promedio,
-                    ms.es_recomendada
-                FROM maquinas m
-                JOIN maquinas_servicios ms ON m.id_maquina = ms.id_maquina
-                LEFT JOIN capacidad_maquinas cm ON m.id_maquina = cm.id_maquina
-                WHERE ms.id_servicio = :id_servicio
-                ORDER BY ms.es_recomendada DESC, cm.ancho_util_max DESC
-                LIMIT 1
-            """
-            
-            result = session.execute(text(query), {'id_servicio': id_servicio}).fetchone()
-            
-            if result:
-                return {
-                    'id_maquina': result[0],
-                    'nombre': result[1],
-                    'ancho_util_max': result[2] or 0,
-                    'largo_util_max': result[3] or 0,
-                    'velocidad_promedio': result[4] or 0
-                }
-        finally:
-            session.close()
+        from app.logic.motor_inferencia import obtener_base_conocimiento
+        return obtener_base_conocimiento().mejor_capacidad_servicio(id_servicio)
     except Exception:
-        pass
-    
-    return None
+        return None
 
 
 def convertir_millares_a_unidades(millares):
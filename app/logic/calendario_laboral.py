@@ -0,0 +1,212 @@
+"""
+Calendario Laboral del Taller
+Responde preguntas de tiempo hábil ("sumar N horas laborales a T",
+"horas laborales entre dos fechas", "N días hábiles después de T") con
+aritmética sobre ciclos semanales y una lista ordenada de feriados
+
+SISTEMA EXPERTO - Componente de Planificación Temporal
+Se arma a partir de la configuración de producción (hora_apertura,
+hora_cierre, horas_laborales_dia, dias_laborales) y de la tabla feriados,
+y se reutiliza mientras ninguna de las dos cambie.
+
+Modelo: cada día laboral aporta una jornada de J horas desde la apertura.
+Contando desde un lunes de referencia, las horas hábiles antes de un día D
+son semanas * horas_semana + prefijo[día de la semana] - J * feriados
+anteriores; el feriado se resuelve con bisect, sin recorrer días.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from app.database.consultas import obtener_configuracion_produccion, obtener_feriados
+
+
+# Lunes de referencia para contar semanas (cualquier lunes sirve)
+_LUNES_REFERENCIA = date(2000, 1, 3)
+
+
+class CalendarioLaboral:
+    """
+    Calendario de jornadas hábiles precalculado
+
+    Attributes:
+        apertura: Hora de inicio de la jornada (timedelta desde las 00:00)
+        jornada: Duración de la jornada (timedelta)
+        dias_semana: Días laborales de la semana (0=Lunes ... 6=Domingo), ordenados
+        feriados: Feriados que caen en día laboral, ordenados (date)
+    """
+    __slots__ = ('apertura', 'jornada', 'dias_semana', 'feriados',
+                 '_es_laboral', '_prefijo', '_dias_por_semana')
+
+    def __init__(self, hora_apertura, horas_jornada, dias_semana, feriados=()):
+        """
+        Args:
+            hora_apertura: Hora de apertura (ej: 8 o 8.5)
+            horas_jornada: Horas laborales por día
+            dias_semana: Iterable de días laborales (1=Lunes ... 7=Domingo)
+            feriados: Iterable de date
+        """
+        dias = sorted({int(d) - 1 for d in dias_semana if 1 <= int(d) <= 7})
+        if not dias or horas_jornada <= 0:
+            # Sin jornada válida: tiempo corrido
+            dias, hora_apertura, horas_jornada = list(range(7)), 0, 24
+
+        self.apertura = timedelta(hours=hora_apertura)
+        self.jornada = timedelta(hours=horas_jornada)
+        self.dias_semana = tuple(dias)
+        self._es_laboral = tuple(d in dias for d in range(7))
+        self._dias_por_semana = len(dias)
+
+        # prefijo[d] = días laborales de la semana anteriores al día d
+        self._prefijo = []
+        acumulado = 0
+        for d in range(7):
+            self._prefijo.append(acumulado)
+            acumulado += self._es_laboral[d]
+
+        self.feriados = tuple(sorted({f for f in feriados if self._es_laboral[f.weekday()]}))
+
+    # ---------------------------------------------------------
+    # Conteo de días
+    # ---------------------------------------------------------
+
+    def es_dia_laboral(self, dia):
+        """True si el día (date o datetime) es laboral y no es feriado"""
+        if isinstance(dia, datetime):
+            dia = dia.date()
+        if not self._es_laboral[dia.weekday()]:
+            return False
+        i = bisect_left(self.feriados, dia)
+        return i == len(self.feriados) or self.feriados[i] != dia
+
+    def _dias_laborales_antes(self, dia):
+        """Días laborales (sin feriados) anteriores a 'dia', desde la referencia"""
+        semanas, resto = divmod((dia - _LUNES_REFERENCIA).days, 7)
+        return semanas * self._dias_por_semana + self._prefijo[resto] - bisect_left(self.feriados, dia)
+
+    def _dia_laboral_numero(self, n):
+        """
+        Día laboral número n (el que tiene n días laborales antes)
+
+        Sin feriados es una división por la semana. Cada feriado hasta la
+        fecha candidata empuja el índice uno más; se itera hasta que el
+        conteo se estabiliza (tantas vueltas como feriados en el medio).
+        """
+        m = n
+        while True:
+            semanas, resto = divmod(m, self._dias_por_semana)
+            dia = _LUNES_REFERENCIA + timedelta(days=semanas * 7 + self.dias_semana[resto])
+            siguiente = n + bisect_right(self.feriados, dia)
+            if siguiente == m:
+                return dia
+            m = siguiente
+
+    # ---------------------------------------------------------
+    # Horas hábiles
+    # ---------------------------------------------------------
+
+    def _horas_acumuladas(self, momento):
+        """Tiempo hábil (timedelta) transcurrido hasta 'momento' desde la referencia"""
+        dia = momento.date()
+        acumulado = self.jornada * self._dias_laborales_antes(dia)
+        if self.es_dia_laboral(dia):
+            dentro = momento - datetime.combine(dia, time.min) - self.apertura
+            acumulado += min(max(dentro, timedelta(0)), self.jornada)
+        return acumulado
+
+    def _momento_de(self, acumulado, al_cierre):
+        """Inversa de _horas_acumuladas"""
+        n, dentro = divmod(acumulado, self.jornada)
+        if al_cierre and dentro == timedelta(0):
+            # Justo en un borde: se devuelve el cierre del día anterior
+            n, dentro = n - 1, self.jornada
+        dia = self._dia_laboral_numero(n)
+        return datetime.combine(dia, time.min) + self.apertura + dentro
+
+    def sumar_horas(self, desde, horas, al_cierre=True):
+        """
+        Momento en que se completan 'horas' laborales a partir de 'desde'
+
+        Args:
+            desde: datetime de partida
+            horas: Horas laborales a sumar (>= 0)
+            al_cierre: Si el resultado cae justo en el borde entre dos
+                       jornadas, True devuelve el cierre de la primera (fin
+                       de un trabajo) y False la apertura de la siguiente
+                       (inicio de un trabajo)
+
+        Returns:
+            datetime
+        """
+        acumulado = self._horas_acumuladas(desde) + timedelta(hours=horas)
+        return self._momento_de(acumulado, al_cierre and horas > 0)
+
+    def horas_entre(self, desde, hasta):
+        """
+        Horas laborales entre dos momentos
+
+        Returns:
+            float: Horas hábiles (negativo si hasta < desde)
+        """
+        return (self._horas_acumuladas(hasta) - self._horas_acumuladas(desde)) / timedelta(hours=1)
+
+    def sumar_dias_laborales(self, desde, dias):
+        """
+        Fecha del día hábil número 'dias' después de 'desde' (misma hora)
+
+        Args:
+            desde: datetime de partida
+            dias: Días hábiles a avanzar (el día de partida no cuenta)
+
+        Returns:
+            datetime
+        """
+        if dias <= 0:
+            return desde
+        manana = desde.date() + timedelta(days=1)
+        dia = self._dia_laboral_numero(self._dias_laborales_antes(manana) + dias - 1)
+        return datetime.combine(dia, desde.time())
+
+
+# =========================================================
+# CALENDARIO VIGENTE
+# =========================================================
+
+_cache = None  # (clave de configuración, tupla de feriados, calendario)
+
+
+def _horas_jornada(config):
+    """Horas por día: horas_laborales_dia, sin pasar de la hora de cierre"""
+    horas = float(config['horas_laborales_dia'])
+    apertura, cierre = float(config['hora_apertura']), float(config['hora_cierre'])
+    if cierre > apertura:
+        horas = min(horas, cierre - apertura)
+    return horas
+
+
+def obtener_calendario():
+    """
+    Devuelve el calendario laboral vigente
+
+    Solo se reconstruye si cambió la configuración de producción o el
+    catálogo de feriados (que se cachea con la versión de catálogos).
+
+    Returns:
+        CalendarioLaboral
+    """
+    global _cache
+    config = obtener_configuracion_produccion()
+    clave = (config['hora_apertura'], config['hora_cierre'],
+             config['horas_laborales_dia'], str(config['dias_laborales']))
+    feriados = obtener_feriados()
+
+    cache = _cache
+    if cache is not None and cache[0] == clave and cache[1] is feriados:
+        return cache[2]
+
+    calendario = CalendarioLaboral(
+        float(config['hora_apertura']),
+        _horas_jornada(config),
+        [d for d in str(config['dias_laborales']).split(',') if d.strip()],
+        [date.fromisoformat(f['fecha']) for f in feriados if f['fecha']]
+    )
+    _cache = (clave, feriados, calendario)
+    return calendario
@@ -6,8 +6,35 @@ SISTEMA EXPERTO - Componente de Planificación Temporal
 Este módulo usa configuraciones dinámicas de la BD para calcular
 tiempos de entrega basándose en la carga de trabajo real.
 """
+import math
 from datetime import datetime, timedelta
-from app.database.consultas import obtener_pedidos, obtener_configuracion_produccion, obtener_configuracion
+from app.database.consultas import (
+    obtener_configuracion_produccion, obtener_configuracion,
+    obtener_estados_pedidos, obtener_carga_produccion,
+    obtener_maquinas_para_planificar, actualizar_prioridad_pedido
+)
+from app.database.consultas_reportes import obtener_pedidos_por_estado
+from app.logic.calendario_laboral import obtener_calendario
+from app.logic.motor_inferencia import horas_por_velocidad
+
+
+# Estados que ocupan la cola de producción
+ESTADOS_EN_COLA = (
+    'Cotizado', 'Confirmado', 'En Diseño',
+    'Previsualización Enviada', 'En Preparación', 'Listo para Entrega'
+)
+
+# Tiempos base por tipo de trabajo (horas)
+TIEMPOS_BASE_POR_TIPO = {
+    'MERCHANDISING': 2.0,
+    'RECUERDOS': 1.5,
+    'FORMATOS': 3.0,
+    'FORMATERIA': 3.0,
+    'GIGANTOGRAFIA': 4.0,
+    'GIGANTOGRAFÍA': 4.0
+}
+TIEMPO_BASE_DEFECTO = 2.0
+HORAS_POR_M2 = 0.5
 
 
 def _obtener_config_produccion():
@@ -32,24 +59,6 @@ def _obtener_config_produccion():
         }
 
 
-def _es_dia_laboral(fecha, dias_laborales_str):
-    """
-    Verifica si una fecha es día laboral según la configuración
-    
-    Args:
-        fecha: datetime a verificar
-        dias_laborales_str: String con días laborales "1,2,3,4,5,6"
-    
-    Returns:
-        bool: True si es día laboral
-    """
-    # Convertir string a lista de enteros (1=Lunes, 7=Domingo)
-    dias_config = [int(d.strip()) for d in dias_laborales_str.split(',') if d.strip()]
-    # Python usa 0=Lunes, 6=Domingo, ajustamos sumando 1
-    dia_semana = fecha.weekday() + 1
-    return dia_semana in dias_config
-
-
 def estimar_tiempo_produccion_por_tipo(tipo_servicio, area_m2=0, cantidad=1):
     """
     Estima el tiempo de producción en horas según el tipo de servicio
@@ -62,25 +71,12 @@ def estimar_tiempo_produccion_por_tipo(tipo_servicio, area_m2=0, cantidad=1):
     Returns:
         float: Horas estimadas de producción
     """
-    tipo = tipo_servicio.upper()
-
-    # Tiempos base por tipo de trabajo (horas)
-    tiempos_base = {
-        'MERCHANDISING': 2.0,
-        'RECUERDOS': 1.5,
-        'FORMATOS': 3.0,
-        'FORMATERIA': 3.0,
-        'GIGANTOGRAFIA': 4.0,
-        'GIGANTOGRAFÍA': 4.0
-    }
-
-    # Obtener tiempo base, si no existe usar 2.0 horas por defecto
-    tiempo_base = tiempos_base.get(tipo, 2.0)
+    tiempo_base = TIEMPOS_BASE_POR_TIPO.get(tipo_servicio.upper(), TIEMPO_BASE_DEFECTO)
 
     # Calcular tiempo según cantidad y área
     if area_m2 > 0:
         # Para trabajos con área, agregar tiempo proporcional al área
-        tiempo_area = area_m2 * 0.5  # 0.5 horas por metro cuadrado
+        tiempo_area = area_m2 * HORAS_POR_M2
         tiempo_total = tiempo_base + tiempo_area
     else:
         # Para trabajos sin área específica, usar cantidad
@@ -90,17 +86,24 @@ def estimar_tiempo_produccion_por_tipo(tipo_servicio, area_m2=0, cantidad=1):
     return max(tiempo_total, 1.0)
 
 
-def calcular_fecha_entrega_con_cola(horas_requeridas, es_urgente=False):
+def calcular_fecha_entrega_con_cola(id_servicio, ancho=0, alto=0, cantidad=1, es_urgente=False):
     """
-    Calcula la fecha de entrega considerando la cola de producción actual
+    Calcula la fecha de entrega según el plan de producción por máquina
     
+    El trabajo se ubica en la máquina compatible que lo termina antes
+    (planificador.estimar_fin_trabajo), con la duración y la cola de esa
+    máquina en plan_produccion. Un pedido urgente pasa adelante de los de
+    prioridad normal y lleva el recargo configurado.
+
     USA CONFIGURACIÓN DINÁMICA DE BD:
-    - Horas laborales por día
-    - Días laborales de la semana
+    - Calendario laboral (jornada, días laborales y feriados)
     - Recargo por urgencia
 
     Args:
-        horas_requeridas (float): Horas necesarias para el trabajo
+        id_servicio (int): Servicio del trabajo
+        ancho (float): Ancho en metros (0 si no es dimensional)
+        alto (float): Alto en metros
+        cantidad (int): Número de unidades
         es_urgente (bool): Si es un pedido urgente
 
     Returns:
@@ -108,115 +111,106 @@ def calcular_fecha_entrega_con_cola(horas_requeridas, es_urgente=False):
             'fecha_entrega': datetime,
             'dias_habiles': int,
             'recargo_porcentaje': float,
+            'maquina': str or None,
+            'horas_trabajo': float,
             'explicacion': str,
             'config_usada': dict
         }
     """
-    # Obtener configuración dinámica
-    config = _obtener_config_produccion()
-    
-    # Obtener carga actual de trabajo
-    info_cola = obtener_info_cola_produccion()
-    horas_pendientes = info_cola['horas_pendientes']
-
-    # Calcular horas totales
-    horas_totales = horas_pendientes + horas_requeridas
+    from app.logic import planificador
 
-    # Usar configuración dinámica
-    HORAS_LABORALES_POR_DIA = config['horas_laborales_dia']
-    dias_laborales_str = config['dias_laborales']
-
-    # Calcular días necesarios
-    dias_necesarios = horas_totales / HORAS_LABORALES_POR_DIA
-
-    # Si es urgente, se prioriza (50% más rápido pero con recargo)
-    if es_urgente:
-        dias_necesarios = dias_necesarios * 0.5
-        recargo_porcentaje = float(config['recargo_urgente'])
+    config = _obtener_config_produccion()
+    ahora = datetime.now()
+    calendario = obtener_calendario()
+    recargo_porcentaje = float(config['recargo_urgente']) if es_urgente else 0.0
+
+    estimacion = planificador.estimar_fin_trabajo(id_servicio, ancho, alto, cantidad, urgente=es_urgente)
+    if estimacion:
+        fecha_entrega = estimacion['fin']
+        horas_trabajo = estimacion['horas']
+        explicacion_partes = [
+            f"Máquina: {estimacion['nombre']}",
+            f"Libre desde: {estimacion['inicio'].strftime('%d/%m %H:%M')}",
+            f"Horas de este trabajo: {horas_trabajo:.1f}h",
+        ]
     else:
-        recargo_porcentaje = 0.0
-
-    # Redondear hacia arriba
-    dias_necesarios = int(dias_necesarios) + 1
-
-    # Calcular fecha de entrega (solo días laborales configurados)
-    fecha_actual = datetime.now()
-    dias_agregados = 0
-    fecha_entrega = fecha_actual
-
-    while dias_agregados < dias_necesarios:
-        fecha_entrega += timedelta(days=1)
-        # Verificar si es día laboral según configuración
-        if _es_dia_laboral(fecha_entrega, dias_laborales_str):
-            dias_agregados += 1
+        # Sin máquina compatible: misma regla de tiempo, sin esperar cola
+        horas_trabajo = horas_por_velocidad(None, (ancho or 0) * (alto or 0), cantidad or 0)
+        fecha_entrega = calendario.sumar_horas(ahora, horas_trabajo)
+        explicacion_partes = [
+            "Sin máquina compatible en el plan: estimado con velocidad por defecto",
+            f"Horas de este trabajo: {horas_trabajo:.1f}h",
+        ]
 
-    # Generar explicación
-    explicacion_partes = []
-    explicacion_partes.append(f"Horas pendientes en cola: {horas_pendientes:.1f}h")
-    explicacion_partes.append(f"Horas de este trabajo: {horas_requeridas:.1f}h")
-    explicacion_partes.append(f"Jornada: {HORAS_LABORALES_POR_DIA}h/día")
-    explicacion_partes.append(f"Total: {horas_totales:.1f}h = {dias_necesarios} días hábiles")
+    HORAS_LABORALES_POR_DIA = config['horas_laborales_dia']
+    horas_hasta_entrega = max(calendario.horas_entre(ahora, fecha_entrega), 0.0)
+    dias_necesarios = max(math.ceil(horas_hasta_entrega / HORAS_LABORALES_POR_DIA), 1)
+    explicacion_partes.append(f"Total: {horas_hasta_entrega:.1f}h hábiles = {dias_necesarios} días hábiles")
 
     if es_urgente:
         explicacion_partes.append(f"URGENTE: Prioridad alta con recargo del {recargo_porcentaje:.0f}%")
 
-    explicacion = " | ".join(explicacion_partes)
-
     return {
         'fecha_entrega': fecha_entrega,
         'dias_habiles': dias_necesarios,
         'recargo_porcentaje': recargo_porcentaje,
-        'explicacion': explicacion,
+        'maquina': estimacion['nombre'] if estimacion else None,
+        'horas_trabajo': horas_trabajo,
+        'explicacion': " | ".join(explicacion_partes),
         'config_usada': config
     }
 
 
+def _obtener_carga_en_cola():
+    """
+    Carga de la cola agregada por estado y por servicio
+
+    Returns:
+        dict: Resultado de consultas.obtener_carga_produccion()
+    """
+    ids_estados = [e['id'] for e in obtener_estados_pedidos() if e['nombre'] in ESTADOS_EN_COLA]
+    if not ids_estados:
+        return {'por_estado': {}, 'por_servicio': {}}
+    return obtener_carga_produccion(ids_estados)
+
+
 def obtener_info_cola_produccion():
     """
     Obtiene información sobre el estado actual de la cola de producción
     
+    Las horas salen del plan por máquina (plan_produccion), el mismo que
+    usa calcular_fecha_entrega_con_cola. Como las máquinas trabajan en
+    paralelo, los días ocupados son los de la máquina más cargada.
+
     USA CONFIGURACIÓN DINÁMICA DE BD:
-    - Tiempo promedio por pedido
     - Horas laborales por día
 
     Returns:
         dict: {
             'pedidos_en_cola': int,
-            'horas_pendientes': float,
+            'horas_pendientes': float,  # Suma de las máquinas
             'dias_ocupados': int,
             'estado': str,
+            'maquinas': list,  # planificador.obtener_carga_por_maquina()
             'config': dict
         }
     """
+    from app.logic.planificador import obtener_carga_por_maquina
+
     try:
         # Obtener configuración dinámica
         config = _obtener_config_produccion()
         
-        # Obtener pedidos pendientes y en proceso
-        pedidos = obtener_pedidos()
-
-        # Función auxiliar para acceder de forma segura a sqlite3.Row
-        def get_field(row, field, default=None):
-            try:
-                return row[field] if row[field] is not None else default
-            except (KeyError, IndexError):
-                return default
-
-        # Filtrar pedidos que no están entregados o cancelados
-        pedidos_activos = [
-            p for p in pedidos
-            if get_field(p, 'estado_nombre') in ['Cotizado', 'Confirmado', 'En Diseño',
-                                                   'Previsualización Enviada', 'En Preparación',
-                                                   'Listo para Entrega']
-        ]
-
-        # Estimar horas pendientes usando configuración dinámica
-        tiempo_promedio = config['tiempo_promedio_pedido']
-        horas_pendientes = len(pedidos_activos) * tiempo_promedio
+        # Pedidos en cola (conteo en SQL) y horas del plan por máquina
+        carga = _obtener_carga_en_cola()
+        pedidos_en_cola = sum(e['pedidos'] for e in carga['por_estado'].values())
+        maquinas = obtener_carga_por_maquina()
+        horas_pendientes = sum(m['pendientes'] for m in maquinas)
+        horas_mas_cargada = max((m['pendientes'] for m in maquinas), default=0.0)
 
         # Calcular días ocupados
         HORAS_LABORALES_POR_DIA = config['horas_laborales_dia']
-        dias_ocupados = int(horas_pendientes / HORAS_LABORALES_POR_DIA) + 1 if horas_pendientes > 0 else 0
+        dias_ocupados = int(horas_mas_cargada / HORAS_LABORALES_POR_DIA) + 1 if horas_mas_cargada > 0 else 0
 
         # Determinar estado de la producción
         if dias_ocupados <= 2:
@@ -229,10 +223,11 @@ def obtener_info_cola_produccion():
             estado = "🔴 Saturado"
 
         return {
-            'pedidos_en_cola': len(pedidos_activos),
+            'pedidos_en_cola': pedidos_en_cola,
             'horas_pendientes': horas_pendientes,
             'dias_ocupados': dias_ocupados,
             'estado': estado,
+            'maquinas': maquinas,
             'config': config
         }
 
@@ -243,6 +238,7 @@ def obtener_info_cola_produccion():
             'horas_pendientes': 0.0,
             'dias_ocupados': 0,
             'estado': "⚪ Sin información",
+            'maquinas': [],
             'config': None
         }
 
@@ -255,21 +251,11 @@ def obtener_estadisticas_produccion():
         dict: Estadísticas de producción
     """
     try:
-        pedidos = obtener_pedidos()
-
-        # Función auxiliar para acceder de forma segura a sqlite3.Row
-        def get_field(row, field, default=None):
-            try:
-                return row[field] if row[field] is not None else default
-            except (KeyError, IndexError):
-                return default
-
-        total_pedidos = len(pedidos)
-        pedidos_completados = len([p for p in pedidos if get_field(p, 'estado_nombre') == 'Entregado'])
-        pedidos_pendientes = len([p for p in pedidos if get_field(p, 'estado_nombre') in [
-            'Cotizado', 'Confirmado', 'En Diseño', 'Previsualización Enviada',
-            'En Preparación', 'Listo para Entrega'
-        ]])
+        por_estado = {fila['nombre']: fila['cantidad'] for fila in obtener_pedidos_por_estado()}
+
+        total_pedidos = sum(por_estado.values())
+        pedidos_completados = por_estado.get('Entregado', 0)
+        pedidos_pendientes = sum(por_estado.get(nombre, 0) for nombre in ESTADOS_EN_COLA)
 
         # Calcular tasa de completitud
         if total_pedidos > 0:
@@ -293,18 +279,25 @@ def obtener_estadisticas_produccion():
         }
 
 
-def priorizar_pedido(id_pedido):
+def priorizar_pedido(id_pedido, urgente=True):
     """
-    Marca un pedido como prioritario en la cola
+    Marca un pedido como prioritario (o normal) en la cola
+
+    Guarda la prioridad y reprograma solo las máquinas del pedido.
 
     Args:
         id_pedido (int): ID del pedido a priorizar
+        urgente (bool): False devuelve el pedido a prioridad normal
 
     Returns:
         bool: True si se priorizó correctamente
     """
-    # Esta función se puede implementar más adelante con una columna de prioridad
-    # Por ahora es un placeholder
+    from app.logic import planificador
+
+    prioridad = planificador.PRIORIDAD_URGENTE if urgente else planificador.PRIORIDAD_NORMAL
+    if not actualizar_prioridad_pedido(id_pedido, prioridad):
+        return False
+    planificador.replanificar_pedidos([id_pedido])
     return True
 
 
@@ -312,6 +305,9 @@ def estimar_capacidad_disponible(dias=7):
     """
     Estima la capacidad de producción disponible en los próximos días
     
+    La capacidad es la de todas las máquinas en el calendario laboral y lo
+    ocupado sale del plan de cada una (obtener_info_cola_produccion).
+
     USA CONFIGURACIÓN DINÁMICA DE BD
 
     Args:
@@ -324,8 +320,13 @@ def estimar_capacidad_disponible(dias=7):
     info_cola = obtener_info_cola_produccion()
 
     HORAS_LABORALES_POR_DIA = config['horas_laborales_dia']
-    capacidad_total = dias * HORAS_LABORALES_POR_DIA
-    horas_ocupadas = min(info_cola['horas_pendientes'], capacidad_total)
+    # Horas hábiles reales del período (descuenta no laborables y feriados)
+    # por cada máquina del taller
+    ahora = datetime.now()
+    horas_periodo = obtener_calendario().horas_entre(ahora, ahora + timedelta(days=dias))
+    cantidad_maquinas = max(len(obtener_maquinas_para_planificar()['nombres']), 1)
+    capacidad_total = horas_periodo * cantidad_maquinas
+    horas_ocupadas = sum(min(m['pendientes'], horas_periodo) for m in info_cola['maquinas'])
     horas_disponibles = capacidad_total - horas_ocupadas
 
     porcentaje_disponible = (horas_disponibles / capacidad_total) * 100 if capacidad_total > 0 else 0
@@ -338,4 +339,3 @@ def estimar_capacidad_disponible(dias=7):
         'porcentaje_disponible': porcentaje_disponible,
         'horas_por_dia': HORAS_LABORALES_POR_DIA
     }
-
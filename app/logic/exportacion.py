@@ -47,6 +47,137 @@ def exportar_a_csv(datos, columnas, nombre_archivo):
         return False
 
 
+def exportar_lotes_a_csv(lotes, columnas, nombre_archivo):
+    """
+    Exporta a CSV datos que llegan por lotes (ej: un cursor de la BD)
+
+    Cada lote se escribe y se vuelca al disco apenas llega, así que un
+    historial completo empieza a escribirse enseguida y la memoria no
+    depende de la cantidad de filas.
+
+    Args:
+        lotes (iterable): Lotes (listas) de tuplas o diccionarios, como los de
+                          consultas.iterar_pedidos_exportacion()
+        columnas (list): Lista de nombres de columnas
+        nombre_archivo (str): Ruta del archivo a crear
+
+    Returns:
+        int or None: Filas escritas, o None si hubo un error
+    """
+    filas = 0
+    try:
+        with open(nombre_archivo, 'w', newline='', encoding='utf-8-sig') as archivo:
+            writer = csv.writer(archivo)
+            writer.writerow(columnas)
+
+            for lote in lotes:
+                writer.writerows(
+                    [fila.get(col, '') for col in columnas] if isinstance(fila, dict) else fila
+                    for fila in lote
+                )
+                archivo.flush()
+                filas += len(lote)
+
+        return filas
+    except Exception as e:
+        print(f"Error al exportar CSV: {e}")
+        return None
+    finally:
+        # Libera el cursor si se cortó antes de agotar los lotes
+        cerrar = getattr(lotes, 'close', None)
+        if cerrar:
+            cerrar()
+
+
+def _escribir_hoja(ws, datos, columnas, titulo):
+    """
+    Escribe título, fecha, encabezados y datos con el formato de los reportes
+
+    Args:
+        ws: Hoja de openpyxl
+        datos (list): Lista de tuplas o diccionarios con los datos
+        columnas (list): Lista de nombres de columnas
+        titulo (str): Título de la hoja
+    """
+    # Estilos
+    titulo_font = Font(name='Calibri', size=16, bold=True, color='FFFFFF')
+    titulo_fill = PatternFill(start_color='1F538D', end_color='1F538D', fill_type='solid')
+
+    header_font = Font(name='Calibri', size=12, bold=True, color='FFFFFF')
+    header_fill = PatternFill(start_color='3A7EBF', end_color='3A7EBF', fill_type='solid')
+    header_alignment = Alignment(horizontal='center', vertical='center')
+
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+
+    # Título principal
+    ws.merge_cells('A1:' + chr(64 + len(columnas)) + '1')
+    celda_titulo = ws['A1']
+    celda_titulo.value = titulo
+    celda_titulo.font = titulo_font
+    celda_titulo.fill = titulo_fill
+    celda_titulo.alignment = Alignment(horizontal='center', vertical='center')
+    ws.row_dimensions[1].height = 30
+
+    # Fecha y hora
+    ws.merge_cells('A2:' + chr(64 + len(columnas)) + '2')
+    celda_fecha = ws['A2']
+    celda_fecha.value = f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"
+    celda_fecha.alignment = Alignment(horizontal='center')
+    celda_fecha.font = Font(size=10, italic=True)
+    ws.row_dimensions[2].height = 20
+
+    # Espacio
+    ws.row_dimensions[3].height = 10
+
+    # Encabezados
+    fila_header = 4
+    for col_num, columna in enumerate(columnas, 1):
+        celda = ws.cell(row=fila_header, column=col_num)
+        celda.value = columna
+        celda.font = header_font
+        celda.fill = header_fill
+        celda.alignment = header_alignment
+        celda.border = border
+        ws.column_dimensions[chr(64 + col_num)].width = max(len(str(columna)) + 5, 15)
+
+    ws.row_dimensions[fila_header].height = 25
+
+    # Datos
+    for fila_num, fila_datos in enumerate(datos, fila_header + 1):
+        if isinstance(fila_datos, dict):
+            valores = [fila_datos.get(col, '') for col in columnas]
+        else:
+            valores = fila_datos
+
+        for col_num, valor in enumerate(valores, 1):
+            celda = ws.cell(row=fila_num, column=col_num)
+            celda.value = valor
+            celda.border = border
+            celda.alignment = Alignment(horizontal='left', vertical='center')
+
+            # Alternar colores de filas
+            if fila_num % 2 == 0:
+                celda.fill = PatternFill(start_color='F0F0F0', end_color='F0F0F0', fill_type='solid')
+
+    # Ajustar anchos de columna basados en contenido
+    for col_num in range(1, len(columnas) + 1):
+        col_letter = chr(64 + col_num)
+        max_length = 0
+        for row in ws[col_letter]:
+            try:
+                if len(str(row.value)) > max_length:
+                    max_length = len(str(row.value))
+            except:
+                pass
+        adjusted_width = min(max_length + 5, 50)
+        ws.column_dimensions[col_letter].width = adjusted_width
+
+
 def exportar_a_excel(datos, columnas, nombre_archivo, titulo="Reporte"):
     """
     Exporta datos a formato Excel con formato profesional
@@ -64,86 +195,51 @@ def exportar_a_excel(datos, columnas, nombre_archivo, titulo="Reporte"):
         wb = Workbook()
         ws = wb.active
         ws.title = "Reporte"
+        _escribir_hoja(ws, datos, columnas, titulo)
 
-        # Estilos
-        titulo_font = Font(name='Calibri', size=16, bold=True, color='FFFFFF')
-        titulo_fill = PatternFill(start_color='1F538D', end_color='1F538D', fill_type='solid')
-
-        header_font = Font(name='Calibri', size=12, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='3A7EBF', end_color='3A7EBF', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center')
-
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        # Guardar
+        wb.save(nombre_archivo)
+        return True
 
-        # Título principal
-        ws.merge_cells('A1:' + chr(64 + len(columnas)) + '1')
-        celda_titulo = ws['A1']
-        celda_titulo.value = titulo
-        celda_titulo.font = titulo_font
-        celda_titulo.fill = titulo_fill
-        celda_titulo.alignment = Alignment(horizontal='center', vertical='center')
-        ws.row_dimensions[1].height = 30
-
-        # Fecha y hora
-        ws.merge_cells('A2:' + chr(64 + len(columnas)) + '2')
-        celda_fecha = ws['A2']
-        celda_fecha.value = f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"
-        celda_fecha.alignment = Alignment(horizontal='center')
-        celda_fecha.font = Font(size=10, italic=True)
-        ws.row_dimensions[2].height = 20
-
-        # Espacio
-        ws.row_dimensions[3].height = 10
-
-        # Encabezados
-        fila_header = 4
-        for col_num, columna in enumerate(columnas, 1):
-            celda = ws.cell(row=fila_header, column=col_num)
-            celda.value = columna
-            celda.font = header_font
-            celda.fill = header_fill
-            celda.alignment = header_alignment
-            celda.border = border
-            ws.column_dimensions[chr(64 + col_num)].width = max(len(str(columna)) + 5, 15)
+    except Exception as e:
+        print(f"Error al exportar Excel: {e}")
+        return False
 
-        ws.row_dimensions[fila_header].height = 25
 
-        # Datos
-        for fila_num, fila_datos in enumerate(datos, fila_header + 1):
-            if isinstance(fila_datos, dict):
-                valores = [fila_datos.get(col, '') for col in columnas]
-            else:
-                valores = fila_datos
-
-            for col_num, valor in enumerate(valores, 1):
-                celda = ws.cell(row=fila_num, column=col_num)
-                celda.value = valor
-                celda.border = border
-                celda.alignment = Alignment(horizontal='left', vertical='center')
-
-                # Alternar colores de filas
-                if fila_num % 2 == 0:
-                    celda.fill = PatternFill(start_color='F0F0F0', end_color='F0F0F0', fill_type='solid')
-
-        # Ajustar anchos de columna basados en contenido
-        for col_num in range(1, len(columnas) + 1):
-            col_letter = chr(64 + col_num)
-            max_length = 0
-            for row in ws[col_letter]:
-                try:
-                    if len(str(row.value)) > max_length:
-                        max_length = len(str(row.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 5, 50)
-            ws.column_dimensions[col_letter].width = adjusted_width
+def _nombre_hoja(nombre, usados):
+    """Nombre de hoja válido para Excel (31 caracteres, sin []:*?/\\) y único"""
+    limpio = ''.join('-' if c in '[]:*?/\\' else c for c in str(nombre)).strip() or "Hoja"
+    candidato, n = limpio[:31], 2
+    while candidato.lower() in usados:
+        sufijo = f" ({n})"
+        candidato, n = limpio[:31 - len(sufijo)] + sufijo, n + 1
+    usados.add(candidato.lower())
+    return candidato
+
+
+def exportar_libro_excel(hojas, nombre_archivo, titulo="Reporte"):
+    """
+    Exporta varias tablas a un libro de Excel, una por hoja
+
+    Args:
+        hojas (list): Tuplas (nombre_hoja, columnas, datos); datos como en exportar_a_excel
+        nombre_archivo (str): Ruta del archivo a crear
+        titulo (str): Título general (cada hoja muestra "titulo - nombre_hoja")
+
+    Returns:
+        bool: True si fue exitoso
+    """
+    try:
+        wb = Workbook()
+        wb.remove(wb.active)
+        usados = set()
+        for nombre_hoja, columnas, datos in hojas:
+            ws = wb.create_sheet(_nombre_hoja(nombre_hoja, usados))
+            _escribir_hoja(ws, datos, columnas, f"{titulo} - {nombre_hoja}")
+
+        if not wb.worksheets:
+            wb.create_sheet("Reporte")
 
-        # Guardar
         wb.save(nombre_archivo)
         return True
 
@@ -0,0 +1,225 @@
+"""
+Matriz de Precios (Lista de Precios Impresa)
+Calcula precio unitario y total de cada servicio para sus cantidades de
+corte y medidas habituales, en los tres niveles de margen de negocio
+
+SISTEMA EXPERTO - Componente de Reglas de Precio
+Misma regla que calcular_precio_sugerido y calcular_precio_unitario, pero
+para toda la lista de una vez:
+- Si un tramo de precios_escalonados cubre la cantidad, manda su precio
+  (es un precio de venta pactado, no lleva margen)
+- Si no, precio_base × (1 + margen / 100)
+En los servicios dimensionales el precio es por unidad de cobro (m²) y se
+multiplica por el área de la medida.
+
+Todo se calcula en una pasada con NumPy: la búsqueda de tramo es un
+searchsorted sobre (servicio, cantidad) y el resto es broadcasting sobre
+servicios × cantidades × medidas × niveles.
+"""
+import numpy as np
+from app.database.consultas import (
+    obtener_servicios, obtener_tramos_precios, obtener_configuracion_negocio
+)
+
+
+# Cantidades que se listan para todo servicio, además de sus cortes de tramo
+CANTIDADES_COMUNES = (1, 10, 50, 100, 500, 1000)
+
+# Medidas habituales (ancho, alto) en metros para servicios dimensionales
+MEDIDAS_COMUNES = ((0.6, 1.6), (1.0, 1.0), (1.0, 2.0), (1.5, 1.0), (2.0, 1.0), (3.0, 2.0))
+
+# Niveles de margen: (nivel, clave en obtener_configuracion_negocio(), etiqueta)
+NIVELES_MARGEN = (
+    ('minimo', 'margen_ganancia_minimo', 'Mínimo'),
+    ('normal', 'margen_ganancia_normal', 'Normal'),
+    ('premium', 'margen_ganancia_premium', 'Premium'),
+)
+
+ORIGEN_ESCALONADO = 'escalonado'
+ORIGEN_BASE = 'precio_base'
+
+
+def _precios_por_tramo(indices_servicio, tramos, cantidades):
+    """
+    Precio de tramo de cada (servicio, cantidad) en una sola búsqueda
+
+    Args:
+        indices_servicio: {id_servicio: fila de la matriz}
+        tramos: Resultado de obtener_tramos_precios()
+        cantidades: Array de cantidades (columnas)
+
+    Returns:
+        ndarray: Matriz servicios × cantidades con el precio o NaN si ningún
+                 tramo cubre la cantidad
+    """
+    filas, inicios, fines, precios = [], [], [], []
+    for id_servicio, (t_inicios, t_fines, t_precios) in tramos.items():
+        if id_servicio not in indices_servicio:
+            continue
+        filas.extend([indices_servicio[id_servicio]] * len(t_inicios))
+        inicios.extend(t_inicios)
+        fines.extend(np.inf if fin is None else fin for fin in t_fines)
+        precios.extend(t_precios)
+
+    resultado = np.full((len(indices_servicio), len(cantidades)), np.nan)
+    if not precios:
+        return resultado
+
+    filas = np.asarray(filas, dtype=np.int64)
+    inicios = np.asarray(inicios, dtype=np.int64)
+    fines = np.asarray(fines, dtype=float)
+    precios = np.asarray(precios, dtype=float)
+
+    # Clave compuesta servicio/cantidad: los tramos de cada servicio quedan
+    # contiguos y ordenados, así un searchsorted resuelve toda la matriz
+    escala = int(max(inicios.max(), cantidades.max())) + 1
+    claves = filas * escala + inicios
+    orden = np.argsort(claves, kind='stable')
+    claves, filas, fines, precios = claves[orden], filas[orden], fines[orden], precios[orden]
+
+    consulta = np.arange(len(indices_servicio))[:, None] * escala + cantidades[None, :]
+    posicion = np.searchsorted(claves, consulta, side='right') - 1
+    valida = posicion >= 0
+    posicion = np.where(valida, posicion, 0)
+    valida &= (filas[posicion] == np.arange(len(indices_servicio))[:, None]) \
+        & (cantidades[None, :] <= fines[posicion])
+    return np.where(valida, precios[posicion], np.nan)
+
+
+def calcular_matriz_precios(cantidades=None, medidas=None, ids_servicios=None):
+    """
+    Lista de precios de todos los servicios
+
+    Args:
+        cantidades: Cantidades a listar además de los cortes de tramo de
+                    cada servicio (por defecto CANTIDADES_COMUNES)
+        medidas: Lista de (ancho, alto) en metros para servicios dimensionales
+                 (por defecto MEDIDAS_COMUNES)
+        ids_servicios: Limitar a estos servicios (opcional)
+
+    Returns:
+        dict: {
+            'niveles': [{'nivel', 'etiqueta', 'margen'}],
+            'servicios': [{
+                'id_servicio', 'nombre_servicio', 'unidad_cobro', 'tipo_material',
+                'precio_base',
+                'filas': [{cantidad, ancho, alto, origen,
+                           unitario_<nivel>, total_<nivel> ...}]
+            }]
+        }
+        Los servicios por unidad tienen una sola medida (ancho/alto None).
+    """
+    config = obtener_configuracion_negocio()
+    niveles = [
+        {'nivel': nivel, 'etiqueta': etiqueta, 'margen': float(config[clave])}
+        for nivel, clave, etiqueta in NIVELES_MARGEN
+    ]
+    cantidades_comunes = sorted({int(c) for c in (cantidades or CANTIDADES_COMUNES) if int(c) > 0})
+    medidas = list(medidas or MEDIDAS_COMUNES)
+
+    servicios = [
+        s for s in obtener_servicios()
+        if ids_servicios is None or s['id_servicio'] in ids_servicios
+    ]
+    if not servicios:
+        return {'niveles': niveles, 'servicios': []}
+
+    tramos = obtener_tramos_precios()
+    indices_servicio = {s['id_servicio']: i for i, s in enumerate(servicios)}
+
+    # Eje de cantidades común: cortes de todos los servicios + comunes
+    cortes = {
+        id_servicio: sorted(set(cantidades_comunes) | {int(c) for c in t[0] if c and c > 0})
+        for id_servicio, t in tramos.items() if id_servicio in indices_servicio
+    }
+    eje = sorted(set(cantidades_comunes).union(*cortes.values()))
+    eje_cantidades = np.asarray(eje, dtype=np.int64)
+    columna_cantidad = {c: j for j, c in enumerate(eje)}
+
+    # servicios × cantidades
+    tramo = _precios_por_tramo(indices_servicio, tramos, eje_cantidades)
+    # servicios × medidas (1 para servicios por unidad)
+    areas = np.asarray([ancho * alto for ancho, alto in medidas] or [1.0], dtype=float)
+    dimensional = np.asarray([s['tipo_material'] == 'dimension' for s in servicios])
+    medida = np.where(dimensional[:, None], areas[None, :], 1.0)
+    base = np.asarray([s['precio_base'] or 0.0 for s in servicios], dtype=float)
+    factores = 1 + np.asarray([n['margen'] for n in niveles]) / 100
+
+    # servicios × cantidades × medidas × niveles
+    con_tramo = ~np.isnan(tramo)
+    unitario = np.where(
+        con_tramo[:, :, None, None],
+        np.nan_to_num(tramo)[:, :, None, None] * medida[:, None, :, None],
+        (base[:, None] * medida)[:, None, :, None] * factores[None, None, None, :]
+    )
+    unitario = np.round(unitario, 2)
+    total = np.round(unitario * eje_cantidades[None, :, None, None], 2)
+
+    resultado = []
+    for i, servicio in enumerate(servicios):
+        medidas_servicio = list(enumerate(medidas)) if dimensional[i] and medidas else [(0, (None, None))]
+        filas = []
+        for cantidad in cortes.get(servicio['id_servicio'], cantidades_comunes):
+            j = columna_cantidad[cantidad]
+            for k, (ancho, alto) in medidas_servicio:
+                fila = {
+                    'cantidad': cantidad,
+                    'ancho': ancho,
+                    'alto': alto,
+                    'origen': ORIGEN_ESCALONADO if con_tramo[i, j] else ORIGEN_BASE,
+                }
+                for n, nivel in enumerate(niveles):
+                    fila[f"unitario_{nivel['nivel']}"] = float(unitario[i, j, k, n])
+                    fila[f"total_{nivel['nivel']}"] = float(total[i, j, k, n])
+                filas.append(fila)
+
+        resultado.append({
+            'id_servicio': servicio['id_servicio'],
+            'nombre_servicio': servicio['nombre_servicio'],
+            'unidad_cobro': servicio['unidad_cobro'],
+            'tipo_material': servicio['tipo_material'],
+            'precio_base': servicio['precio_base'] or 0.0,
+            'filas': filas
+        })
+
+    return {'niveles': niveles, 'servicios': resultado}
+
+
+def exportar_matriz_precios(nombre_archivo, matriz=None):
+    """
+    Exporta la lista de precios a Excel: una hoja por servicio
+
+    Args:
+        nombre_archivo: Ruta del .xlsx a crear
+        matriz: Resultado de calcular_matriz_precios() (por defecto la completa)
+
+    Returns:
+        bool: True si fue exitoso
+    """
+    from app.logic.exportacion import exportar_libro_excel
+
+    if matriz is None:
+        matriz = calcular_matriz_precios()
+
+    niveles = matriz['niveles']
+    columnas_niveles = []
+    for nivel in niveles:
+        etiqueta = f"{nivel['etiqueta']} ({nivel['margen']:.0f}%)"
+        columnas_niveles += [f"P. Unit. {etiqueta}", f"Total {etiqueta}"]
+
+    hojas = []
+    for servicio in matriz['servicios']:
+        dimensional = servicio['tipo_material'] == 'dimension'
+        columnas = ["Cantidad"] + (["Ancho (m)", "Alto (m)"] if dimensional else []) + ["Origen"]
+        datos = []
+        for fila in servicio['filas']:
+            valores = [fila['cantidad']]
+            if dimensional:
+                valores += [fila['ancho'], fila['alto']]
+            valores.append("Escalonado" if fila['origen'] == ORIGEN_ESCALONADO else "Precio base")
+            for nivel in niveles:
+                valores += [fila[f"unitario_{nivel['nivel']}"], fila[f"total_{nivel['nivel']}"]]
+            datos.append(valores)
+        hojas.append((servicio['nombre_servicio'], columnas + columnas_niveles, datos))
+
+    return exportar_libro_excel(hojas, nombre_archivo, titulo="Lista de Precios")
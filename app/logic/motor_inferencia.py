@@ -13,76 +13,685 @@ REGLAS IMPLEMENTADAS (Dinámicas):
 2. REGLA-MAT: Recomendar materiales según servicio y stock
 3. REGLA-VAL: Validar si el trabajo cabe en las máquinas disponibles
 4. REGLA-TMP: Estimar tiempo según capacidades de máquina
+
+Las reglas se pueden trazar (opcional, ver activar_trazas): tiempo,
+consultas SQL, entradas y rama de inferencia de cada ejecución.
 """
-from datetime import datetime, timedelta
-from sqlalchemy import and_, or_
-from app.database.conexion import get_session
+import copy
+import functools
+import inspect
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from datetime import datetime
+from app.database import cache_catalogos
+from app.database.conexion import get_read_session, contar_consultas
+from app.database.models import (
+    Maquina, TipoMaquina, CapacidadMaquina, MaquinaServicio,
+    Material, TipoMaterial, InventarioMaterial, UnidadMedida,
+    ServicioMaterial, InventarioDimensionalMaterial
+)
+
+
+# Grupos de version_datos de los que dependen las reglas
+GRUPOS_CONOCIMIENTO = (cache_catalogos.GRUPO_CATALOGOS, cache_catalogos.GRUPO_CONOCIMIENTO)
+
+# Resultados de análisis recordados (ver MemoriaResultados)
+TAMANO_MEMORIA_RESULTADOS = 256
+
+# Trazas de reglas que se conservan (ver RegistroTrazas)
+TAMANO_TRAZAS = 1000
+
+# Ramas de la cadena de inferencia
+ORIGEN_SERVICIO = 'bd_servicio'
+ORIGEN_CAPACIDAD = 'bd_capacidad'
+ORIGEN_SIN_DATOS = 'sin_datos'
 
 
 # =========================================================
-# FUNCIONES DE CONSULTA A LA BASE DE CONOCIMIENTOS
+# BASE DE CONOCIMIENTOS (SNAPSHOT EN MEMORIA)
 # =========================================================
 
-def obtener_maquinas_capaces(ancho_requerido, largo_requerido=0):
+class BaseConocimiento:
     """
-    Consulta la BD para obtener máquinas que pueden manejar las dimensiones.
+    Copia en memoria de las tablas que consultan las reglas
     
-    INFERENCIA: Si ancho_requerido > ancho_util_max → Máquina NO puede
+    Se carga en una sola pasada (máquinas con su capacidad, relaciones
+    servicio↔máquina y servicio↔material, materiales con stock e inventario
+    dimensional) y se comparte entre todas las reglas de un análisis. Se
+    recarga solo cuando cambian los catálogos o la base de conocimiento
+    (ver obtener_base_conocimiento).
     
-    Args:
-        ancho_requerido (float): Ancho del trabajo en metros
-        largo_requerido (float): Largo del trabajo (0 si no importa)
+    Las consultas devuelven diccionarios nuevos con el mismo formato que
+    las antiguas consultas SQL, así que el llamador puede modificarlos.
+    """
+    
+    def __init__(self, maquinas, maquinas_servicio, materiales, materiales_servicio, rollos):
+        """
+        Args:
+            maquinas: {id_maquina: datos} (tipo None si no tiene tipo válido)
+            maquinas_servicio: {id_servicio: [(id_maquina, es_recomendada)]}
+            materiales: {id_material: datos} (tipo None si no tiene tipo válido)
+            materiales_servicio: {id_servicio: [(id_material, es_preferido)]}
+            rollos: Inventario dimensional [{id_material, nombre, ancho, largo, es_continuo}]
+        """
+        self.maquinas = maquinas
+        self.maquinas_servicio = maquinas_servicio
+        self.materiales = materiales
+        self.materiales_servicio = materiales_servicio
+        self.rollos = rollos
+        
+        # Índices ordenados por ancho: "todo lo que admite un ancho W, el más
+        # ajustado primero" es un bisect y un recorrido desde esa posición
+        por_ancho = sorted(
+            (m for m in maquinas.values() if m['tipo'] is not None and m['ancho_max'] is not None),
+            key=lambda m: (m['ancho_max'], m['id_maquina'])
+        )
+        self._anchos_maquinas = [m['ancho_max'] for m in por_ancho]
+        self._maquinas_por_ancho = [
+            {
+                'id_maquina': m['id_maquina'],
+                'nombre': m['nombre'],
+                'tipo': m['tipo'],
+                'ancho_max': m['ancho_max'],
+                'largo_max': m['largo_max'],
+                'velocidad': m['velocidad'],
+                'sugerencia': m['sugerencia']
+            }
+            for m in por_ancho
+        ]
+        
+        por_ancho = sorted(
+            (r for r in rollos if r['ancho'] is not None and r['largo'] is not None and r['largo'] > 0),
+            key=lambda r: (r['ancho'], r['id_material'])
+        )
+        self._anchos_rollos = [r['ancho'] for r in por_ancho]
+        self._rollos_por_ancho = [
+            {
+                'id_material': r['id_material'],
+                'nombre': r['nombre'],
+                'ancho_rollo': r['ancho'],
+                'largo_disponible': r['largo'],
+                'es_continuo': r['es_continuo']
+            }
+            for r in por_ancho
+        ]
+    
+    @classmethod
+    def cargar(cls):
+        """
+        Lee la base de conocimientos completa desde la BD
+        
+        Returns:
+            BaseConocimiento
+        """
+        session = get_read_session()
+        try:
+            maquinas = {
+                id_maquina: {
+                    'id_maquina': id_maquina,
+                    'nombre': nombre,
+                    'tipo': tipo,
+                    'ancho_max': ancho,
+                    'largo_max': largo,
+                    'velocidad': velocidad,
+                    'sugerencia': sugerencia or '',
+                    'tiene_capacidad': id_capacidad is not None
+                }
+                for id_maquina, nombre, tipo, sugerencia, id_capacidad, ancho, largo, velocidad in session.query(
+                    Maquina.id_maquina, Maquina.nombre, TipoMaquina.nombre_tipo, Maquina.sugerencia,
+                    CapacidadMaquina.id_capacidad, CapacidadMaquina.ancho_util_max,
+                    CapacidadMaquina.largo_util_max, CapacidadMaquina.velocidad_promedio
+                ).outerjoin(
+                    TipoMaquina, TipoMaquina.id_tipo_maquina == Maquina.id_tipo_maquina
+                ).outerjoin(
+                    CapacidadMaquina, CapacidadMaquina.id_maquina == Maquina.id_maquina
+                ).order_by(Maquina.id_maquina).all()
+            }
+            
+            maquinas_servicio = {}
+            for id_servicio, id_maquina, recomendada in session.query(
+                    MaquinaServicio.id_servicio, MaquinaServicio.id_maquina, MaquinaServicio.es_recomendada
+            ).order_by(MaquinaServicio.id).all():
+                maquinas_servicio.setdefault(id_servicio, []).append((id_maquina, bool(recomendada)))
+            
+            materiales = {
+                id_material: {
+                    'id_material': id_material,
+                    'nombre': nombre,
+                    'tipo': tipo,
+                    'stock': stock or 0,
+                    'stock_minimo': minimo or 5,
+                    'sugerencia': sugerencia or '',
+                    'unidad': unidad or '',
+                    'tiene_inventario': stock is not None
+                }
+                for id_material, nombre, tipo, stock, minimo, sugerencia, unidad in session.query(
+                    Material.id_material, Material.nombre_material, TipoMaterial.nombre_tipo,
+                    InventarioMaterial.cantidad_stock, InventarioMaterial.stock_minimo,
+                    Material.sugerencia, UnidadMedida.abreviacion
+                ).outerjoin(
+                    TipoMaterial, TipoMaterial.id_tipo_material == Material.id_tipo_material
+                ).outerjoin(
+                    InventarioMaterial, InventarioMaterial.id_material == Material.id_material
+                ).outerjoin(
+                    UnidadMedida, UnidadMedida.id_unidad == Material.id_unidad_inventario
+                ).all()
+            }
+            
+            materiales_servicio = {}
+            for id_servicio, id_material, preferido in session.query(
+                    ServicioMaterial.id_servicio, ServicioMaterial.id_material, ServicioMaterial.es_preferido
+            ).order_by(ServicioMaterial.id).all():
+                materiales_servicio.setdefault(id_servicio, []).append((id_material, bool(preferido)))
+            
+            rollos = [
+                {
+                    'id_material': id_material,
+                    'nombre': nombre,
+                    'ancho': ancho,
+                    'largo': largo,
+                    'es_continuo': bool(continuo)
+                }
+                for id_material, nombre, ancho, largo, continuo in session.query(
+                    Material.id_material, Material.nombre_material,
+                    InventarioDimensionalMaterial.ancho_disponible,
+                    InventarioDimensionalMaterial.largo_disponible,
+                    InventarioDimensionalMaterial.es_continuo
+                ).join(
+                    InventarioDimensionalMaterial,
+                    InventarioDimensionalMaterial.id_material == Material.id_material
+                ).order_by(Material.id_material).all()
+            ]
+        finally:
+            session.close()
+        
+        return cls(maquinas, maquinas_servicio, materiales, materiales_servicio, rollos)
+    
+    def maquina(self, id_maquina):
+        """Datos de una máquina (o None si no existe)"""
+        return self.maquinas.get(id_maquina)
+    
+    def capacidad_maquina(self, id_maquina):
+        """
+        Capacidad física de una máquina (None si no tiene capacidad cargada)
+        
+        Returns:
+            dict: {id_maquina, nombre, ancho_util_max, largo_util_max, velocidad_promedio}
+        """
+        m = self.maquinas.get(id_maquina)
+        if m is None or not m['tiene_capacidad']:
+            return None
+        return self._registro_capacidad(m)
+    
+    def mejor_capacidad_servicio(self, id_servicio):
+        """
+        Capacidad de la mejor máquina del servicio: la recomendada o, si no,
+        la de mayor ancho útil
+        
+        Returns:
+            dict or None: Mismo formato que capacidad_maquina
+        """
+        asociadas = [
+            (self.maquinas[id_maquina], recomendada)
+            for id_maquina, recomendada in self.maquinas_servicio.get(id_servicio, ())
+            if id_maquina in self.maquinas
+        ]
+        if not asociadas:
+            return None
+        # Igual que ORDER BY es_recomendada DESC, ancho_util_max DESC (NULL al final)
+        mejor, _ = min(asociadas, key=lambda par: (
+            not par[1], par[0]['ancho_max'] is None, -(par[0]['ancho_max'] or 0)))
+        return self._registro_capacidad(mejor)
+    
+    @staticmethod
+    def _registro_capacidad(m):
+        return {
+            'id_maquina': m['id_maquina'],
+            'nombre': m['nombre'],
+            'ancho_util_max': m['ancho_max'] or 0,
+            'largo_util_max': m['largo_max'] or 0,
+            'velocidad_promedio': m['velocidad'] or 0
+        }
+    
+    def maquinas_capaces(self, ancho_requerido, largo_requerido=0):
+        """Máquinas cuya capacidad cubre las dimensiones, de menor a mayor ancho"""
+        capaces = []
+        for m in self._maquinas_por_ancho[bisect_left(self._anchos_maquinas, ancho_requerido):]:
+            largo_max = m['largo_max']
+            if largo_requerido > 0 and (largo_max is None or (largo_max != 0 and largo_max < largo_requerido)):
+                continue
+            capaces.append(dict(m))
+        return capaces
+    
+    def maquinas_por_servicio(self, id_servicio, ancho_requerido=0):
+        """Máquinas asociadas al servicio: recomendadas primero, luego menor ancho"""
+        asociadas = []
+        for id_maquina, recomendada in self.maquinas_servicio.get(id_servicio, ()):
+            m = self.maquinas.get(id_maquina)
+            if m is None or m['tipo'] is None:
+                continue
+            if ancho_requerido > 0 and m['ancho_max'] is not None and m['ancho_max'] < ancho_requerido:
+                continue
+            asociadas.append((m, recomendada))
+        # Igual que ORDER BY es_recomendada DESC, ancho_util_max ASC (NULL primero)
+        asociadas.sort(key=lambda par: (not par[1], par[0]['ancho_max'] is not None, par[0]['ancho_max'] or 0))
+        return [
+            {
+                'id_maquina': m['id_maquina'],
+                'nombre': m['nombre'],
+                'tipo': m['tipo'],
+                'es_recomendada': recomendada,
+                'ancho_max': m['ancho_max'],
+                'velocidad': m['velocidad'],
+                'sugerencia': m['sugerencia']
+            }
+            for m, recomendada in asociadas
+        ]
+    
+    def materiales_por_servicio(self, id_servicio, solo_con_stock=False):
+        """Materiales asociados al servicio: preferidos primero, luego por nombre"""
+        asociados = []
+        for id_material, preferido in self.materiales_servicio.get(id_servicio, ()):
+            mat = self.materiales.get(id_material)
+            if mat is None or mat['tipo'] is None:
+                continue
+            if solo_con_stock and mat['tiene_inventario'] and mat['stock'] <= 0:
+                continue
+            asociados.append((mat, preferido))
+        asociados.sort(key=lambda par: (not par[1], par[0]['nombre']))
+        
+        materiales = []
+        for mat, preferido in asociados:
+            # Generar alertas de stock
+            alerta = None
+            if mat['stock'] <= 0:
+                alerta = "🔴 SIN STOCK"
+            elif mat['stock'] <= mat['stock_minimo']:
+                alerta = "⚠️ Stock bajo"
+            
+            materiales.append({
+                'id_material': mat['id_material'],
+                'nombre': mat['nombre'],
+                'tipo': mat['tipo'],
+                'es_preferido': preferido,
+                'stock': mat['stock'],
+                'stock_minimo': mat['stock_minimo'],
+                'sugerencia': mat['sugerencia'],
+                'unidad': mat['unidad'],
+                'alerta_stock': alerta
+            })
+        return materiales
+    
+    def rollos_compatibles(self, ancho_trabajo):
+        """Rollos con ancho suficiente y largo disponible, de menor a mayor desperdicio"""
+        rollos = []
+        for registro in self._rollos_por_ancho[bisect_left(self._anchos_rollos, ancho_trabajo):]:
+            ancho_rollo = registro['ancho_rollo']
+            rollo = dict(registro)
+            rollo['desperdicio_metros'] = ancho_rollo - ancho_trabajo
+            rollo['eficiencia'] = round((ancho_trabajo / ancho_rollo) * 100, 1) if ancho_rollo > 0 else 0
+            rollos.append(rollo)
+        return rollos
+
+
+def obtener_base_conocimiento():
+    """
+    Devuelve el snapshot vigente de la base de conocimientos
+    
+    Se recarga cuando cambia la versión de catálogos (máquinas, tipos) o la
+    de la base de conocimiento (capacidades, relaciones, materiales, stock).
     
     Returns:
-        list: Máquinas capaces ordenadas por capacidad
+        BaseConocimiento: Compartido, no se debe modificar
     """
-    session = get_session()
-    try:
-        query = """
-            SELECT 
-                m.id_maquina,
-                m.nombre,
-                tm.nombre_tipo as tipo,
-                cm.ancho_util_max,
-                cm.largo_util_max,
-                cm.velocidad_promedio,
-                m.sugerencia
-            FROM maquinas m
-            JOIN tipos_maquinas tm ON m.id_tipo_maquina = tm.id_tipo_maquina
-            LEFT JOIN capacidad_maquinas cm ON m.id_maquina = cm.id_maquina
-            WHERE cm.ancho_util_max >= :ancho
+    return cache_catalogos.obtener_compilado(
+        'base_conocimiento', BaseConocimiento.cargar,
+        grupos=GRUPOS_CONOCIMIENTO
+    )
+
+
+def version_conocimiento():
+    """
+    Versión vigente de los datos que usan las reglas
+    
+    Returns:
+        tuple: Versiones de catálogos y de la base de conocimiento
+    """
+    return tuple(cache_catalogos.version_grupo(grupo) for grupo in GRUPOS_CONOCIMIENTO)
+
+
+# =========================================================
+# MEMORIA DE RESULTADOS (LRU)
+# =========================================================
+
+class MemoriaResultados:
+    """
+    Caché LRU de resultados de reglas, invalidada por versión
+    
+    La clave incluye version_conocimiento(): cualquier cambio en máquinas,
+    capacidades, relaciones o stock hace que las entradas viejas dejen de
+    coincidir (y salen solas por LRU). Cada acierto devuelve una copia,
+    así el llamador puede modificar el resultado sin afectar la caché.
+    """
+    
+    def __init__(self, tamano=256):
+        self.tamano = tamano
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+    
+    def obtener(self, clave, calcular):
         """
+        Devuelve el resultado memorizado para la clave o lo calcula
         
-        params = {'ancho': ancho_requerido}
+        Args:
+            clave: Entradas normalizadas (hashable)
+            calcular: Función sin argumentos que produce el resultado
         
-        # Si hay largo requerido y la máquina tiene límite de largo
-        if largo_requerido > 0:
-            query += " AND (cm.largo_util_max = 0 OR cm.largo_util_max >= :largo)"
-            params['largo'] = largo_requerido
+        Returns:
+            Copia del resultado
+        """
+        clave = (version_conocimiento(), clave)
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return copy.deepcopy(self._entradas[clave])
+            self.fallos += 1
         
-        query += " ORDER BY cm.ancho_util_max ASC"
+        resultado = calcular()
+        with self._lock:
+            self._entradas[clave] = copy.deepcopy(resultado)
+            while len(self._entradas) > self.tamano:
+                self._entradas.popitem(last=False)
+        return resultado
+    
+    def estadisticas(self):
+        """
+        Returns:
+            dict: {aciertos, fallos, tasa_aciertos (%), entradas, tamano}
+        """
+        total = self.aciertos + self.fallos
+        return {
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': round(self.aciertos * 100 / total, 1) if total else 0.0,
+            'entradas': len(self._entradas),
+            'tamano': self.tamano
+        }
+    
+    def limpiar(self):
+        """Vacía la caché y reinicia los contadores"""
+        with self._lock:
+            self._entradas.clear()
+            self.aciertos = 0
+            self.fallos = 0
+
+
+# Memoria compartida por analizar_pedido_experto y validar_optimizacion_impresion
+memoria_resultados = MemoriaResultados(TAMANO_MEMORIA_RESULTADOS)
+
+
+def normalizar_medida(valor):
+    """Medida en metros redondeada a décimas de milímetro (para claves de caché)"""
+    return round(float(valor or 0), 4)
+
+
+def obtener_estadisticas_memoria():
+    """
+    Tasa de aciertos de la memoria de resultados
+    
+    Returns:
+        dict: Ver MemoriaResultados.estadisticas()
+    """
+    return memoria_resultados.estadisticas()
+
+
+# =========================================================
+# TRAZAS DE REGLAS (OPCIONAL)
+# =========================================================
+
+class RegistroTrazas:
+    """
+    Anillo de trazas de ejecución de las reglas
+    
+    Desactivado no cuesta más que revisar un booleano por regla. Activado,
+    cada regla trazada deja una entrada con su duración, las consultas SQL
+    que ejecutó (contar_consultas: cuenta todos los hilos mientras corre),
+    sus entradas y la rama de inferencia que tomó. Las reglas llamadas
+    desde otra comparten id_analisis con la de afuera, así se ve qué parte
+    de una cotización se llevó el tiempo. Solo se guardan las últimas
+    'tamano' trazas.
+    """
+    
+    def __init__(self, tamano=TAMANO_TRAZAS):
+        self.activo = False
+        self._trazas = deque(maxlen=tamano)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+    
+    def activar(self, tamano=None):
+        """Empieza a registrar (con un nuevo tamaño de anillo, opcional)"""
+        with self._lock:
+            if tamano and tamano != self._trazas.maxlen:
+                self._trazas = deque(self._trazas, maxlen=tamano)
+            self.activo = True
+    
+    def desactivar(self):
+        """Deja de registrar (las trazas guardadas se conservan)"""
+        self.activo = False
+    
+    def limpiar(self):
+        """Borra las trazas guardadas"""
+        with self._lock:
+            self._trazas.clear()
+    
+    def obtener(self, regla=None, minimo_ms=0):
+        """
+        Args:
+            regla: Filtrar por nombre de regla (opcional)
+            minimo_ms: Solo trazas que duraron al menos esto
         
-        from sqlalchemy import text
-        result = session.execute(text(query), params).fetchall()
+        Returns:
+            list: Copias de las trazas, de la más vieja a la más nueva
+        """
+        with self._lock:
+            trazas = list(self._trazas)
+        return [
+            dict(t, entradas=dict(t['entradas']))
+            for t in trazas
+            if (regla is None or t['regla'] == regla) and t['duracion_ms'] >= minimo_ms
+        ]
+    
+    def _pila(self):
+        pila = getattr(self._local, 'pila', None)
+        if pila is None:
+            pila = self._local.pila = []
+        return pila
+    
+    def marcar_rama(self, origen):
+        """Anota la rama tomada por la regla en ejecución (si se está trazando)"""
+        if self.activo:
+            pila = self._pila()
+            if pila:
+                pila[-1]['origen'] = origen
+    
+    def ejecutar(self, regla, firma, funcion, args, kwargs):
+        """Ejecuta una regla registrando su traza"""
+        argumentos = firma.bind(*args, **kwargs)
+        argumentos.apply_defaults()
+        pila = self._pila()
+        marco = {
+            'id_analisis': pila[-1]['id_analisis'] if pila else next(self._ids),
+            'profundidad': len(pila),
+            'origen': None
+        }
+        pila.append(marco)
         
-        maquinas = []
-        for row in result:
-            maquinas.append({
-                'id_maquina': row[0],
-                'nombre': row[1],
-                'tipo': row[2],
-                'ancho_max': row[3],
-                'largo_max': row[4],
-                'velocidad': row[5],
-                'sugerencia': row[6] or ''
-            })
+        inicio = datetime.now()
+        error = None
+        resultado = None
+        with contar_consultas() as contador:
+            t0 = time.perf_counter()
+            try:
+                resultado = funcion(*args, **kwargs)
+                return resultado
+            except Exception as e:
+                error = str(e)
+                raise
+            finally:
+                duracion = time.perf_counter() - t0
+                pila.pop()
+                origen = marco['origen']
+                if origen is None and isinstance(resultado, dict):
+                    origen = resultado.get('origen')
+                traza = {
+                    'id_analisis': marco['id_analisis'],
+                    'regla': regla,
+                    'profundidad': marco['profundidad'],
+                    'inicio': inicio.isoformat(timespec='milliseconds'),
+                    'duracion_ms': round(duracion * 1000, 3),
+                    'consultas': contador['consultas'],
+                    'entradas': {k: v for k, v in argumentos.arguments.items() if k != 'base'},
+                    'origen': origen,
+                    'error': error
+                }
+                with self._lock:
+                    self._trazas.append(traza)
+
+
+registro_trazas = RegistroTrazas(TAMANO_TRAZAS)
+
+
+def _trazar(regla):
+    """Decorador: registra la ejecución de la regla cuando las trazas están activas"""
+    def decorador(funcion):
+        firma = inspect.signature(funcion)
         
-        return maquinas
-    finally:
-        session.close()
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not registro_trazas.activo:
+                return funcion(*args, **kwargs)
+            return registro_trazas.ejecutar(regla, firma, funcion, args, kwargs)
+        return envoltura
+    return decorador
+
+
+def activar_trazas(tamano=None):
+    """
+    Activa el registro de trazas de las reglas
+    
+    Args:
+        tamano: Trazas a conservar (por defecto TAMANO_TRAZAS)
+    """
+    registro_trazas.activar(tamano)
+
+
+def desactivar_trazas():
+    """Desactiva el registro de trazas (se conservan las ya guardadas)"""
+    registro_trazas.desactivar()
+
+
+def limpiar_trazas():
+    """Borra las trazas guardadas"""
+    registro_trazas.limpiar()
+
+
+def obtener_trazas(regla=None, minimo_ms=0):
+    """
+    Trazas guardadas
+    
+    Args:
+        regla: Filtrar por regla (ej: 'sugerir_maquina_experto')
+        minimo_ms: Solo las que duraron al menos esto
+    
+    Returns:
+        list: {id_analisis, regla, profundidad, inicio, duracion_ms, consultas,
+               entradas, origen, error}
+    """
+    return registro_trazas.obtener(regla, minimo_ms)
 
 
-def obtener_maquinas_por_servicio(id_servicio, ancho_requerido=0):
+def resumir_trazas():
+    """
+    Tiempo y consultas acumulados por regla
+    
+    Returns:
+        list: {regla, llamadas, total_ms, promedio_ms, maximo_ms, consultas,
+               origenes: {origen: llamadas}} de mayor a menor total_ms
+    """
+    resumen = {}
+    for traza in registro_trazas.obtener():
+        fila = resumen.setdefault(traza['regla'], {
+            'regla': traza['regla'], 'llamadas': 0, 'total_ms': 0.0,
+            'maximo_ms': 0.0, 'consultas': 0, 'origenes': {}
+        })
+        fila['llamadas'] += 1
+        fila['total_ms'] += traza['duracion_ms']
+        fila['maximo_ms'] = max(fila['maximo_ms'], traza['duracion_ms'])
+        fila['consultas'] += traza['consultas']
+        fila['origenes'][traza['origen']] = fila['origenes'].get(traza['origen'], 0) + 1
+    
+    for fila in resumen.values():
+        fila['total_ms'] = round(fila['total_ms'], 3)
+        fila['promedio_ms'] = round(fila['total_ms'] / fila['llamadas'], 3)
+    return sorted(resumen.values(), key=lambda f: f['total_ms'], reverse=True)
+
+
+COLUMNAS_TRAZAS = [
+    'id_analisis', 'regla', 'profundidad', 'inicio', 'duracion_ms',
+    'consultas', 'origen', 'entradas', 'error'
+]
+
+
+def exportar_trazas(nombre_archivo, regla=None, minimo_ms=0):
+    """
+    Exporta las trazas guardadas a CSV
+    
+    Args:
+        nombre_archivo: Ruta del archivo a crear
+        regla: Filtrar por regla (opcional)
+        minimo_ms: Solo las que duraron al menos esto
+    
+    Returns:
+        bool: True si fue exitoso
+    """
+    from app.logic.exportacion import exportar_a_csv
+    
+    filas = [
+        dict(t, entradas=", ".join(f"{k}={v!r}" for k, v in t['entradas'].items()))
+        for t in obtener_trazas(regla, minimo_ms)
+    ]
+    return exportar_a_csv(filas, COLUMNAS_TRAZAS, nombre_archivo)
+
+
+# =========================================================
+# FUNCIONES DE CONSULTA A LA BASE DE CONOCIMIENTOS
+# =========================================================
+
+def obtener_maquinas_capaces(ancho_requerido, largo_requerido=0, base=None):
+    """
+    Obtiene máquinas que pueden manejar las dimensiones.
+    
+    INFERENCIA: Si ancho_requerido > ancho_util_max → Máquina NO puede
+    
+    Args:
+        ancho_requerido (float): Ancho del trabajo en metros
+        largo_requerido (float): Largo del trabajo (0 si no importa)
+        base (BaseConocimiento): Snapshot a usar (por defecto el vigente)
+    
+    Returns:
+        list: Máquinas capaces ordenadas por capacidad
+    """
+    return (base or obtener_base_conocimiento()).maquinas_capaces(ancho_requerido, largo_requerido)
+
+
+def obtener_maquinas_por_servicio(id_servicio, ancho_requerido=0, base=None):
     """
     Obtiene máquinas compatibles con un servicio específico.
     Prioriza las marcadas como 'recomendadas'.
@@ -90,189 +699,53 @@ def obtener_maquinas_por_servicio(id_servicio, ancho_requerido=0):
     Args:
         id_servicio: ID del servicio
         ancho_requerido: Filtra por capacidad física
+        base (BaseConocimiento): Snapshot a usar (por defecto el vigente)
     
     Returns:
         list: Máquinas ordenadas por prioridad
     """
-    session = get_session()
-    try:
-        from sqlalchemy import text
-        
-        query = """
-            SELECT 
-                m.id_maquina,
-                m.nombre,
-                tm.nombre_tipo as tipo,
-                ms.es_recomendada,
-                cm.ancho_util_max,
-                cm.velocidad_promedio,
-                m.sugerencia
-            FROM maquinas m
-            JOIN tipos_maquinas tm ON m.id_tipo_maquina = tm.id_tipo_maquina
-            JOIN maquinas_servicios ms ON m.id_maquina = ms.id_maquina
-            LEFT JOIN capacidad_maquinas cm ON m.id_maquina = cm.id_maquina
-            WHERE ms.id_servicio = :id_servicio
-        """
-        
-        params = {'id_servicio': id_servicio}
-        
-        if ancho_requerido > 0:
-            query += " AND (cm.ancho_util_max IS NULL OR cm.ancho_util_max >= :ancho)"
-            params['ancho'] = ancho_requerido
-        
-        query += " ORDER BY ms.es_recomendada DESC, cm.ancho_util_max ASC"
-        
-        result = session.execute(text(query), params).fetchall()
-        
-        maquinas = []
-        for row in result:
-            maquinas.append({
-                'id_maquina': row[0],
-                'nombre': row[1],
-                'tipo': row[2],
-                'es_recomendada': bool(row[3]),
-                'ancho_max': row[4],
-                'velocidad': row[5],
-                'sugerencia': row[6] or ''
-            })
-        
-        return maquinas
-    finally:
-        session.close()
+    return (base or obtener_base_conocimiento()).maquinas_por_servicio(id_servicio, ancho_requerido)
 
 
-def obtener_materiales_por_servicio(id_servicio, solo_con_stock=False):
+def obtener_materiales_por_servicio(id_servicio, solo_con_stock=False, base=None):
     """
     Obtiene materiales válidos para un servicio.
     
     Args:
         id_servicio: ID del servicio
         solo_con_stock: Si es True, solo materiales disponibles
+        base (BaseConocimiento): Snapshot a usar (por defecto el vigente)
     
     Returns:
         list: Materiales ordenados por preferencia
     """
-    session = get_session()
-    try:
-        from sqlalchemy import text
-        
-        query = """
-            SELECT 
-                mat.id_material,
-                mat.nombre_material,
-                tm.nombre_tipo as tipo,
-                sm.es_preferido,
-                inv.cantidad_stock,
-                inv.stock_minimo,
-                mat.sugerencia,
-                um.abreviacion as unidad
-            FROM materiales mat
-            JOIN tipos_materiales tm ON mat.id_tipo_material = tm.id_tipo_material
-            JOIN servicios_materiales sm ON mat.id_material = sm.id_material
-            LEFT JOIN inventario_materiales inv ON mat.id_material = inv.id_material
-            LEFT JOIN unidades_medida um ON mat.id_unidad_inventario = um.id_unidad
-            WHERE sm.id_servicio = :id_servicio
-        """
-        
-        params = {'id_servicio': id_servicio}
-        
-        if solo_con_stock:
-            query += " AND (inv.cantidad_stock IS NULL OR inv.cantidad_stock > 0)"
-        
-        query += " ORDER BY sm.es_preferido DESC, mat.nombre_material ASC"
-        
-        result = session.execute(text(query), params).fetchall()
-        
-        materiales = []
-        for row in result:
-            stock_actual = row[4] or 0
-            stock_min = row[5] or 5
-            
-            # Generar alertas de stock
-            alerta = None
-            if stock_actual <= 0:
-                alerta = "🔴 SIN STOCK"
-            elif stock_actual <= stock_min:
-                alerta = "⚠️ Stock bajo"
-            
-            materiales.append({
-                'id_material': row[0],
-                'nombre': row[1],
-                'tipo': row[2],
-                'es_preferido': bool(row[3]),
-                'stock': stock_actual,
-                'stock_minimo': stock_min,
-                'sugerencia': row[6] or '',
-                'unidad': row[7] or '',
-                'alerta_stock': alerta
-            })
-        
-        return materiales
-    finally:
-        session.close()
+    return (base or obtener_base_conocimiento()).materiales_por_servicio(id_servicio, solo_con_stock)
 
 
-def obtener_rollos_compatibles(ancho_trabajo):
+def obtener_rollos_compatibles(ancho_trabajo, base=None):
     """
     Obtiene rollos de material que pueden contener el ancho del trabajo.
     
     INFERENCIA: ancho_disponible >= ancho_trabajo
     
-    Usa la tabla `inventario_dimensional_materiales` del modelo ORM normalizado.
+    Usa el inventario dimensional (inventario_dimensional_materiales).
     
     Args:
         ancho_trabajo: Ancho requerido en metros
+        base (BaseConocimiento): Snapshot a usar (por defecto el vigente)
     
     Returns:
         list: Rollos compatibles con desperdicio calculado
     """
-    session = get_session()
-    try:
-        from sqlalchemy import text
-        
-        # Consulta corregida usando las tablas ORM reales:
-        # - inventario_dimensional_materiales (contiene ancho_disponible, largo_disponible)
-        # - materiales (catálogo de materiales)
-        query = """
-            SELECT 
-                mat.id_material,
-                mat.nombre_material,
-                idm.ancho_disponible,
-                idm.largo_disponible,
-                (idm.ancho_disponible - :ancho) as desperdicio,
-                idm.es_continuo
-            FROM materiales mat
-            JOIN inventario_dimensional_materiales idm ON mat.id_material = idm.id_material
-            WHERE idm.ancho_disponible >= :ancho
-              AND idm.largo_disponible > 0
-            ORDER BY desperdicio ASC
-        """
-        
-        result = session.execute(text(query), {'ancho': ancho_trabajo}).fetchall()
-        
-        rollos = []
-        for row in result:
-            ancho_rollo = row[2] or 0
-            rollos.append({
-                'id_material': row[0],
-                'nombre': row[1],
-                'ancho_rollo': ancho_rollo,
-                'largo_disponible': row[3] or 0,
-                'desperdicio_metros': row[4],
-                'es_continuo': bool(row[5]),
-                'eficiencia': round((ancho_trabajo / ancho_rollo) * 100, 1) if ancho_rollo > 0 else 0
-            })
-        
-        return rollos
-    finally:
-        session.close()
+    return (base or obtener_base_conocimiento()).rollos_compatibles(ancho_trabajo)
 
 
 # =========================================================
 # MOTOR DE INFERENCIA PRINCIPAL
 # =========================================================
 
-def sugerir_maquina_experto(ancho, alto, id_servicio=None):
+@_trazar('sugerir_maquina_experto')
+def sugerir_maquina_experto(ancho, alto, id_servicio=None, base=None):
     """
     REGLA DINÁMICA: Recomendar máquina basándose en la BD.
     
@@ -286,6 +759,7 @@ def sugerir_maquina_experto(ancho, alto, id_servicio=None):
         ancho (float): Ancho del trabajo en metros
         alto (float): Alto del trabajo en metros
         id_servicio (int): ID del servicio (opcional)
+        base (BaseConocimiento): Snapshot a usar (por defecto el vigente)
     
     Returns:
         dict: {
@@ -301,20 +775,22 @@ def sugerir_maquina_experto(ancho, alto, id_servicio=None):
         'id_maquina': None,
         'explicacion': '',
         'alternativas': [],
-        'origen': 'sin_datos',
+        'origen': ORIGEN_SIN_DATOS,
         'advertencias': []
     }
     
+    base = base or obtener_base_conocimiento()
+    
     # PASO 1: Intentar por servicio si existe
     if id_servicio:
-        maquinas = obtener_maquinas_por_servicio(id_servicio, ancho)
+        maquinas = base.maquinas_por_servicio(id_servicio, ancho)
         
         if maquinas:
             # Primera máquina es la recomendada (ordenada por preferencia)
             mejor = maquinas[0]
             resultado['maquina_recomendada'] = mejor['nombre']
             resultado['id_maquina'] = mejor['id_maquina']
-            resultado['origen'] = 'bd_servicio'
+            resultado['origen'] = ORIGEN_SERVICIO
             
             # Construir explicación
             exp_parts = []
@@ -337,13 +813,13 @@ def sugerir_maquina_experto(ancho, alto, id_servicio=None):
             return resultado
     
     # PASO 2: Fallback - Buscar por capacidad física
-    maquinas = obtener_maquinas_capaces(ancho, alto)
+    maquinas = base.maquinas_capaces(ancho, alto)
     
     if maquinas:
         mejor = maquinas[0]  # La de menor capacidad suficiente (más eficiente)
         resultado['maquina_recomendada'] = mejor['nombre']
         resultado['id_maquina'] = mejor['id_maquina']
-        resultado['origen'] = 'bd_capacidad'
+        resultado['origen'] = ORIGEN_CAPACIDAD
         
         resultado['explicacion'] = (
             f"Seleccionada por capacidad física: soporta hasta {mejor['ancho_max']}m de ancho. "
@@ -368,7 +844,8 @@ def sugerir_maquina_experto(ancho, alto, id_servicio=None):
     return resultado
 
 
-def sugerir_material_experto(id_servicio, ancho_trabajo=0, requiere_stock=True):
+@_trazar('sugerir_material_experto')
+def sugerir_material_experto(id_servicio, ancho_trabajo=0, requiere_stock=True, base=None):
     """
     REGLA DINÁMICA: Recomendar material basándose en la BD.
     
@@ -382,6 +859,7 @@ def sugerir_material_experto(id_servicio, ancho_trabajo=0, requiere_stock=True):
         id_servicio (int): ID del servicio
         ancho_trabajo (float): Ancho para verificar rollos
         requiere_stock (bool): Solo materiales con stock
+        base (BaseConocimiento): Snapshot a usar (por defecto el vigente)
     
     Returns:
         dict: {
@@ -399,9 +877,11 @@ def sugerir_material_experto(id_servicio, ancho_trabajo=0, requiere_stock=True):
         'alertas': []
     }
     
-    materiales = obtener_materiales_por_servicio(id_servicio, solo_con_stock=requiere_stock)
+    base = base or obtener_base_conocimiento()
+    materiales = base.materiales_por_servicio(id_servicio, solo_con_stock=requiere_stock)
     
     if not materiales:
+        registro_trazas.marcar_rama(ORIGEN_SIN_DATOS)
         resultado['explicacion'] = (
             "No hay materiales asociados a este servicio. "
             "Configure los materiales válidos en el panel de servicios."
@@ -411,7 +891,7 @@ def sugerir_material_experto(id_servicio, ancho_trabajo=0, requiere_stock=True):
     
     # Filtrar rollos por ancho si es necesario
     if ancho_trabajo > 0:
-        rollos_compat = obtener_rollos_compatibles(ancho_trabajo)
+        rollos_compat = base.rollos_compatibles(ancho_trabajo)
         ids_rollos_ok = {r['id_material'] for r in rollos_compat}
         
         # Separar materiales tipo rollo
@@ -431,6 +911,7 @@ def sugerir_material_experto(id_servicio, ancho_trabajo=0, requiere_stock=True):
         materiales = materiales_filtrados
     
     if not materiales:
+        registro_trazas.marcar_rama(ORIGEN_SIN_DATOS)
         resultado['explicacion'] = "No hay materiales compatibles con las dimensiones requeridas."
         return resultado
     
@@ -440,6 +921,7 @@ def sugerir_material_experto(id_servicio, ancho_trabajo=0, requiere_stock=True):
             resultado['alertas'].append(f"{mat['nombre']}: {mat['alerta_stock']}")
     
     # Primer material es el recomendado
+    registro_trazas.marcar_rama(ORIGEN_SERVICIO)
     mejor = materiales[0]
     resultado['material_recomendado'] = mejor['nombre']
     resultado['id_material'] = mejor['id_material']
@@ -467,7 +949,8 @@ def sugerir_material_experto(id_servicio, ancho_trabajo=0, requiere_stock=True):
     return resultado
 
 
-def validar_trabajo_experto(ancho, alto, id_servicio=None):
+@_trazar('validar_trabajo_experto')
+def validar_trabajo_experto(ancho, alto, id_servicio=None, base=None):
     """
     REGLA DE VALIDACIÓN: Verifica si el trabajo es factible.
     
@@ -476,6 +959,12 @@ def validar_trabajo_experto(ancho, alto, id_servicio=None):
     2. ¿Hay materiales disponibles?
     3. ¿Las dimensiones son lógicas?
     
+    Args:
+        ancho (float): Ancho del trabajo en metros
+        alto (float): Alto del trabajo en metros
+        id_servicio (int): ID del servicio (opcional)
+        base (BaseConocimiento): Snapshot a usar (por defecto el vigente)
+    
     Returns:
         dict: {
             'es_factible': bool,
@@ -496,8 +985,11 @@ def validar_trabajo_experto(ancho, alto, id_servicio=None):
     if alto > 50:
         advertencias.append(f"Largo muy extenso: {alto}m. Verificar si es correcto.")
     
-    # Consultar BD para máquinas
-    maquinas = obtener_maquinas_capaces(ancho, alto)
+    base = base or obtener_base_conocimiento()
+    
+    # Consultar la base de conocimientos para máquinas
+    maquinas = base.maquinas_capaces(ancho, alto)
+    registro_trazas.marcar_rama(ORIGEN_CAPACIDAD if maquinas else ORIGEN_SIN_DATOS)
     if not maquinas:
         errores.append(
             f"No hay máquinas registradas que soporten {ancho}m de ancho. "
@@ -506,7 +998,7 @@ def validar_trabajo_experto(ancho, alto, id_servicio=None):
     
     # Si hay servicio, verificar materiales
     if id_servicio:
-        materiales = obtener_materiales_por_servicio(id_servicio, solo_con_stock=True)
+        materiales = base.materiales_por_servicio(id_servicio, solo_con_stock=True)
         if not materiales:
             advertencias.append("No hay materiales con stock para este servicio")
     
@@ -517,7 +1009,31 @@ def validar_trabajo_experto(ancho, alto, id_servicio=None):
     }
 
 
-def estimar_tiempo_experto(id_maquina, area_m2, cantidad=1):
+VELOCIDAD_DEFECTO = 10  # Unidades/hora si la máquina no tiene capacidad cargada
+
+
+def horas_por_velocidad(velocidad, area_m2, cantidad=1):
+    """
+    REGLA DE TIEMPO (cálculo puro): horas de máquina para un trabajo
+    
+    Args:
+        velocidad: Unidades (o m²) por hora de la máquina; 0/None usa VELOCIDAD_DEFECTO
+        area_m2: Área de una unidad (0 si el trabajo no tiene área)
+        cantidad: Número de unidades
+    
+    Returns:
+        float: Horas estimadas (mínimo 30 minutos, redondeado a 0.1)
+    """
+    velocidad = velocidad or VELOCIDAD_DEFECTO
+    if area_m2 > 0:
+        horas = (area_m2 * cantidad) / velocidad
+    else:
+        horas = cantidad / velocidad
+    return max(0.5, round(horas, 1))  # Mínimo 30 minutos
+
+
+@_trazar('estimar_tiempo_experto')
+def estimar_tiempo_experto(id_maquina, area_m2, cantidad=1, base=None):
     """
     REGLA DE TIEMPO: Estima duración basándose en velocidad de máquina.
     
@@ -525,81 +1041,75 @@ def estimar_tiempo_experto(id_maquina, area_m2, cantidad=1):
         id_maquina: ID de la máquina seleccionada
         area_m2: Área total a producir
         cantidad: Número de unidades
+        base (BaseConocimiento): Snapshot a usar (por defecto el vigente)
     
     Returns:
         dict: {'horas_estimadas': float, 'explicacion': str}
     """
-    session = get_session()
-    try:
-        from sqlalchemy import text
-        
-        query = """
-            SELECT m.nombre, cm.velocidad_promedio
-            FROM maquinas m
-            LEFT JOIN capacidad_maquinas cm ON m.id_maquina = cm.id_maquina
-            WHERE m.id_maquina = :id_maq
-        """
-        
-        result = session.execute(text(query), {'id_maq': id_maquina}).fetchone()
-        
-        if not result:
-            return {
-                'horas_estimadas': 2.0,
-                'explicacion': "Máquina no encontrada. Tiempo estimado por defecto."
-            }
-        
-        nombre, velocidad = result[0], result[1] or 10  # 10 unidades/hora por defecto
-        
-        # Calcular tiempo
-        if area_m2 > 0:
-            horas = (area_m2 * cantidad) / velocidad
-        else:
-            horas = cantidad / velocidad
-        
-        horas = max(0.5, round(horas, 1))  # Mínimo 30 minutos
-        
+    maquina = (base or obtener_base_conocimiento()).maquina(id_maquina)
+    
+    if not maquina:
+        registro_trazas.marcar_rama(ORIGEN_SIN_DATOS)
         return {
-            'horas_estimadas': horas,
-            'explicacion': f"Máquina '{nombre}' a {velocidad} unidades/hora → {horas}h estimadas"
+            'horas_estimadas': 2.0,
+            'explicacion': "Máquina no encontrada. Tiempo estimado por defecto."
         }
-    finally:
-        session.close()
+    
+    registro_trazas.marcar_rama(ORIGEN_CAPACIDAD if maquina['velocidad'] else ORIGEN_SIN_DATOS)
+    nombre, velocidad = maquina['nombre'], maquina['velocidad'] or VELOCIDAD_DEFECTO
+    horas = horas_por_velocidad(velocidad, area_m2, cantidad)
+    
+    return {
+        'horas_estimadas': horas,
+        'explicacion': f"Máquina '{nombre}' a {velocidad} unidades/hora → {horas}h estimadas"
+    }
 
 
 # =========================================================
 # FUNCIÓN INTEGRADORA
 # =========================================================
 
-def analizar_pedido_experto(id_servicio, ancho, alto, cantidad=1):
+def _consultar(memo, clave, calcular):
+    """Resultado de una regla, reutilizado si ya se calculó con la misma clave"""
+    if memo is None:
+        return calcular()
+    if clave not in memo:
+        memo[clave] = calcular()
+    return memo[clave]
+
+
+def _analizar_linea(base, id_servicio, ancho, alto, cantidad, memo=None):
     """
-    Análisis completo de un pedido usando el Sistema Experto.
-    
-    Ejecuta todas las reglas de inferencia y consolida resultados.
+    Ejecuta las reglas para una línea sobre un snapshot dado
     
     Args:
-        id_servicio: ID del servicio solicitado
-        ancho: Ancho del trabajo en metros
-        alto: Alto del trabajo en metros
-        cantidad: Número de unidades
+        base: BaseConocimiento
+        memo: Diccionario compartido entre líneas para no repetir reglas
+              con las mismas entradas (None = sin memoria)
     
     Returns:
-        dict: Análisis completo con recomendaciones
+        dict: Mismo formato que analizar_pedido_experto
     """
     area = ancho * alto
     
     # 1. Validar factibilidad
-    validacion = validar_trabajo_experto(ancho, alto, id_servicio)
+    validacion = _consultar(memo, ('validacion', id_servicio, ancho, alto),
+                            lambda: validar_trabajo_experto(ancho, alto, id_servicio, base=base))
     
     # 2. Recomendar máquina
-    rec_maquina = sugerir_maquina_experto(ancho, alto, id_servicio)
+    rec_maquina = _consultar(memo, ('maquina', id_servicio, ancho, alto),
+                             lambda: sugerir_maquina_experto(ancho, alto, id_servicio, base=base))
     
     # 3. Recomendar material
-    rec_material = sugerir_material_experto(id_servicio, ancho)
+    rec_material = _consultar(memo, ('material', id_servicio, ancho),
+                              lambda: sugerir_material_experto(id_servicio, ancho, base=base))
     
     # 4. Estimar tiempo
     tiempo = {'horas_estimadas': 2.0, 'explicacion': 'Tiempo base'}
     if rec_maquina['id_maquina']:
-        tiempo = estimar_tiempo_experto(rec_maquina['id_maquina'], area, cantidad)
+        id_maquina = rec_maquina['id_maquina']
+        tiempo = dict(_consultar(memo, ('tiempo', id_maquina, area, cantidad),
+                                 lambda: estimar_tiempo_experto(id_maquina, area, cantidad, base=base)))
     
     # Consolidar alertas
     todas_alertas = []
@@ -607,22 +1117,23 @@ def analizar_pedido_experto(id_servicio, ancho, alto, cantidad=1):
     todas_alertas.extend(rec_maquina.get('advertencias', []))
     todas_alertas.extend(rec_material.get('alertas', []))
     
+    # Copias: con memoria, varias líneas comparten los resultados de las reglas
     return {
         'es_factible': validacion['es_factible'],
-        'errores': validacion['errores'],
+        'errores': list(validacion['errores']),
         'alertas': todas_alertas,
         'recomendacion_maquina': {
             'nombre': rec_maquina['maquina_recomendada'],
             'id': rec_maquina['id_maquina'],
             'explicacion': rec_maquina['explicacion'],
-            'alternativas': rec_maquina['alternativas'],
+            'alternativas': [dict(alt) for alt in rec_maquina['alternativas']],
             'origen_inferencia': rec_maquina['origen']
         },
         'recomendacion_material': {
             'nombre': rec_material['material_recomendado'],
             'id': rec_material['id_material'],
             'explicacion': rec_material['explicacion'],
-            'alternativas': rec_material['alternativas']
+            'alternativas': [dict(alt) for alt in rec_material['alternativas']]
         },
         'tiempo_estimado': tiempo,
         'resumen': {
@@ -632,3 +1143,138 @@ def analizar_pedido_experto(id_servicio, ancho, alto, cantidad=1):
             'material': rec_material['material_recomendado'] or 'No disponible'
         }
     }
+
+
+@_trazar('analizar_pedido_experto')
+def analizar_pedido_experto(id_servicio, ancho, alto, cantidad=1):
+    """
+    Análisis completo de un pedido usando el Sistema Experto.
+    
+    Ejecuta todas las reglas de inferencia sobre un mismo snapshot de la
+    base de conocimientos y consolida resultados.
+    
+    Args:
+        id_servicio: ID del servicio solicitado
+        ancho: Ancho del trabajo en metros
+        alto: Alto del trabajo en metros
+        cantidad: Número de unidades
+    
+    Returns:
+        dict: Análisis completo con recomendaciones
+    
+    Los resultados se recuerdan por servicio, medidas, cantidad y versión
+    de la base de conocimientos (ver MemoriaResultados).
+    """
+    ancho, alto = normalizar_medida(ancho), normalizar_medida(alto)
+    return memoria_resultados.obtener(
+        ('analisis', id_servicio, ancho, alto, cantidad),
+        lambda: _analizar_linea(obtener_base_conocimiento(), id_servicio, ancho, alto, cantidad)
+    )
+
+
+def _sumar_demanda(demanda, analisis, cantidad, area_total):
+    """Agrega el material recomendado de una línea a la demanda del lote"""
+    material = analisis['recomendacion_material']
+    if material['id'] is None:
+        return
+    fila = demanda.setdefault(material['id'], {
+        'id_material': material['id'], 'nombre': material['nombre'], 'unidades': 0, 'area_m2': 0.0
+    })
+    fila['unidades'] += cantidad
+    fila['area_m2'] += area_total
+
+
+def _redondear_demanda(demanda):
+    """Lista de la demanda acumulada con las áreas redondeadas"""
+    for fila in demanda.values():
+        fila['area_m2'] = round(fila['area_m2'], 2)
+    return list(demanda.values())
+
+
+@_trazar('analizar_pedidos_lote')
+def analizar_pedidos_lote(items):
+    """
+    Análisis de varias líneas de un pedido en una sola llamada.
+    
+    Todas las líneas usan el mismo snapshot de la base de conocimientos y
+    las reglas con entradas repetidas (mismo servicio y medidas) se
+    evalúan una sola vez.
+    
+    Solo las líneas factibles y con máquina capaz suman a la demanda de
+    materiales, las horas por máquina y los totales; las demás se informan
+    aparte en 'excluidas' para no cotizar tiempo base ni material de
+    trabajos que no se pueden producir.
+    
+    Args:
+        items: Lista de diccionarios {id_servicio, ancho, alto, cantidad}
+               (cantidad opcional, por defecto 1)
+    
+    Returns:
+        dict: {
+            'lineas': list,  # Análisis de cada línea (formato de analizar_pedido_experto), en orden
+            'es_factible': bool,  # Todas las líneas son factibles
+            'lineas_no_factibles': list,  # Índices de las líneas con errores
+            'demanda_materiales': list,  # [{id_material, nombre, unidades, area_m2}]
+            'horas_por_maquina': list,  # [{id_maquina, nombre, horas}]
+            'totales': dict,  # {lineas, unidades, area_m2, horas} de las líneas producibles
+            'excluidas': dict  # {lineas: [índices], unidades, area_m2, horas,
+                               #  horas_sin_maquina, demanda_materiales}
+        }
+    """
+    base = obtener_base_conocimiento()
+    memo = {}
+    lineas = []
+    demanda = {}
+    horas_maquina = {}
+    totales = {'lineas': 0, 'unidades': 0, 'area_m2': 0.0, 'horas': 0.0}
+    excluidas = {'lineas': [], 'unidades': 0, 'area_m2': 0.0, 'horas': 0.0, 'horas_sin_maquina': 0.0}
+    demanda_excluida = {}
+    
+    for indice, item in enumerate(items):
+        ancho = float(item.get('ancho') or 0)
+        alto = float(item.get('alto') or 0)
+        cantidad = int(item.get('cantidad') or 1)
+        analisis = _analizar_linea(base, item.get('id_servicio'), ancho, alto, cantidad, memo)
+        lineas.append(analisis)
+        
+        area_total = ancho * alto * cantidad
+        horas = analisis['tiempo_estimado']['horas_estimadas']
+        maquina = analisis['recomendacion_maquina']
+        
+        if not analisis['es_factible'] or maquina['id'] is None:
+            excluidas['lineas'].append(indice)
+            excluidas['unidades'] += cantidad
+            excluidas['area_m2'] += area_total
+            # Sin máquina, horas_estimadas es el tiempo base de relleno
+            excluidas['horas' if maquina['id'] is not None else 'horas_sin_maquina'] += horas
+            _sumar_demanda(demanda_excluida, analisis, cantidad, area_total)
+            continue
+        
+        totales['lineas'] += 1
+        totales['unidades'] += cantidad
+        totales['area_m2'] += area_total
+        totales['horas'] += horas
+        _sumar_demanda(demanda, analisis, cantidad, area_total)
+        fila = horas_maquina.setdefault(maquina['id'], {
+            'id_maquina': maquina['id'], 'nombre': maquina['nombre'], 'horas': 0.0
+        })
+        fila['horas'] += horas
+    
+    for fila in horas_maquina.values():
+        fila['horas'] = round(fila['horas'], 1)
+    for resumen in (totales, excluidas):
+        resumen['area_m2'] = round(resumen['area_m2'], 2)
+        resumen['horas'] = round(resumen['horas'], 1)
+    excluidas['horas_sin_maquina'] = round(excluidas['horas_sin_maquina'], 1)
+    excluidas['demanda_materiales'] = _redondear_demanda(demanda_excluida)
+    
+    no_factibles = [i for i, analisis in enumerate(lineas) if not analisis['es_factible']]
+    return {
+        'lineas': lineas,
+        'es_factible': not no_factibles,
+        'lineas_no_factibles': no_factibles,
+        'demanda_materiales': _redondear_demanda(demanda),
+        'horas_por_maquina': list(horas_maquina.values()),
+        'totales': totales,
+        'excluidas': excluidas
+    }
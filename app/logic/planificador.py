@@ -0,0 +1,367 @@
+"""
+Planificador de Producción con Capacidad Finita por Máquina
+Asigna cada detalle de pedido en cola a una máquina compatible y lo
+secuencia en el tiempo laboral de esa máquina
+
+SISTEMA EXPERTO - Componente de Planificación Temporal
+- Compatibilidad: maquinas_servicios (o la máquina sugerida del servicio)
+- Duración: velocidad_promedio de capacidad_maquinas (REGLA-TMP)
+- Orden: cola de prioridad por urgencia, fecha de entrega e ingreso
+- Asignación: cada trabajo va a la máquina compatible que lo termina antes
+
+El plan se guarda en plan_produccion. Cuando cambian pedidos concretos,
+replanificar_pedidos() recalcula solo las máquinas que los tenían o que
+pueden hacerlos; el resto del plan queda igual.
+"""
+import heapq
+from datetime import datetime
+from app.database.consultas import (
+    obtener_estados_pedidos, obtener_trabajos_en_cola, obtener_maquinas_para_planificar,
+    obtener_plan_produccion, reemplazar_plan_produccion
+)
+from app.logic.cola_produccion import ESTADOS_EN_COLA
+from app.logic.calendario_laboral import obtener_calendario
+from app.logic.motor_inferencia import horas_por_velocidad
+
+
+PRIORIDAD_NORMAL = 0
+PRIORIDAD_URGENTE = 1
+
+
+# =========================================================
+# SECUENCIACIÓN
+# =========================================================
+
+def _clave_prioridad(trabajo):
+    """Menor clave = se programa antes (urgentes, luego fecha de entrega)"""
+    return (
+        -(trabajo['prioridad'] or PRIORIDAD_NORMAL),
+        trabajo['fecha_entrega_estimada'] or datetime.max,
+        trabajo['fecha_ingreso'] or datetime.max,
+        trabajo['id_detalle'],
+    )
+
+
+def secuenciar(trabajos, opciones, carga_inicial):
+    """
+    Programa trabajos en máquinas con una cola de prioridad
+
+    Saca los trabajos del heap en orden de prioridad y asigna cada uno a la
+    máquina compatible donde termina antes (a igual fin, la recomendada y
+    luego la de menor ID).
+
+    Args:
+        trabajos: Diccionarios de obtener_trabajos_en_cola()
+        opciones: {id_detalle: {id_maquina: (horas, es_recomendada)}}
+        carga_inicial: {id_maquina: horas ya ocupadas} de las máquinas usables
+
+    Returns:
+        tuple: ({id_maquina: [(trabajo, inicio_h, fin_h), ...]}, [trabajos sin máquina])
+    """
+    carga = dict(carga_inicial)
+    asignaciones = {id_maquina: [] for id_maquina in carga}
+    sin_maquina = []
+
+    heap = [(_clave_prioridad(t), t['id_detalle'], t) for t in trabajos]
+    heapq.heapify(heap)
+    while heap:
+        _, id_detalle, trabajo = heapq.heappop(heap)
+        candidatas = [
+            (carga[id_maquina] + horas, not recomendada, id_maquina, horas)
+            for id_maquina, (horas, recomendada) in opciones.get(id_detalle, {}).items()
+            if id_maquina in carga
+        ]
+        if not candidatas:
+            sin_maquina.append(trabajo)
+            continue
+        fin, _, id_maquina, horas = min(candidatas)
+        asignaciones[id_maquina].append((trabajo, carga[id_maquina], fin))
+        carga[id_maquina] = fin
+
+    return asignaciones, sin_maquina
+
+
+def _opciones_por_trabajo(trabajos, maquinas):
+    """
+    Duración del trabajo en cada máquina compatible
+
+    Returns:
+        dict: {id_detalle: {id_maquina: (horas, es_recomendada)}}
+    """
+    opciones = {}
+    for trabajo in trabajos:
+        area = (trabajo['ancho'] or 0) * (trabajo['alto'] or 0)
+        opciones[trabajo['id_detalle']] = {
+            id_maquina: (
+                horas_por_velocidad(maquinas['velocidades'].get(id_maquina), area, trabajo['cantidad'] or 0),
+                recomendada
+            )
+            for id_maquina, recomendada in maquinas['compatibles'].get(trabajo['id_servicio'], {}).items()
+        }
+    return opciones
+
+
+def _ids_estados_en_cola():
+    return [e['id'] for e in obtener_estados_pedidos() if e['nombre'] in ESTADOS_EN_COLA]
+
+
+def _filas_plan(asignaciones, bases):
+    """Convierte horas relativas de cada máquina en filas con inicio/fin reales"""
+    calendario = obtener_calendario()
+    filas = []
+    for id_maquina, programados in asignaciones.items():
+        base, secuencia = bases[id_maquina]
+        for trabajo, inicio_h, fin_h in programados:
+            secuencia += 1
+            filas.append({
+                'id_detalle': trabajo['id_detalle'],
+                'id_pedido': trabajo['id_pedido'],
+                'id_maquina': id_maquina,
+                'secuencia': secuencia,
+                'horas': round(fin_h - inicio_h, 2),
+                'inicio': calendario.sumar_horas(base, inicio_h, al_cierre=False),
+                'fin': calendario.sumar_horas(base, fin_h),
+            })
+    return filas
+
+
+def _planificar(trabajos, ids_maquinas, en_curso, ahora):
+    """
+    Secuencia trabajos en un grupo de máquinas que arrancan en 'ahora'
+
+    Args:
+        trabajos: Trabajos a programar
+        ids_maquinas: Máquinas disponibles
+        en_curso: {id_maquina: fila del plan que ya empezó} (se mantiene primera)
+        ahora: Momento de inicio del plan
+
+    Returns:
+        tuple: (filas del plan, trabajos sin máquina compatible)
+    """
+    maquinas = obtener_maquinas_para_planificar()
+    opciones = _opciones_por_trabajo(trabajos, maquinas)
+
+    bases = {}
+    filas = []
+    for id_maquina in ids_maquinas:
+        fila = en_curso.get(id_maquina)
+        if fila:
+            filas.append(dict(fila, secuencia=1))
+            bases[id_maquina] = (max(ahora, fila['fin']), 1)
+        else:
+            bases[id_maquina] = (ahora, 0)
+
+    asignaciones, sin_maquina = secuenciar(trabajos, opciones, {m: 0.0 for m in ids_maquinas})
+    filas.extend(_filas_plan(asignaciones, bases))
+    return filas, sin_maquina
+
+
+def _en_curso(plan, ahora, excluir_pedidos=()):
+    """Trabajos del plan que ya empezaron, por máquina"""
+    en_curso = {}
+    for fila in plan:
+        inicio = datetime.fromisoformat(fila['inicio'])
+        fin = datetime.fromisoformat(fila['fin'])
+        if inicio <= ahora < fin and fila['id_pedido'] not in excluir_pedidos:
+            en_curso[fila['id_maquina']] = dict(
+                {k: fila[k] for k in ('id_detalle', 'id_pedido', 'id_maquina', 'horas')},
+                inicio=inicio, fin=fin
+            )
+    return en_curso
+
+
+# =========================================================
+# API
+# =========================================================
+
+def planificar_produccion():
+    """
+    Recalcula el plan completo de todas las máquinas
+
+    Returns:
+        dict: {'programados': int, 'sin_maquina': [id_detalle, ...]}
+    """
+    ahora = datetime.now()
+    ids_estados = _ids_estados_en_cola()
+    trabajos = obtener_trabajos_en_cola(ids_estados) if ids_estados else []
+    ids_maquinas = list(obtener_maquinas_para_planificar()['nombres'])
+
+    en_curso = _en_curso(obtener_plan_produccion(), ahora)
+    vigentes = {t['id_detalle'] for t in trabajos}
+    en_curso = {m: f for m, f in en_curso.items() if f['id_detalle'] in vigentes and m in ids_maquinas}
+    fijos = {f['id_detalle'] for f in en_curso.values()}
+    trabajos = [t for t in trabajos if t['id_detalle'] not in fijos]
+
+    filas, sin_maquina = _planificar(trabajos, ids_maquinas, en_curso, ahora)
+    reemplazar_plan_produccion(None, filas)
+    return {'programados': len(filas), 'sin_maquina': [t['id_detalle'] for t in sin_maquina]}
+
+
+def replanificar_pedidos(ids_pedidos):
+    """
+    Actualiza el plan tras crear, modificar o repriorizar pedidos
+
+    Solo se recalculan las máquinas afectadas: las que tenían trabajos de
+    estos pedidos y las compatibles con sus detalles. Los demás trabajos
+    de esas máquinas se vuelven a secuenciar entre ellas; las otras
+    máquinas conservan su plan.
+
+    Args:
+        ids_pedidos: IDs de los pedidos que cambiaron
+
+    Returns:
+        dict: {'maquinas': [id_maquina, ...], 'programados': int,
+               'sin_maquina': [id_detalle, ...]}
+    """
+    ids_pedidos = list(ids_pedidos)
+    ahora = datetime.now()
+    ids_estados = _ids_estados_en_cola()
+    maquinas = obtener_maquinas_para_planificar()
+
+    anteriores = obtener_plan_produccion(ids_pedidos=ids_pedidos)
+    nuevos = obtener_trabajos_en_cola(ids_estados, ids_pedidos=ids_pedidos) if ids_estados else []
+
+    afectadas = {fila['id_maquina'] for fila in anteriores}
+    for trabajo in nuevos:
+        afectadas.update(maquinas['compatibles'].get(trabajo['id_servicio'], {}))
+    afectadas &= set(maquinas['nombres'])
+    if not afectadas and not anteriores:
+        return {'maquinas': [], 'programados': 0, 'sin_maquina': [t['id_detalle'] for t in nuevos]}
+
+    # Trabajos que ya estaban en las máquinas afectadas (datos frescos)
+    plan_afectado = obtener_plan_produccion(ids_maquinas=list(afectadas))
+    en_curso = _en_curso(plan_afectado, ahora, excluir_pedidos=set(ids_pedidos))
+    fijos = {f['id_detalle'] for f in en_curso.values()}
+    otros = [f['id_detalle'] for f in plan_afectado
+             if f['id_pedido'] not in ids_pedidos and f['id_detalle'] not in fijos]
+    trabajos = nuevos + (obtener_trabajos_en_cola(ids_estados, ids_detalles=otros)
+                         if otros and ids_estados else [])
+
+    # Un trabajo en curso que salió de la cola ya no se mantiene
+    if fijos and ids_estados:
+        vigentes = {t['id_detalle'] for t in obtener_trabajos_en_cola(ids_estados, ids_detalles=list(fijos))}
+        en_curso = {m: f for m, f in en_curso.items() if f['id_detalle'] in vigentes}
+
+    filas, sin_maquina = _planificar(trabajos, sorted(afectadas), en_curso, ahora)
+    reemplazar_plan_produccion(
+        list(afectadas), filas, ids_detalles=[f['id_detalle'] for f in anteriores]
+    )
+    return {
+        'maquinas': sorted(afectadas),
+        'programados': len(filas),
+        'sin_maquina': [t['id_detalle'] for t in sin_maquina],
+    }
+
+
+def actualizar_plan_pedidos(ids_pedidos):
+    """
+    replanificar_pedidos para usar después de guardar un cambio
+
+    El cambio del pedido ya está confirmado: si el plan no se puede
+    actualizar no se lanza la excepción sino que se devuelve el motivo para
+    avisar al operador (el plan completo se rehace al iniciar la aplicación).
+
+    Args:
+        ids_pedidos: IDs de los pedidos que cambiaron
+
+    Returns:
+        str or None: Motivo del fallo, o None si el plan quedó actualizado
+    """
+    try:
+        replanificar_pedidos(ids_pedidos)
+        return None
+    except Exception as e:
+        return str(e)
+
+
+def estimar_fin_trabajo(id_servicio, ancho=0, alto=0, cantidad=1, urgente=False):
+    """
+    Cuándo terminaría un trabajo nuevo según el plan guardado
+
+    El trabajo se agrega al final de cada máquina compatible (si es urgente,
+    detrás del trabajo en curso y de los otros urgentes), con la misma
+    duración que usa el plan (velocidad_promedio), y se elige la máquina que
+    lo termina antes.
+
+    Args:
+        id_servicio: ID del servicio
+        ancho: Ancho en metros (0 si el servicio no es dimensional)
+        alto: Alto en metros
+        cantidad: Número de unidades
+        urgente: Si el trabajo pasaría adelante de los de prioridad normal
+
+    Returns:
+        dict or None: {id_maquina, nombre, horas, inicio, fin}; None si el
+                      servicio no tiene máquina compatible
+    """
+    ahora = datetime.now()
+    maquinas = obtener_maquinas_para_planificar()
+    compatibles = {
+        id_maquina: recomendada
+        for id_maquina, recomendada in maquinas['compatibles'].get(id_servicio, {}).items()
+        if id_maquina in maquinas['nombres']
+    }
+    if not compatibles:
+        return None
+
+    plan = obtener_plan_produccion(ids_maquinas=list(compatibles))
+    if urgente and plan:
+        ids_estados = _ids_estados_en_cola()
+        urgentes = {
+            t['id_detalle']
+            for t in obtener_trabajos_en_cola(ids_estados, ids_detalles=[f['id_detalle'] for f in plan])
+            if (t['prioridad'] or PRIORIDAD_NORMAL) >= PRIORIDAD_URGENTE
+        } if ids_estados else set()
+        plan = [f for f in plan
+                if f['id_detalle'] in urgentes or datetime.fromisoformat(f['inicio']) <= ahora]
+
+    libre = dict.fromkeys(compatibles, ahora)
+    for fila in plan:
+        libre[fila['id_maquina']] = max(libre[fila['id_maquina']], datetime.fromisoformat(fila['fin']))
+
+    # Misma elección que secuenciar(): antes termina, luego recomendada y menor ID
+    calendario = obtener_calendario()
+    area = (ancho or 0) * (alto or 0)
+    candidatas = []
+    for id_maquina, recomendada in compatibles.items():
+        horas = horas_por_velocidad(maquinas['velocidades'].get(id_maquina), area, cantidad or 0)
+        fin = calendario.sumar_horas(libre[id_maquina], horas)
+        candidatas.append((fin, not recomendada, id_maquina, horas))
+    fin, _, id_maquina, horas = min(candidatas)
+    return {
+        'id_maquina': id_maquina,
+        'nombre': maquinas['nombres'][id_maquina],
+        'horas': horas,
+        'inicio': calendario.sumar_horas(libre[id_maquina], 0, al_cierre=False),
+        'fin': fin,
+    }
+
+
+def obtener_carga_por_maquina():
+    """
+    Resume el plan guardado por máquina
+
+    Returns:
+        list: Diccionarios {id_maquina, nombre, trabajos, horas, pendientes, fin}
+              ordenados por nombre de máquina. 'horas' suma todo el plan de
+              la máquina y 'pendientes' las horas laborales que faltan hasta
+              que quede libre.
+    """
+    nombres = obtener_maquinas_para_planificar()['nombres']
+    resumen = {}
+    for fila in obtener_plan_produccion():
+        datos = resumen.setdefault(fila['id_maquina'], {
+            'id_maquina': fila['id_maquina'],
+            'nombre': nombres.get(fila['id_maquina'], f"Máquina {fila['id_maquina']}"),
+            'trabajos': 0, 'horas': 0.0, 'fin': None
+        })
+        datos['trabajos'] += 1
+        datos['horas'] += fila['horas']
+        fin = datetime.fromisoformat(fila['fin'])
+        datos['fin'] = fin if datos['fin'] is None else max(datos['fin'], fin)
+
+    ahora = datetime.now()
+    calendario = obtener_calendario()
+    for datos in resumen.values():
+        datos['pendientes'] = round(max(calendario.horas_entre(ahora, datos['fin']), 0.0), 1)
+    return sorted(resumen.values(), key=lambda d: d['nombre'])
@@ -0,0 +1,194 @@
+"""
+Planificador de Paños para Impresiones de Gran Formato
+Busca las formas más baratas de producir un diseño que no entra (o entra
+mal) en una sola pasada: orientación × número de paños × rollo × máquina
+
+SISTEMA EXPERTO - Componente de Optimización Dimensional
+validar_optimizacion_impresion (calculos.py) responde "rotar" o "dividir
+en N paños" mirando una sola máquina. Aquí se recorren todas las
+combinaciones con el stock real (inventario_dimensional_materiales) y las
+capacidades reales (capacidad_maquinas) de la base de conocimientos en
+memoria, y se devuelven los mejores planes según desperdicio de material
+y horas de máquina.
+
+La búsqueda es de ramificación y poda: para cada máquina y orientación
+el número de paños crece mientras la cota inferior del puntaje (traslapes
+y márgenes, más horas de máquina) pueda mejorar el peor plan retenido; los
+rollos más angostos que el paño se descartan con bisect. El resultado se
+recuerda en la memoria de resultados del motor, así que repetir las medidas
+mientras el operador escribe no vuelve a buscar.
+"""
+import heapq
+import math
+from bisect import bisect_left
+from app.logic.motor_inferencia import (
+    obtener_base_conocimiento, horas_por_velocidad, memoria_resultados, normalizar_medida
+)
+
+
+# Margen técnico por paño en metros (mismo criterio que R-OPT-03)
+MARGEN_TECNICO = 0.05
+
+# Traslape entre paños contiguos para la unión
+SOLAPAMIENTO = 0.02
+
+# Máximo razonable de paños (mismo límite que validar_optimizacion_impresion)
+MAX_PAÑOS = 4
+
+# Metros cuadrados de desperdicio que equivalen a una hora de máquina
+PESO_HORA_M2 = 1.0
+
+# Planes que se devuelven por defecto
+PLANES_POR_DEFECTO = 3
+
+
+def _maquinas_candidatas(base, id_servicio):
+    """Máquinas con ancho útil cargado: las del servicio o, si no tiene, todas"""
+    if id_servicio:
+        ids = [id_maquina for id_maquina, _ in base.maquinas_servicio.get(id_servicio, ())]
+        if ids:
+            maquinas = [base.maquina(id_maquina) for id_maquina in ids]
+            return [m for m in maquinas if m and m['tipo'] is not None and (m['ancho_max'] or 0) > 0]
+    return [m for m in base.maquinas_capaces(0) if (m['ancho_max'] or 0) > 0]
+
+
+def _rollos_candidatos(base, id_servicio):
+    """
+    Rollos con stock ordenados por ancho: los de materiales del servicio o,
+    si ninguno es dimensional, todos
+    """
+    rollos = base.rollos_compatibles(0)
+    if id_servicio:
+        ids = {id_material for id_material, _ in base.materiales_servicio.get(id_servicio, ())}
+        del_servicio = [r for r in rollos if r['id_material'] in ids]
+        if del_servicio:
+            rollos = del_servicio
+    return rollos
+
+
+def _evaluar_rollo(rollo, paños, ancho_paño, largo_paño, cantidad, area_diseno):
+    """
+    Metros de rollo y desperdicio de acomodar todos los paños en un rollo
+
+    Returns:
+        dict or None: None si el largo disponible no alcanza
+    """
+    ancho_rollo = rollo['ancho_rollo']
+    por_fila = int(ancho_rollo // ancho_paño)
+    filas = math.ceil(paños * cantidad / por_fila)
+    metros = filas * largo_paño
+    if metros > rollo['largo_disponible']:
+        return None
+    consumido = metros * ancho_rollo
+    return {
+        'id_material': rollo['id_material'],
+        'nombre_material': rollo['nombre'],
+        'ancho_rollo': ancho_rollo,
+        'paños_por_fila': por_fila,
+        'metros_lineales': round(metros, 2),
+        'desperdicio_m2': round(consumido - area_diseno, 3),
+        'aprovechamiento': round(area_diseno * 100 / consumido, 1) if consumido > 0 else 0.0,
+    }
+
+
+def _buscar_planes(ancho, alto, cantidad, id_servicio, limite, peso_hora):
+    """Ramificación y poda sobre la base de conocimientos (sin memoria)"""
+    base = obtener_base_conocimiento()
+    maquinas = _maquinas_candidatas(base, id_servicio)
+    rollos = _rollos_candidatos(base, id_servicio)
+    anchos_rollos = [r['ancho_rollo'] for r in rollos]
+    area_diseno = ancho * alto * cantidad
+
+    orientaciones = [(ancho, alto, False)]
+    if ancho != alto:
+        orientaciones.append((alto, ancho, True))
+
+    # Heap de los mejores: (-puntaje, desempate, plan); el peor queda arriba
+    mejores = []
+    contador = 0
+    for maquina in maquinas:
+        ancho_max, largo_max = maquina['ancho_max'], maquina['largo_max'] or 0
+        for transversal, longitudinal, rotado in orientaciones:
+            largo_paño = longitudinal + MARGEN_TECNICO
+            if largo_max > 0 and largo_paño > largo_max:
+                continue
+
+            minimo = max(1, math.ceil(
+                (transversal - SOLAPAMIENTO) / (ancho_max - MARGEN_TECNICO - SOLAPAMIENTO)
+            )) if ancho_max > MARGEN_TECNICO + SOLAPAMIENTO else MAX_PAÑOS + 1
+            for paños in range(minimo, MAX_PAÑOS + 1):
+                ancho_paño = (transversal + (paños - 1) * SOLAPAMIENTO) / paños + MARGEN_TECNICO
+                if ancho_paño > ancho_max:
+                    continue
+
+                area_impresa = (transversal + (paños - 1) * SOLAPAMIENTO) * longitudinal
+                horas = horas_por_velocidad(maquina['velocidad'], area_impresa, cantidad)
+
+                # Cota: traslapes y márgenes se pierden con cualquier rollo, y
+                # crece con el número de paños; si no mejora, tampoco los siguientes
+                cota = paños * cantidad * ancho_paño * largo_paño - area_diseno + peso_hora * horas
+                if len(mejores) >= limite and cota >= -mejores[0][0]:
+                    break
+
+                for rollo in rollos[bisect_left(anchos_rollos, ancho_paño):]:
+                    uso = _evaluar_rollo(rollo, paños, ancho_paño, largo_paño, cantidad, area_diseno)
+                    if uso is None:
+                        continue
+                    puntaje = uso['desperdicio_m2'] + peso_hora * horas
+                    if len(mejores) >= limite and puntaje >= -mejores[0][0]:
+                        continue
+
+                    plan = dict(
+                        id_maquina=maquina['id_maquina'],
+                        nombre_maquina=maquina['nombre'],
+                        rotado=rotado,
+                        paños=paños,
+                        ancho_paño=round(ancho_paño, 3),
+                        largo_paño=round(largo_paño, 3),
+                        horas=horas,
+                        puntaje=round(puntaje, 3),
+                        **uso
+                    )
+                    contador += 1
+                    entrada = (-puntaje, -contador, plan)
+                    if len(mejores) < limite:
+                        heapq.heappush(mejores, entrada)
+                    else:
+                        heapq.heapreplace(mejores, entrada)
+
+    return [plan for _, _, plan in sorted(mejores, key=lambda e: (-e[0], -e[1]))]
+
+
+def planificar_paños(ancho, alto, cantidad=1, id_servicio=None, limite=PLANES_POR_DEFECTO,
+                     peso_hora=PESO_HORA_M2):
+    """
+    Mejores planes de producción para un diseño de gran formato
+
+    Cada plan combina una máquina (capacidad_maquinas), una orientación,
+    un número de paños (1 = sin dividir) y un rollo con stock suficiente.
+    Los paños se acomodan lado a lado en el ancho del rollo.
+
+    Args:
+        ancho: Ancho del diseño en metros
+        alto: Alto del diseño en metros
+        cantidad: Unidades a producir
+        id_servicio: Limitar a las máquinas y materiales del servicio (opcional)
+        limite: Cantidad máxima de planes
+        peso_hora: m² de desperdicio que equivalen a una hora de máquina
+
+    Returns:
+        list: Planes de menor a mayor puntaje (desperdicio_m2 + peso_hora * horas):
+              {id_maquina, nombre_maquina, rotado, paños, ancho_paño, largo_paño,
+               horas, puntaje, id_material, nombre_material, ancho_rollo,
+               paños_por_fila, metros_lineales, desperdicio_m2, aprovechamiento}
+              Lista vacía si no hay combinación factible.
+    """
+    ancho, alto = normalizar_medida(ancho), normalizar_medida(alto)
+    cantidad = max(int(cantidad or 1), 1)
+    if ancho <= 0 or alto <= 0 or limite <= 0:
+        return []
+
+    return memoria_resultados.obtener(
+        ('paños', ancho, alto, cantidad, id_servicio, limite, peso_hora),
+        lambda: _buscar_planes(ancho, alto, cantidad, id_servicio, limite, peso_hora)
+    )
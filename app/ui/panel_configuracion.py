@@ -5,6 +5,7 @@ Permite gestionar catálogos: Unidades de Medida, Tipos de Máquina, Estados de
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import messagebox, colorchooser
+from datetime import datetime
 from app.config import (
     COLOR_PRIMARY,
     COLOR_SUCCESS,
@@ -41,6 +42,7 @@ class PanelConfiguracion(ctk.CTkFrame):
         # Crear pestañas
         self.tab_sistema = self.tabview.add("🏭 Sistema")
         self.tab_produccion = self.tabview.add("⏰ Producción")
+        self.tab_feriados = self.tabview.add("📅 Feriados")
         self.tab_unidades = self.tabview.add("📏 Unidades")
         self.tab_tipos_maquina = self.tabview.add("🔧 Tipos Máquina")
         self.tab_estados = self.tabview.add("📋 Estados Pedido")
@@ -50,6 +52,7 @@ class PanelConfiguracion(ctk.CTkFrame):
         # Configurar cada pestaña
         self._configurar_tab_sistema()
         self._configurar_tab_produccion()
+        self._configurar_tab_feriados()
         self._configurar_tab_unidades()
         self._configurar_tab_tipos_maquina()
         self._configurar_tab_estados()
@@ -349,10 +352,9 @@ class PanelConfiguracion(ctk.CTkFrame):
     def _mostrar_resumen_cola(self):
         """Muestra el estado actual de la cola de producción"""
         try:
-            from app.logic.cola_produccion import obtener_info_cola_produccion, estimar_capacidad_disponible
+            from app.logic.cola_produccion import obtener_info_cola_produccion
             
             info_cola = obtener_info_cola_produccion()
-            capacidad = estimar_capacidad_disponible(7)
 
             frame_resumen = ctk.CTkFrame(self.scroll_produccion, fg_color=("gray80", "gray20"), corner_radius=10)
             frame_resumen.grid(row=6, column=0, columnspan=3, sticky="ew", pady=20, padx=5)
@@ -378,6 +380,17 @@ class PanelConfiguracion(ctk.CTkFrame):
                     font=ctk.CTkFont(size=12)
                 ).grid(row=1, column=col, padx=20, pady=(5, 15))
 
+            # Plan por máquina (capacidad finita): las horas pendientes de
+            # arriba son la suma de estas
+            for fila, carga in enumerate(info_cola['maquinas'], start=2):
+                fin = carga['fin'].strftime('%d/%m %H:%M') if carga['fin'] else '-'
+                ctk.CTkLabel(
+                    frame_resumen,
+                    text=f"🖨️ {carga['nombre']}: {carga['trabajos']} trabajos, "
+                         f"{carga['pendientes']:.1f}h pendientes, libre desde {fin}",
+                    font=ctk.CTkFont(size=11)
+                ).grid(row=fila, column=0, columnspan=4, padx=20, pady=2, sticky="w")
+
         except Exception:
             pass
 
@@ -422,6 +435,131 @@ class PanelConfiguracion(ctk.CTkFrame):
             messagebox.showerror("Error", f"Error al guardar: {str(e)}")
 
 
+    # ========== FERIADOS ==========
+    def _configurar_tab_feriados(self):
+        """Configura la pestaña de feriados del calendario laboral"""
+        self.tab_feriados.grid_rowconfigure(1, weight=1)
+        self.tab_feriados.grid_columnconfigure(0, weight=1)
+
+        frame_controles = ctk.CTkFrame(self.tab_feriados, fg_color="transparent")
+        frame_controles.grid(row=0, column=0, sticky="ew", pady=(0, 10))
+
+        ctk.CTkButton(
+            frame_controles,
+            text="+ Nuevo Feriado",
+            command=self._dialogo_feriado,
+            fg_color=COLOR_SUCCESS,
+            width=150,
+            height=35
+        ).pack(side="left", padx=5)
+
+        ctk.CTkButton(
+            frame_controles,
+            text="🔄 Actualizar",
+            command=self._cargar_feriados,
+            width=120,
+            height=35
+        ).pack(side="left", padx=5)
+
+        self.scroll_feriados = ctk.CTkScrollableFrame(self.tab_feriados)
+        self.scroll_feriados.grid(row=1, column=0, sticky="nsew")
+        self.scroll_feriados.grid_columnconfigure(0, weight=1)
+
+        self._cargar_feriados()
+
+    def _cargar_feriados(self):
+        """Carga los feriados"""
+        for widget in self.scroll_feriados.winfo_children():
+            widget.destroy()
+
+        feriados = consultas.obtener_feriados()
+
+        if not feriados:
+            ctk.CTkLabel(
+                self.scroll_feriados,
+                text="No hay feriados registrados",
+                text_color="gray"
+            ).pack(pady=20)
+            return
+
+        frame_header = ctk.CTkFrame(self.scroll_feriados, fg_color=COLOR_PRIMARY)
+        frame_header.grid(row=0, column=0, sticky="ew", pady=(0, 10))
+        frame_header.grid_columnconfigure((0, 1, 2), weight=1)
+
+        ctk.CTkLabel(frame_header, text="Fecha", font=ctk.CTkFont(weight="bold"), text_color="white").grid(row=0, column=0, padx=10, pady=8)
+        ctk.CTkLabel(frame_header, text="Descripción", font=ctk.CTkFont(weight="bold"), text_color="white").grid(row=0, column=1, padx=10, pady=8)
+        ctk.CTkLabel(frame_header, text="Acciones", font=ctk.CTkFont(weight="bold"), text_color="white").grid(row=0, column=2, padx=10, pady=8)
+
+        for idx, feriado in enumerate(feriados):
+            self._crear_fila_feriado(feriado, idx + 1)
+
+    def _crear_fila_feriado(self, feriado, fila):
+        """Crea una fila para un feriado"""
+        fg_color = "gray25" if fila % 2 == 0 else "gray20"
+        frame_fila = ctk.CTkFrame(self.scroll_feriados, fg_color=fg_color)
+        frame_fila.grid(row=fila, column=0, sticky="ew", pady=2)
+        frame_fila.grid_columnconfigure((0, 1, 2), weight=1)
+
+        ctk.CTkLabel(frame_fila, text=feriado['fecha'], font=ctk.CTkFont(size=12)).grid(row=0, column=0, padx=10, pady=8)
+        ctk.CTkLabel(frame_fila, text=feriado['descripcion'] or '-', font=ctk.CTkFont(size=12)).grid(row=0, column=1, padx=10, pady=8)
+
+        ctk.CTkButton(
+            frame_fila,
+            text="Eliminar",
+            command=lambda f=feriado: self._eliminar_feriado(f),
+            width=70,
+            height=28,
+            fg_color=COLOR_DANGER
+        ).grid(row=0, column=2, padx=5, pady=5)
+
+    def _dialogo_feriado(self):
+        """Diálogo para registrar un feriado"""
+        dialogo = ctk.CTkToplevel(self)
+        dialogo.title("Nuevo Feriado")
+        dialogo.geometry("400x260")
+        dialogo.transient(self)
+        dialogo.grab_set()
+
+        dialogo.update_idletasks()
+        x = (dialogo.winfo_screenwidth() // 2) - (400 // 2)
+        y = (dialogo.winfo_screenheight() // 2) - (260 // 2)
+        dialogo.geometry(f"+{x}+{y}")
+
+        ctk.CTkLabel(dialogo, text="Fecha (AAAA-MM-DD):", font=ctk.CTkFont(size=12)).pack(pady=(30, 5))
+        entry_fecha = ctk.CTkEntry(dialogo, width=300, placeholder_text="Ej: 2025-12-25")
+        entry_fecha.pack(pady=5)
+
+        ctk.CTkLabel(dialogo, text="Descripción:", font=ctk.CTkFont(size=12)).pack(pady=(10, 5))
+        entry_descripcion = ctk.CTkEntry(dialogo, width=300, placeholder_text="Ej: Navidad")
+        entry_descripcion.pack(pady=5)
+
+        def guardar():
+            try:
+                fecha = datetime.strptime(entry_fecha.get().strip(), "%Y-%m-%d").date()
+            except ValueError:
+                messagebox.showwarning("Validación", "Ingrese una fecha válida (AAAA-MM-DD)")
+                return
+            try:
+                consultas.guardar_feriado(fecha, entry_descripcion.get().strip())
+                messagebox.showinfo("Éxito", "Feriado registrado")
+                dialogo.destroy()
+                self._cargar_feriados()
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+
+        ctk.CTkButton(dialogo, text="💾 Guardar", command=guardar, fg_color=COLOR_SUCCESS, height=40).pack(pady=20)
+
+    def _eliminar_feriado(self, feriado):
+        """Elimina un feriado"""
+        if messagebox.askyesno("Confirmar", f"¿Eliminar el feriado del {feriado['fecha']}?"):
+            try:
+                consultas.eliminar_feriado(feriado['id_feriado'])
+                messagebox.showinfo("Éxito", "Feriado eliminado")
+                self._cargar_feriados()
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+
+
     # ========== UNIDADES DE MEDIDA ==========
     def _configurar_tab_unidades(self):
         """Configura la pestaña de unidades de medida"""
@@ -1069,6 +1207,14 @@ class PanelConfiguracion(ctk.CTkFrame):
             height=35
         ).pack(side="left", padx=5)
 
+        ctk.CTkButton(
+            frame_controles,
+            text="📄 Exportar Lista de Precios",
+            command=self._exportar_lista_precios,
+            width=200,
+            height=35
+        ).pack(side="left", padx=5)
+
         self.scroll_precios = ctk.CTkScrollableFrame(self.tab_precios)
         self.scroll_precios.grid(row=2, column=0, sticky="nsew")
         self.scroll_precios.grid_columnconfigure(0, weight=1)
@@ -1101,6 +1247,20 @@ class PanelConfiguracion(ctk.CTkFrame):
         for idx, precio in enumerate(precios):
             self._crear_fila_precio(precio, idx + 1)
 
+    def _exportar_lista_precios(self):
+        """Exporta la lista de precios (servicio × cantidad × medida) a Excel"""
+        try:
+            from app.logic.matriz_precios import exportar_matriz_precios
+            from app.logic.exportacion import obtener_ruta_exportacion
+
+            ruta = obtener_ruta_exportacion('xlsx', 'lista_precios')
+            if exportar_matriz_precios(ruta):
+                messagebox.showinfo("Éxito", f"Lista de precios exportada:\n{ruta}")
+            else:
+                messagebox.showerror("Error", "No se pudo exportar la lista de precios")
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+
     def _crear_fila_precio(self, precio, fila):
         """Crea una fila para un precio escalonado"""
         fg_color = "gray25" if fila % 2 == 0 else "gray20"
@@ -1185,6 +1345,13 @@ class PanelConfiguracion(ctk.CTkFrame):
                 else:
                     consultas.guardar_precio_escalonado(id_servicio, cant_min, cant_max, precio_unit)
                     messagebox.showinfo("Éxito", "Precio creado")
+
+                if consultas.obtener_conflictos_precios(id_servicio):
+                    messagebox.showwarning(
+                        "Tramos solapados",
+                        f"El servicio '{servicio_nombre}' tiene rangos de cantidad que se solapan.\n"
+                        "En la zona común se aplica el tramo de mayor cantidad mínima."
+                    )
                 dialogo.destroy()
                 self._cargar_precios()
             except ValueError:
@@ -319,50 +319,11 @@ class PanelMaquinas(ctk.CTkFrame):
     
     def _obtener_capacidad_maquina(self, id_maquina):
         """Obtiene las capacidades físicas de una máquina desde la BD"""
-        from app.database.conexion import get_session
-        from sqlalchemy import text
-        session = get_session()
-        try:
-            result = session.execute(text("""
-                SELECT ancho_util_max, largo_util_max, velocidad_promedio
-                FROM capacidad_maquinas WHERE id_maquina = :id
-            """), {'id': id_maquina}).fetchone()
-            if result:
-                return {
-                    'ancho_util_max': result[0],
-                    'largo_util_max': result[1],
-                    'velocidad_promedio': result[2]
-                }
-            return None
-        finally:
-            session.close()
+        return consultas.obtener_capacidad_maquina(id_maquina)
     
     def _guardar_capacidad_maquina(self, id_maquina, ancho_max, largo_max, velocidad):
         """Guarda o actualiza las capacidades físicas de una máquina"""
-        from app.database.conexion import get_session
-        from sqlalchemy import text
-        session = get_session()
-        try:
-            # Verificar si ya existe
-            existe = session.execute(text(
-                "SELECT 1 FROM capacidad_maquinas WHERE id_maquina = :id"
-            ), {'id': id_maquina}).fetchone()
-            
-            if existe:
-                session.execute(text("""
-                    UPDATE capacidad_maquinas 
-                    SET ancho_util_max = :ancho, largo_util_max = :largo, velocidad_promedio = :vel
-                    WHERE id_maquina = :id
-                """), {'id': id_maquina, 'ancho': ancho_max, 'largo': largo_max, 'vel': velocidad})
-            else:
-                session.execute(text("""
-                    INSERT INTO capacidad_maquinas (id_maquina, ancho_util_max, largo_util_max, velocidad_promedio)
-                    VALUES (:id, :ancho, :largo, :vel)
-                """), {'id': id_maquina, 'ancho': ancho_max, 'largo': largo_max, 'vel': velocidad})
-            
-            session.commit()
-        finally:
-            session.close()
+        consultas.guardar_capacidad_maquina(id_maquina, ancho_max, largo_max, velocidad)
 
     def _confirmar_eliminar_maquina(self, maquina):
         """Muestra diálogo de confirmación antes de eliminar"""
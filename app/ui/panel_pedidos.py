@@ -13,7 +13,10 @@ import io
 from app.config import *
 from app.database import consultas
 from app.logic import calculos
+from app.logic.cola_produccion import calcular_fecha_entrega_con_cola
 from app.logic.motor_inferencia import analizar_pedido_experto
+from app.logic.planificador import actualizar_plan_pedidos
+from app.logic.planificador_paneles import planificar_paños
 from app.ui.widgets import AutocompleteEntry
 
 
@@ -49,6 +52,7 @@ class PanelPedidos(ctk.CTkFrame):
         # Variables de estado
         self.servicio_actual = None
         self.rollo_seleccionado = None
+        self._ids_materiales = {}  # {etiqueta del combo: id_material}
 
         self._crear_encabezado()
         self._crear_contenedor_principal()
@@ -381,9 +385,23 @@ class PanelPedidos(ctk.CTkFrame):
         """Obtiene nombres de servicios desde la base de datos"""
         return [s['nombre_servicio'] for s in consultas.obtener_servicios()]
 
-    def _obtener_nombres_materiales(self):
-        """Obtiene nombres de materiales desde la base de datos"""
-        return [m['nombre_material'] for m in consultas.obtener_materiales()]
+    def _obtener_nombres_materiales(self, materiales=None):
+        """
+        Etiquetas del combo de materiales (⭐ para los preferidos)
+
+        Recuerda el ID de cada etiqueta para guardar el material elegido
+        sin buscarlo por nombre.
+
+        Args:
+            materiales: Lista de materiales (por defecto todos)
+        """
+        if materiales is None:
+            materiales = consultas.obtener_materiales()
+        self._ids_materiales = {
+            f"{'⭐ ' if m.get('es_preferido') else ''}{m['nombre_material']}": m['id_material']
+            for m in materiales
+        }
+        return list(self._ids_materiales)
 
     # ==================== DIÁLOGOS ====================
 
@@ -482,10 +500,7 @@ class PanelPedidos(ctk.CTkFrame):
             if materiales:
                 # Ordenar: preferidos primero
                 materiales_ordenados = sorted(materiales, key=lambda m: not m.get('es_preferido', False))
-                nombres = []
-                for m in materiales_ordenados:
-                    prefijo = "⭐ " if m.get('es_preferido') else ""
-                    nombres.append(f"{prefijo}{m['nombre_material']}")
+                nombres = self._obtener_nombres_materiales(materiales_ordenados)
                 
                 self.combo_material.configure(values=nombres)
                 self.combo_material.set(nombres[0])
@@ -628,7 +643,21 @@ class PanelPedidos(ctk.CTkFrame):
                 id_servicio=id_servicio
             )
             if resultado_opt.get('requiere_optimizacion') and resultado_opt.get('mensaje'):
-                messagebox.showwarning(f"{IconoSVG.ALERTA} Optimización Recomendada", resultado_opt['mensaje'])
+                mensaje = resultado_opt['mensaje']
+                if alto > 0:
+                    cantidad = int(float(self.entry_cantidad.get() or 1))
+                    planes = planificar_paños(ancho, alto, cantidad, id_servicio=id_servicio)
+                    if planes:
+                        mensaje += "\n\nMejores alternativas con stock y máquinas actuales:"
+                        for i, plan in enumerate(planes, 1):
+                            mensaje += (
+                                f"\n{i}. {plan['nombre_maquina']}: "
+                                f"{plan['paños']} paño(s) de {plan['ancho_paño']:.2f}m"
+                                f"{' rotado' if plan['rotado'] else ''} en {plan['nombre_material']} "
+                                f"({plan['metros_lineales']:.2f} m, {plan['aprovechamiento']:.0f}% aprov., "
+                                f"{plan['horas']:.1f} h)"
+                            )
+                messagebox.showwarning(f"{IconoSVG.ALERTA} Optimización Recomendada", mensaje)
 
             self._al_cambiar_dimensiones()
             self._seleccionar_rollo_automaticamente()
@@ -844,7 +873,7 @@ class PanelPedidos(ctk.CTkFrame):
         return texto
 
     def _guardar_pedido(self):
-        """Guarda el pedido en la base de datos"""
+        """Guarda el pedido y la línea cotizada en una sola transacción"""
         try:
             # Validaciones
             cliente = self.autocomplete_cliente.get_cliente_seleccionado()
@@ -852,19 +881,26 @@ class PanelPedidos(ctk.CTkFrame):
                 messagebox.showwarning(f"{IconoSVG.ALERTA} Validación", "Debe seleccionar un cliente")
                 return
 
-            if self.combo_servicio.get() == "Seleccionar servicio...":
+            servicio = self.combo_servicio.get()
+            if servicio == "Seleccionar servicio..." or not self.servicio_actual:
                 messagebox.showwarning(f"{IconoSVG.ALERTA} Validación", "Debe seleccionar un servicio")
                 return
 
             # Validar descripción para llaveros
-            if "llavero" in self.combo_servicio.get().lower():
+            es_llavero = "llavero" in servicio.lower()
+            if es_llavero:
                 if not self.entry_descripcion.get().strip():
                     messagebox.showwarning(f"{IconoSVG.ALERTA} Validación", "La descripción es obligatoria para llaveros")
                     return
 
-            # Obtener material (limpiar prefijos de preferido)
-            material_nombre = self.combo_material.get().replace("⭐ ", "").strip()
-            
+            # Material por ID de la etiqueta elegida (los llaveros no lo piden)
+            id_material = None
+            if not es_llavero:
+                id_material = self._ids_materiales.get(self.combo_material.get())
+                if id_material is None:
+                    messagebox.showwarning(f"{IconoSVG.ALERTA} Validación", "Seleccione un material de la lista")
+                    return
+
             # Obtener precio
             precio_texto = self.label_precio.cget("text")
             precio_total = float(precio_texto.split("S/ ")[1])
@@ -873,8 +909,19 @@ class PanelPedidos(ctk.CTkFrame):
                 messagebox.showwarning(f"{IconoSVG.ALERTA} Validación", "Debe calcular la cotización primero")
                 return
 
-            adelanto = float(self.entry_adelanto.get() or 0)
-            fecha_entrega = datetime.now() + timedelta(days=3)
+            # Leer todos los campos antes de escribir nada
+            try:
+                adelanto = self._leer_numero(self.entry_adelanto, "Adelanto")
+                detalle = self._leer_detalle(id_material, precio_total)
+            except ValueError as e:
+                messagebox.showwarning(f"{IconoSVG.ALERTA} Validación", str(e))
+                return
+
+            # Plazo estándar, o más si la máquina compatible está ocupada en el plan
+            entrega_plan = calcular_fecha_entrega_con_cola(
+                detalle['id_servicio'], detalle['ancho'], detalle['alto'], detalle['cantidad']
+            )
+            fecha_entrega = max(datetime.now() + timedelta(days=3), entrega_plan['fecha_entrega'])
 
             # Validar fecha/hora
             es_valida, msg = calculos.validar_fecha_hora_entrega_completa(
@@ -888,16 +935,23 @@ class PanelPedidos(ctk.CTkFrame):
                 messagebox.showerror(f"{IconoSVG.ERROR} Validación", msg)
                 return
 
-            # Guardar
-            id_pedido = consultas.guardar_pedido(
+            # Guardar cabecera y línea juntas
+            id_pedido = consultas.guardar_pedido_con_detalles(
                 id_cliente=cliente['id_cliente'],
                 fecha_entrega=fecha_entrega,
+                detalles=[detalle],
                 estado="Cotizado",
                 estado_pago=self.combo_estado_pago.get(),
                 costo_total=precio_total,
                 acuenta=adelanto,
                 observaciones=self.entry_descripcion.get()
             )
+            error_plan = actualizar_plan_pedidos([id_pedido])
+            if error_plan:
+                messagebox.showwarning(
+                    f"{IconoSVG.ALERTA} Plan de producción",
+                    f"El pedido se guardó, pero no se pudo actualizar el plan de producción:\n{error_plan}"
+                )
 
             messagebox.showinfo(f"{IconoSVG.EXITO} Éxito", f"Pedido #{id_pedido} guardado correctamente")
             self._limpiar_formulario()
@@ -905,6 +959,54 @@ class PanelPedidos(ctk.CTkFrame):
         except Exception as e:
             messagebox.showerror(f"{IconoSVG.ERROR} Error", f"Error al guardar: {str(e)}")
 
+    @staticmethod
+    def _leer_numero(entry, campo, defecto=0.0):
+        """
+        Número de un campo de texto (acepta coma decimal)
+
+        Raises:
+            ValueError: Con un mensaje para el operador si no es un número
+        """
+        texto = entry.get().strip()
+        if not texto:
+            return defecto
+        try:
+            return float(texto.replace(",", "."))
+        except ValueError:
+            raise ValueError(f"{campo}: '{texto}' no es un número válido")
+
+    def _leer_detalle(self, id_material, precio_total):
+        """
+        Línea del servicio cotizado lista para guardar
+
+        Raises:
+            ValueError: Si la cantidad o las medidas no son válidas
+        """
+        cantidad = self._leer_numero(self.entry_cantidad, "Cantidad", 1)
+        servicio = self.combo_servicio.get().lower()
+        if "flyer" in servicio or "tarjeta" in servicio:
+            cantidad = calculos.convertir_millares_a_unidades(cantidad)
+        cantidad = int(cantidad)
+        if cantidad < 1:
+            raise ValueError("La cantidad debe ser al menos 1")
+
+        ancho = alto = 0.0
+        if self.servicio_actual.get('tipo_material') == 'dimension':
+            ancho = self._leer_numero(self.entry_ancho, "Ancho")
+            alto = self._leer_numero(self.entry_alto, "Alto")
+            if ancho <= 0 or alto <= 0:
+                raise ValueError("Ingrese el ancho y el alto del trabajo")
+
+        return {
+            'id_servicio': self.servicio_actual['id_servicio'],
+            'id_material': id_material,
+            'descripcion': self.entry_descripcion.get(),
+            'ancho': ancho,
+            'alto': alto,
+            'cantidad': cantidad,
+            'precio_unitario': round(precio_total / cantidad, 2),
+        }
+
     def _limpiar_formulario(self):
         """Limpia todos los campos del formulario"""
         self.autocomplete_cliente.clear()
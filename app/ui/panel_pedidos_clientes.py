@@ -2,12 +2,14 @@
 Panel para visualizar pedidos de clientes
 Muestra lista de pedidos con sus detalles, paginación y filtros
 """
+import os
 import customtkinter as ctk
 from tkinter import messagebox, filedialog
 from datetime import datetime
 from app.config import COLOR_PRIMARY, COLOR_SUCCESS, COLOR_DANGER, COLOR_WARNING
 from app.database import consultas
-from app.logic.exportacion import exportar_a_csv, exportar_a_excel, exportar_a_pdf
+from app.logic.exportacion import exportar_lotes_a_csv, exportar_a_excel, exportar_a_pdf
+from app.logic.planificador import actualizar_plan_pedidos
 
 
 class PanelPedidosClientes(ctk.CTkFrame):
@@ -65,10 +67,13 @@ class PanelPedidosClientes(ctk.CTkFrame):
 
     def _inicializar_variables(self):
         """Inicializa las variables de estado del panel"""
-        # Variables de paginación
+        # Variables de paginación (por cursor: la página se pide a partir
+        # de la última fila vista en lugar de un número de página)
         self.pagina_actual = 1
         self.items_por_pagina = self.ITEMS_POR_PAGINA
         self.pedidos_resultado = {}
+        self.cursor_pagina = None
+        self.hacia_pagina = 'siguiente'
         
         # Variables de filtros
         self.filtro_estado = None
@@ -79,8 +84,9 @@ class PanelPedidosClientes(ctk.CTkFrame):
         self.orden_campo = self.CAMPO_ORDEN_DEFAULT
         self.orden_dir = self.DIRECCION_ORDEN_DEFAULT
         
-        # Cache de estados
+        # Cache de estados (la lista de nombres se arma una vez, no por fila)
         self.estados_disponibles = []
+        self.nombres_estados = []
 
     def _crear_interfaz(self):
         """
@@ -170,7 +176,8 @@ class PanelPedidosClientes(ctk.CTkFrame):
 
         # Obtener estados desde la BD
         self.estados_disponibles = consultas.obtener_estados_pedidos()
-        nombres_estados = ["Todos"] + [est['nombre'] for est in self.estados_disponibles]
+        self.nombres_estados = [est['nombre'] for est in self.estados_disponibles]
+        nombres_estados = ["Todos"] + self.nombres_estados
 
         self.combo_filtro_estado = ctk.CTkComboBox(
             frame_filtros,
@@ -405,7 +412,7 @@ class PanelPedidosClientes(ctk.CTkFrame):
         """
         self.orden_campo = campo
         self.orden_dir = direccion
-        self.pagina_actual = 1
+        self._reiniciar_paginacion()
         self._cargar_pedidos()
 
     def _aplicar_filtros(self, *args):
@@ -430,7 +437,7 @@ class PanelPedidosClientes(ctk.CTkFrame):
         self.filtro_fecha_fin = fecha_fin if fecha_fin else None
 
         # Resetear a primera página y cargar
-        self.pagina_actual = 1
+        self._reiniciar_paginacion()
         self._cargar_pedidos()
 
     def _limpiar_filtros(self):
@@ -447,7 +454,7 @@ class PanelPedidosClientes(ctk.CTkFrame):
         self.filtro_estado = None
         self.filtro_fecha_inicio = None
         self.filtro_fecha_fin = None
-        self.pagina_actual = 1
+        self._reiniciar_paginacion()
         
         self._cargar_pedidos()
 
@@ -474,16 +481,17 @@ class PanelPedidosClientes(ctk.CTkFrame):
         """
         Carga los pedidos desde la BD con paginación y filtros aplicados
         
-        Consulta la BD con los filtros, ordenamiento y paginación actuales,
+        Consulta la BD con los filtros, ordenamiento y cursor actuales,
         luego actualiza la vista con los resultados
         """
-        resultado = consultas.obtener_pedidos_filtrados(
+        resultado = consultas.obtener_pedidos_keyset(
             filtro_estado=self.filtro_estado,
             fecha_ingreso_desde=self.filtro_fecha_inicio,
             fecha_ingreso_hasta=self.filtro_fecha_fin,
             orden_campo=self.orden_campo,
             orden_direccion=self.orden_dir,
-            pagina=self.pagina_actual,
+            cursor=self.cursor_pagina,
+            hacia=self.hacia_pagina,
             items_por_pagina=self.items_por_pagina
         )
 
@@ -603,12 +611,11 @@ class PanelPedidosClientes(ctk.CTkFrame):
         )
         frame_estado.pack(side="left", padx=5)
 
-        nombres_estados = [e['nombre'] for e in self.estados_disponibles]
         estado_nombre = self._get_field(pedido, 'estado_nombre', 'Sin estado') or 'Sin estado'
 
         combo_estado = ctk.CTkComboBox(
             frame_estado,
-            values=nombres_estados,
+            values=self.nombres_estados,
             width=140,
             height=32,
             corner_radius=6,
@@ -724,6 +731,12 @@ class PanelPedidosClientes(ctk.CTkFrame):
         if id_estado:
             try:
                 consultas.actualizar_estado_de_pedido(id_pedido, id_estado)
+                error_plan = actualizar_plan_pedidos([id_pedido])
+                if error_plan:
+                    messagebox.showwarning(
+                        "⚠️ Plan de producción",
+                        f"El estado se guardó, pero no se pudo actualizar el plan de producción:\n{error_plan}"
+                    )
                 messagebox.showinfo(
                     "✅ Éxito",
                     f"Estado del pedido #{id_pedido} actualizado a '{nuevo_estado_nombre}'"
@@ -940,8 +953,8 @@ class PanelPedidosClientes(ctk.CTkFrame):
         Args:
             resultado: Diccionario con información de paginación
         """
-        pagina_actual = resultado['pagina_actual']
-        total_paginas = resultado['total_paginas']
+        pagina_actual = self.pagina_actual
+        total_paginas = max(resultado['total_paginas'], 1)
         total_registros = resultado['total']
 
         # Actualizar labels informativos
@@ -954,22 +967,36 @@ class PanelPedidosClientes(ctk.CTkFrame):
 
         # Habilitar/deshabilitar botones según disponibilidad
         self.btn_anterior.configure(
-            state="normal" if pagina_actual > 1 else "disabled"
+            state="normal" if resultado['hay_anterior'] else "disabled"
         )
         self.btn_siguiente.configure(
-            state="normal" if pagina_actual < total_paginas else "disabled"
+            state="normal" if resultado['hay_siguiente'] else "disabled"
         )
 
+    def _reiniciar_paginacion(self):
+        """Vuelve a la primera página descartando el cursor actual"""
+        self.pagina_actual = 1
+        self.cursor_pagina = None
+        self.hacia_pagina = 'siguiente'
+
     def _pagina_anterior(self):
         """Navega a la página anterior si es posible"""
-        if self.pagina_actual > 1:
+        if self.pedidos_resultado.get('hay_anterior'):
             self.pagina_actual -= 1
+            if self.pagina_actual <= 1:
+                # La primera página se pide sin cursor para incluir pedidos nuevos
+                self._reiniciar_paginacion()
+            else:
+                self.cursor_pagina = self.pedidos_resultado['cursor_anterior']
+                self.hacia_pagina = 'anterior'
             self._cargar_pedidos()
 
     def _pagina_siguiente(self):
         """Navega a la página siguiente si es posible"""
-        if self.pagina_actual < self.pedidos_resultado['total_paginas']:
+        if self.pedidos_resultado.get('hay_siguiente'):
             self.pagina_actual += 1
+            self.cursor_pagina = self.pedidos_resultado['cursor_siguiente']
+            self.hacia_pagina = 'siguiente'
             self._cargar_pedidos()
 
     # ============================================================
@@ -981,7 +1008,7 @@ class PanelPedidosClientes(ctk.CTkFrame):
         Muestra una ventana modal con opciones de exportación
         
         Permite al usuario elegir entre CSV, Excel o PDF para
-        exportar la lista de pedidos actual
+        exportar todos los pedidos con los filtros actuales
         """
         ventana = ctk.CTkToplevel(self)
         ventana.title("📤 Exportar Pedidos")
@@ -1052,17 +1079,35 @@ class PanelPedidosClientes(ctk.CTkFrame):
             return
 
         try:
-            pedidos = self.pedidos_resultado['pedidos']
-            
-            # Ejecutar exportación según formato
+            extensiones = {"CSV": "csv", "Excel": "xlsx", "PDF": "pdf"}
+            if formato not in extensiones:
+                raise ValueError(f"Formato no soportado: {formato}")
+
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            ruta = os.path.join(directorio, f"pedidos_{timestamp}.{extensiones[formato]}")
+
+            # Todos los pedidos con los filtros y el orden actuales, por lotes
+            lotes = consultas.iterar_pedidos_exportacion(
+                filtro_estado=self.filtro_estado,
+                fecha_ingreso_desde=self.filtro_fecha_inicio,
+                fecha_ingreso_hasta=self.filtro_fecha_fin,
+                orden_campo=self.orden_campo,
+                orden_direccion=self.orden_dir
+            )
+            columnas = consultas.COLUMNAS_EXPORTACION_PEDIDOS
+
+            # Ejecutar exportación según formato (CSV se escribe mientras se lee)
             if formato == "CSV":
-                ruta = exportar_a_csv(pedidos, "pedidos", directorio)
-            elif formato == "Excel":
-                ruta = exportar_a_excel(pedidos, "pedidos", directorio)
-            elif formato == "PDF":
-                ruta = exportar_a_pdf(pedidos, "pedidos", directorio)
+                exito = exportar_lotes_a_csv(lotes, columnas, ruta) is not None
             else:
-                raise ValueError(f"Formato no soportado: {formato}")
+                filas = [fila for lote in lotes for fila in lote]
+                if formato == "Excel":
+                    exito = exportar_a_excel(filas, columnas, ruta, "Pedidos")
+                else:
+                    exito = exportar_a_pdf(filas, columnas, ruta, "Pedidos", 'landscape')
+
+            if not exito:
+                raise Exception("No se pudo escribir el archivo")
 
             messagebox.showinfo(
                 "✅ Éxito",
@@ -11,8 +11,8 @@ from app.config import (
     COLOR_DANGER,
     ESTADOS_PEDIDO
 )
-from app.database import consultas
-from app.logic.exportacion import exportar_a_csv, exportar_a_excel, exportar_a_pdf
+from app.database import consultas, consultas_reportes
+from app.logic.exportacion import exportar_a_csv, exportar_a_excel, exportar_a_pdf, exportar_lotes_a_csv
 
 
 class PanelReportes(ctk.CTkFrame):
@@ -42,20 +42,8 @@ class PanelReportes(ctk.CTkFrame):
     def _crear_dashboard(self):
         """Crea el dashboard con tarjetas de estadísticas"""
 
-        # Obtener datos
-        clientes = consultas.obtener_clientes()
-        materiales = consultas.obtener_materiales()
-        materiales_bajo_stock = consultas.obtener_materiales_bajo_stock()
-        pedidos = consultas.obtener_pedidos()
-
-        # Función auxiliar para acceder de forma segura a sqlite3.Row
-        def get_field(row, field, default=None):
-            try:
-                return row[field] if row[field] is not None else default
-            except (KeyError, IndexError):
-                return default
-
-        pedidos_activos = [p for p in pedidos if get_field(p, 'estado_nombre') not in ['Entregado', 'Cancelado']]
+        # Obtener indicadores (agregados en SQL)
+        kpis = consultas_reportes.obtener_kpis_dashboard()
 
         # Tarjetas de resumen
         row = 0
@@ -64,7 +52,7 @@ class PanelReportes(ctk.CTkFrame):
         self._crear_tarjeta(
             self.scroll_frame,
             "Total de Clientes",
-            str(len(clientes)),
+            str(kpis['total_clientes']),
             COLOR_PRIMARY,
             row, 0
         )
@@ -73,17 +61,17 @@ class PanelReportes(ctk.CTkFrame):
         self._crear_tarjeta(
             self.scroll_frame,
             "Pedidos Activos",
-            str(len(pedidos_activos)),
+            str(kpis['pedidos_activos']),
             COLOR_SUCCESS,
             row, 1
         )
 
         # Tarjeta 3: Alertas de Inventario
-        color_alerta = COLOR_DANGER if materiales_bajo_stock else COLOR_SUCCESS
+        color_alerta = COLOR_DANGER if kpis['alertas_stock'] else COLOR_SUCCESS
         self._crear_tarjeta(
             self.scroll_frame,
             "Alertas de Stock",
-            str(len(materiales_bajo_stock)),
+            str(kpis['alertas_stock']),
             color_alerta,
             row, 2
         )
@@ -100,14 +88,11 @@ class PanelReportes(ctk.CTkFrame):
             font=ctk.CTkFont(size=20, weight="bold")
         ).pack(pady=15, padx=15, anchor="w")
 
-        # Contar pedidos por estado
-        estados_count = {}
-        estados_disponibles = consultas.obtener_estados_pedidos()
-        for estado_obj in estados_disponibles:
-            estado_nombre = estado_obj['nombre']
-            count = len([p for p in pedidos if get_field(p, 'estado_nombre') == estado_nombre])
-            if count > 0:
-                estados_count[estado_nombre] = count
+        # Pedidos por estado (ya agrupados por la consulta)
+        estados_count = {
+            fila['nombre'] or 'Sin estado': fila['cantidad']
+            for fila in kpis['pedidos_por_estado']
+        }
 
         if estados_count:
             for estado, count in estados_count.items():
@@ -147,7 +132,7 @@ class PanelReportes(ctk.CTkFrame):
             font=ctk.CTkFont(size=20, weight="bold")
         ).pack(pady=15, padx=15, anchor="w")
 
-        for material in materiales[:5]:  # Top 5
+        for material in kpis['resumen_inventario']:
             frame_mat = ctk.CTkFrame(frame_materiales, fg_color="transparent")
             frame_mat.pack(fill="x", padx=15, pady=5)
 
@@ -230,14 +215,14 @@ class PanelReportes(ctk.CTkFrame):
         """Muestra diálogo para exportar el reporte"""
         dialogo = ctk.CTkToplevel(self)
         dialogo.title("Exportar Reporte")
-        dialogo.geometry("500x400")
+        dialogo.geometry("500x440")
         dialogo.transient(self)
         dialogo.grab_set()
 
         # Centrar ventana
         dialogo.update_idletasks()
         x = (dialogo.winfo_screenwidth() // 2) - (500 // 2)
-        y = (dialogo.winfo_screenheight() // 2) - (400 // 2)
+        y = (dialogo.winfo_screenheight() // 2) - (440 // 2)
         dialogo.geometry(f"+{x}+{y}")
 
         ctk.CTkLabel(
@@ -280,6 +265,14 @@ class PanelReportes(ctk.CTkFrame):
             value="csv"
         ).pack(pady=5, anchor="w", padx=20)
 
+        # El historial se escribe aparte en CSV, por lotes desde la BD
+        historial_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(
+            dialogo,
+            text="Incluir historial completo de pedidos (CSV aparte)",
+            variable=historial_var
+        ).pack(pady=(10, 0))
+
         # Botón para seleccionar directorio
         ctk.CTkLabel(
             dialogo,
@@ -332,10 +325,7 @@ class PanelReportes(ctk.CTkFrame):
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
                 # Obtener datos
-                clientes = consultas.obtener_clientes()
-                materiales = consultas.obtener_materiales()
-                pedidos = consultas.obtener_pedidos()
-                servicios = consultas.obtener_servicios()
+                kpis = consultas_reportes.obtener_totales_generales()
 
                 # Preparar datos para exportación
                 datos = []
@@ -345,10 +335,20 @@ class PanelReportes(ctk.CTkFrame):
                 datos.append(["Fecha:", datetime.now().strftime('%d/%m/%Y %H:%M'), ""])
                 datos.append(["", "", ""])
                 datos.append(["ESTADÍSTICAS GENERALES", "", ""])
-                datos.append(["Total de Clientes:", len(clientes), ""])
-                datos.append(["Total de Pedidos:", len(pedidos), ""])
-                datos.append(["Total de Servicios:", len(servicios), ""])
-                datos.append(["Total de Materiales:", len(materiales), ""])
+                datos.append(["Total de Clientes:", kpis['total_clientes'], ""])
+                datos.append(["Total de Pedidos:", kpis['total_pedidos'], ""])
+                datos.append(["Total de Servicios:", kpis['total_servicios'], ""])
+                datos.append(["Total de Materiales:", kpis['total_materiales'], ""])
+                datos.append(["", "", ""])
+
+                # Ventas de los últimos 12 meses (desde los resúmenes diarios)
+                hoy = datetime.now().date()
+                ventas_mes = consultas_reportes.obtener_ventas_por_periodo(
+                    desde=hoy.replace(year=hoy.year - 1, day=1), periodo='mes'
+                )
+                datos.append(["VENTAS POR MES", "Pedidos", "Importe"])
+                for venta in ventas_mes:
+                    datos.append([venta['periodo'], venta['pedidos'], round(venta['importe_total'] or 0, 2)])
                 datos.append(["", "", ""])
 
                 # Sección 2: Materiales con stock bajo
@@ -373,6 +373,16 @@ class PanelReportes(ctk.CTkFrame):
                 else:  # pdf
                     exito = exportar_a_pdf(datos, columnas, ruta_completa, "Reporte del Sistema", 'portrait')
 
+                if exito and historial_var.get():
+                    ruta_historial = os.path.join(directorio, f"pedidos_historial_{timestamp}.csv")
+                    filas = exportar_lotes_a_csv(
+                        consultas.iterar_pedidos_exportacion(orden_direccion='ASC'),
+                        consultas.COLUMNAS_EXPORTACION_PEDIDOS,
+                        ruta_historial
+                    )
+                    exito = filas is not None
+                    ruta_completa += f"\n{ruta_historial} ({filas} pedidos)"
+
                 if exito:
                     messagebox.showinfo("Éxito", f"Reporte exportado correctamente:\n{ruta_completa}")
                     dialogo.destroy()
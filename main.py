@@ -15,7 +15,8 @@ sys.path.insert(0, BASE_DIR)
 from app.ui.main_window import ImprentaApp
 from app.ui.login_window import mostrar_login
 from app.database.conexion import DatabaseConnection
-from app.database import consultas_auth
+from app.database import consultas_auth, consultas
+from app.logic import planificador
 
 
 def inicializar_datos_auth():
@@ -73,6 +74,18 @@ def main():
         # Inicializar datos de autenticación
         inicializar_datos_auth()
         
+        # Snapshot periódico del libro de inventario
+        try:
+            consultas.asegurar_snapshot_inventario()
+        except Exception as e:
+            print(f"⚠ Advertencia al generar snapshot de inventario: {e}")
+        
+        # Plan de producción por máquina (recoge cambios de otras estaciones)
+        try:
+            planificador.planificar_produccion()
+        except Exception as e:
+            print(f"⚠ Advertencia al planificar la producción: {e}")
+        
         # Mostrar ventana de login
         print("Esperando autenticación...")
         if not mostrar_login():
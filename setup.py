@@ -43,9 +43,10 @@ build_exe_options = {
         "sqlalchemy.ext.declarative",  # Declarative base
         "openpyxl",  # Para exportación Excel
         "reportlab",  # Para reportes PDF
+        "numpy",  # Anidado de trabajos en rollo y cálculos vectorizados
     ],
     "include_files": files_to_include,
-    "excludes": ["matplotlib", "numpy", "pandas"],  # Excluir paquetes pesados innecesarios
+    "excludes": ["matplotlib", "pandas"],  # Excluir paquetes pesados innecesarios
     "include_msvcr": True,  # Incluir runtime de Visual C++
     "optimize": 2,  # Nivel de optimización
 }